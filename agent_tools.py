@@ -5,32 +5,149 @@ Agent Tools 模組
 這些工具讓 AI Agent 能夠：
 1. 取得資料庫 Schema
 2. 執行 SQL 查詢並回傳結果或錯誤
+3. 查詢欄位的值分布（NULL／空字串比例、常見值、範圍，抽樣統計）
+4. 依外鍵查詢兩張資料表之間的 JOIN 路徑
+
+每個工具都有同步與非同步版本；非同步版本把阻塞的 pyodbc 呼叫交給有上限的
+執行緒池，避免單一慢查詢卡住同一事件迴圈上其他並行的 Agent。
 """
 
-from typing import Annotated
+import asyncio
+import contextvars
+import functools
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Annotated, Optional
 from pydantic import Field
 from agent_framework import ai_function
 
-from db_connector import DatabaseConnector
-from schema_extractor import SchemaExtractor
-from config import sql_server_config
+from column_profiler import column_profiler
+from db_connector import DatabaseConnector, Deadline, QueryCostError, QueryTimeoutError, current_deadline
+from join_graph import format_path, get_join_graph
+from schema_extractor import schema_cache
+from result_summarizer import summarize_result
+from sql_validator import get_validator, suggest, validate_sql
+from config import sql_server_config, sql_validation_enabled, tool_max_workers, tool_timeout
+
+# execute_sql 預覽的資料列數（實際顯示的樣本列數再依 TOOL_RESULT_MAX_BYTES 調整）
+PREVIEW_ROWS = 50
+
+
+@dataclass
+class SqlExecution:
+    """execute_sql 工具的一次成功執行"""
+    sql: str
+    connection_string: str
+    columns: list[str]
+    rows: list[tuple]
+    has_more: bool
+    elapsed: float
+
+
+# 目前 Agent 執行中記錄 execute_sql 結果的列表（未在記錄中時為 None）
+_executions: contextvars.ContextVar[Optional[list[SqlExecution]]] = contextvars.ContextVar(
+    "sql_executions", default=None
+)
+
+
+@dataclass
+class ToolCallBudget:
+    """單次 Agent 執行可使用的工具呼叫次數"""
+    max_calls: int
+    calls: int = 0
+
+
+# 目前 Agent 執行的工具呼叫預算（未設定時不限制）
+_tool_budget: contextvars.ContextVar[Optional[ToolCallBudget]] = contextvars.ContextVar(
+    "tool_call_budget", default=None
+)
+
+
+@contextmanager
+def limit_tool_calls(max_calls: int):
+    """
+    限制此區塊內非同步工具的呼叫次數，超過後工具不再執行，改回傳請 Agent 直接作答的訊息
+    
+    Args:
+        max_calls: 最多呼叫次數（0 表示不限制）
+        
+    Yields:
+        ToolCallBudget: 呼叫次數統計
+    """
+    budget = ToolCallBudget(max_calls)
+    token = _tool_budget.set(budget if max_calls > 0 else None)
+    try:
+        yield budget
+    finally:
+        _tool_budget.reset(token)
+
+
+def _over_budget() -> Optional[str]:
+    """
+    記錄一次工具呼叫；超過預算或請求時間已用完時回傳拒絕訊息
+    
+    Returns:
+        str: 拒絕訊息，可以執行時回傳 None
+    """
+    scope = current_deadline()
+    if scope is not None and scope.expired:
+        return "已超過本次請求的時間上限，工具未執行。請不要再呼叫工具，直接回覆目前最佳的 SQL。"
+    budget = _tool_budget.get()
+    if budget is None:
+        return None
+    budget.calls += 1
+    if budget.calls > budget.max_calls:
+        return (
+            f"已達本次請求的工具呼叫上限（{budget.max_calls} 次），工具未執行。"
+            "請不要再呼叫工具，直接回覆目前最佳的 SQL。"
+        )
+    return None
+
+
+@contextmanager
+def capture_executions():
+    """
+    記錄此區塊內 execute_sql 工具的成功執行結果
+    
+    工具在複製的 context 中執行，但共用同一個列表物件，因此結果會回到呼叫端。
+    
+    Yields:
+        list: SqlExecution 列表（依執行順序）
+    """
+    executions: list[SqlExecution] = []
+    token = _executions.set(executions)
+    try:
+        yield executions
+    finally:
+        _executions.reset(token)
 
 
 @ai_function(
     name="get_database_schema",
-    description="取得資料庫的完整 Schema，包含所有資料表和欄位資訊。在生成 SQL 之前請先呼叫此工具。"
+    description="取得資料庫的 Schema，包含資料表和欄位資訊。對話中尚未提供 Schema，或缺少需要的資料表／欄位時呼叫此工具。"
+                "傳入使用者問題時只回傳相關的資料表；若缺少需要的資料表，請不帶參數再呼叫一次取得完整 Schema。"
 )
-def get_database_schema() -> str:
+def get_database_schema(
+    question: Annotated[str, Field(description="使用者的問題，用於挑選相關資料表；留空則回傳完整 Schema")] = ""
+) -> str:
     """
-    取得連接的 SQL Server 資料庫的完整 Schema。
+    取得連接的 SQL Server 資料庫的 Schema。
     
+    Args:
+        question: 使用者的問題；提供時只回傳相關資料表及其外鍵相鄰資料表
+        
     Returns:
-        str: 格式化的 Schema 文字，包含所有資料表和欄位
+        str: 格式化的 Schema 文字，包含資料表和欄位
     """
     try:
-        db = DatabaseConnector(sql_server_config.connection_string)
-        extractor = SchemaExtractor(db)
-        schema = extractor.get_full_schema()
+        connection_string = sql_server_config.connection_string
+        if question.strip():
+            schema = schema_cache.get_relevant_schema(question, connection_string)
+        else:
+            schema = schema_cache.get_schema_text(connection_string)
         if not schema.strip():
             return "資料庫中沒有找到任何資料表。"
         return schema
@@ -43,44 +160,77 @@ def get_database_schema() -> str:
     description="執行 T-SQL 查詢並回傳結果。如果查詢失敗，會回傳錯誤訊息，你可以根據錯誤修正 SQL 後重試。"
 )
 def execute_sql(
-    sql: Annotated[str, Field(description="要執行的 T-SQL 查詢語句")]
+    sql: Annotated[str, Field(description="要執行的 T-SQL 查詢語句")],
+    include_total: Annotated[bool, Field(description="是否額外計算結果的總筆數（多一次 COUNT_BIG 查詢）")] = False,
+    shape_only: Annotated[bool, Field(description="只需確認查詢可執行時設為 true：只回傳欄位與筆數，不含資料值")] = False
 ) -> str:
     """
     執行 SQL 查詢並回傳結果。
     
+    執行前先以快取的 Schema 檢查資料表與欄位名稱，名稱錯誤時直接回傳建議，不連線資料庫；
+    再以估計執行計畫檢查成本，過高時回傳原因，未指定 TOP 時自動加上列數上限。
+    只讀取前 50 筆預覽，其餘結果在伺服器端取消，不會把整個結果集載入記憶體。
+    實際多讀一頁（QUERY_PAGE_SIZE）並記錄下來，Web UI 可直接顯示而不必重新執行。
+    回傳的文字不超過 TOOL_RESULT_MAX_BYTES：長欄位值截斷、樣本列數依預算調整，並附欄位摘要。
+    
     Args:
         sql: 要執行的 T-SQL 查詢語句
+        include_total: 是否以 COUNT_BIG 計算總筆數
+        shape_only: 只回傳結果的形狀（欄位、型別與筆數）
         
     Returns:
-        str: 查詢結果（格式化為表格）或錯誤訊息
+        str: 查詢結果摘要或錯誤訊息
     """
+    connection_string = sql_server_config.connection_string
+    if sql_validation_enabled:
+        try:
+            validation = validate_sql(sql, connection_string)
+        except Exception:
+            # 無法取得 Schema 時交給資料庫判斷
+            validation = None
+        if validation is not None and not validation.ok:
+            return validation.format_message()
+
     try:
-        db = DatabaseConnector(sql_server_config.connection_string)
-        columns, rows = db.execute_query(sql)
+        db = DatabaseConnector(connection_string)
+        try:
+            guarded_sql = db.guard_query(sql)
+        except QueryCostError as e:
+            return str(e)
+        start = time.perf_counter()
+        columns, rows, has_more = db.fetch_preview(
+            guarded_sql, limit=max(PREVIEW_ROWS, sql_server_config.page_size), cache=True
+        )
+        executions = _executions.get()
+        if executions is not None:
+            executions.append(SqlExecution(
+                sql, connection_string, columns, rows, has_more, time.perf_counter() - start
+            ))
+        has_more = has_more or len(rows) > PREVIEW_ROWS
+        rows = rows[:PREVIEW_ROWS]
         
         if not rows:
             return "查詢執行成功，但沒有回傳任何資料。"
         
-        # 格式化為表格
-        result_lines = []
-        
-        # 標題列
-        header = " | ".join(str(col) for col in columns)
-        result_lines.append(header)
-        result_lines.append("-" * len(header))
+        # 樣本列、欄位摘要（或只有形狀），長度受 TOOL_RESULT_MAX_BYTES 限制
+        result_lines = [summarize_result(columns, rows, has_more, shape_only=shape_only)]
         
-        # 資料列 (限制最多 50 筆)
-        for row in rows[:50]:
-            row_str = " | ".join(str(val) if val is not None else "NULL" for val in row)
-            result_lines.append(row_str)
-        
-        if len(rows) > 50:
-            result_lines.append(f"... (共 {len(rows)} 筆資料，僅顯示前 50 筆)")
-        else:
-            result_lines.append(f"(共 {len(rows)} 筆資料)")
+        total = db.count_rows(sql) if has_more and include_total else None
+        if total is not None:
+            result_lines.append(f"... (共 {total} 筆資料)")
+        elif has_more and include_total:
+            result_lines.append("... (尚有更多資料，總筆數無法計算或計數查詢成本過高)")
+        elif has_more:
+            result_lines.append("... (尚有更多資料，總筆數請傳入 include_total=true)")
+        if guarded_sql != sql:
+            result_lines.append(
+                f"註：查詢未指定 TOP，已自動限制最多 {sql_server_config.guard_row_limit} 筆。"
+            )
         
         return "\n".join(result_lines)
         
+    except QueryTimeoutError as e:
+        return str(e)
     except Exception as e:
         error_msg = str(e)
         # 提供更有幫助的錯誤訊息
@@ -92,6 +242,111 @@ def execute_sql(
             return f"SQL 執行錯誤：{error_msg}\n請根據錯誤訊息修正 SQL 後重試。"
 
 
+@ai_function(
+    name="get_column_profile",
+    description="取得資料表欄位的值分布：NULL 與空字串比例、不同值數量、低基數欄位的常見值與最小／最大值"
+                "（大型資料表為抽樣統計）。需要知道欄位有哪些值（例如狀態代碼）或是否有空字串時呼叫，"
+                "取代 SELECT DISTINCT 等探索查詢。"
+)
+def get_column_profile(
+    table: Annotated[str, Field(description="資料表名稱，例如 Orders 或 dbo.Orders")],
+    columns: Annotated[str, Field(description="以逗號分隔的欄位名稱；留空則回傳所有欄位")] = ""
+) -> str:
+    """
+    取得欄位統計（有快取時直接回傳，否則立即抽樣；大型資料表只讀取部分資料頁）。
+    
+    Args:
+        table: 資料表名稱，可包含結構描述與方括號
+        columns: 以逗號分隔的欄位名稱
+        
+    Returns:
+        str: 每個欄位一行的統計說明或錯誤訊息
+    """
+    try:
+        connection_string = sql_server_config.connection_string
+        validator = get_validator(connection_string)
+        match, error = _resolve_table(validator, table)
+        if match is None:
+            return error
+
+        wanted = [name.strip().strip("[]") for name in columns.split(",") if name.strip()]
+        known = validator.columns_of(match)
+        missing = [name for name in wanted if name.lower() not in known]
+        profile = column_profiler.get_profile(match, connection_string, wait=True)
+        lines = [profile.format(wanted or None)]
+        if missing:
+            lines.append(f"找不到欄位：{', '.join(missing)}（可用欄位：{', '.join(known.values())}）")
+        return "\n".join(lines)
+    except QueryTimeoutError as e:
+        return f"取得欄位統計逾時：{str(e)}"
+    except Exception as e:
+        return f"無法取得欄位統計：{str(e)}"
+
+
+def _resolve_table(validator, name: str) -> tuple[Optional[dict], str]:
+    """
+    依名稱找出資料表
+
+    Returns:
+        tuple: (資料表資訊, 找不到時的錯誤訊息)
+    """
+    parts = [part.strip().strip("[]") for part in name.split(".") if part.strip()]
+    match = validator.resolve_table(parts) if parts else None
+    if match is not None:
+        return match, ""
+    candidates = suggest(parts[-1] if parts else name, validator.table_names)
+    hint = f"你是不是要找：{', '.join(candidates)}？" if candidates else "請檢查 Schema 確認正確的資料表名稱。"
+    return None, f"找不到資料表 {name}。{hint}"
+
+
+@ai_function(
+    name="get_join_path",
+    description="依外鍵取得兩張資料表之間的最短 JOIN 路徑（含需要經過的中介資料表與每一步的 JOIN 條件）。"
+                "撰寫多表查詢、不確定要用哪些欄位 JOIN 時呼叫，取代自行猜測 JOIN 欄位。"
+)
+def get_join_path(
+    source: Annotated[str, Field(description="起點資料表名稱，例如 Orders 或 dbo.Orders")],
+    target: Annotated[str, Field(description="終點資料表名稱，例如 Customers 或 dbo.Customers")]
+) -> str:
+    """
+    取得 JOIN 路徑（只使用快取的 Schema 與外鍵關聯圖，不查詢資料）。
+    
+    Args:
+        source: 起點資料表名稱，可包含結構描述與方括號
+        target: 終點資料表名稱，可包含結構描述與方括號
+        
+    Returns:
+        str: JOIN 片段與每一步可用的外鍵，或錯誤訊息
+    """
+    try:
+        connection_string = sql_server_config.connection_string
+        validator = get_validator(connection_string)
+        tables = []
+        for name in (source, target):
+            table, error = _resolve_table(validator, name)
+            if table is None:
+                return error
+            tables.append((table["schema"], table["name"]))
+
+        graph = get_join_graph(connection_string)
+        path = graph.find_path(*tables)
+        if path is None:
+            return (f"{source} 與 {target} 之間在 {graph.max_hops} 個外鍵內沒有關聯，"
+                    "請檢查 Schema 中是否有可對應的欄位（未宣告外鍵）。")
+        if not path:
+            return f"{source} 與 {target} 是同一張資料表。"
+
+        lines = [format_path(path)]
+        for step in path:
+            if len(step.edges) > 1:
+                # 兩張資料表之間有多個外鍵（例如帳單地址與送貨地址），列出所有可用條件
+                options = "；".join(f"{edge.name}: {edge.condition()}" for edge in step.edges)
+                lines.append(f"{step.source[1]} 與 {step.target[1]} 之間有 {len(step.edges)} 個外鍵，請依問題選擇：{options}")
+        return "\n".join(lines)
+    except Exception as e:
+        return f"無法取得 JOIN 路徑：{str(e)}"
+
+
 @ai_function(
     name="test_connection",
     description="測試資料庫連線是否正常"
@@ -109,3 +364,151 @@ def test_connection() -> str:
         return message
     except Exception as e:
         return f"連線測試失敗：{str(e)}"
+
+
+# ============================================
+# 非同步版本（供 Agent 在事件迴圈中使用）
+# ============================================
+
+# 執行資料庫工作的共用執行緒池，上限即同時進行的資料庫呼叫數
+_db_executor = ThreadPoolExecutor(max_workers=tool_max_workers, thread_name_prefix="nl2sql-db")
+
+
+async def run_blocking(func, *args, timeout: Optional[float] = None):
+    """
+    在資料庫執行緒池中執行阻塞函數，並套用逾時
+    
+    逾時取 timeout 與目前請求截止時間的剩餘秒數較小者，並傳遞給函數中的每個 SQL 語句；
+    逾時或被取消時在伺服器端取消執行中的查詢，執行緒不會被佔住到查詢自然結束。
+    
+    Args:
+        func: 要執行的同步函數
+        *args: 函數參數
+        timeout: 逾時秒數，若未提供則使用 TOOL_TIMEOUT
+        
+    Returns:
+        函數的回傳值
+        
+    Raises:
+        asyncio.TimeoutError: 超過逾時秒數
+    """
+    loop = asyncio.get_running_loop()
+    scope = Deadline(tool_timeout if timeout is None else timeout, parent=current_deadline())
+
+    def call():
+        with scope.activate():
+            return func(*args)
+
+    # 保留呼叫端的 contextvars（run_in_executor 預設不會複製）
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(_db_executor, functools.partial(context.run, call))
+    remaining = scope.remaining()
+    try:
+        return await asyncio.wait_for(future, None if remaining == math.inf else remaining)
+    except (asyncio.TimeoutError, asyncio.CancelledError):
+        scope.cancel()
+        raise
+
+
+def _timeout_detail() -> str:
+    """逾時原因：請求的時間預算用完，或單次工具呼叫超過 TOOL_TIMEOUT"""
+    scope = current_deadline()
+    if scope is not None and scope.expired:
+        return "已超過本次請求的時間上限"
+    return f"超過 {tool_timeout:.0f} 秒"
+
+
+@ai_function(
+    name="get_database_schema",
+    description=get_database_schema.description
+)
+async def get_database_schema_async(
+    question: Annotated[str, Field(description="使用者的問題，用於挑選相關資料表；留空則回傳完整 Schema")] = ""
+) -> str:
+    """get_database_schema 的非同步版本"""
+    refused = _over_budget()
+    if refused:
+        return refused
+    try:
+        return await run_blocking(get_database_schema, question)
+    except asyncio.TimeoutError:
+        return f"取得 Schema 逾時（{_timeout_detail()}），請稍後再試。"
+
+
+@ai_function(
+    name="execute_sql",
+    description=execute_sql.description
+)
+async def execute_sql_async(
+    sql: Annotated[str, Field(description="要執行的 T-SQL 查詢語句")],
+    include_total: Annotated[bool, Field(description="是否額外計算結果的總筆數（多一次 COUNT_BIG 查詢）")] = False,
+    shape_only: Annotated[bool, Field(description="只需確認查詢可執行時設為 true：只回傳欄位與筆數，不含資料值")] = False
+) -> str:
+    """execute_sql 的非同步版本"""
+    refused = _over_budget()
+    if refused:
+        return refused
+    try:
+        return await run_blocking(execute_sql, sql, include_total, shape_only)
+    except asyncio.TimeoutError:
+        return (
+            f"SQL 執行逾時（{_timeout_detail()}）。"
+            "請縮小查詢範圍，例如加上 TOP 或更嚴格的 WHERE 條件後重試。"
+        )
+
+
+@ai_function(
+    name="get_column_profile",
+    description=get_column_profile.description
+)
+async def get_column_profile_async(
+    table: Annotated[str, Field(description="資料表名稱，例如 Orders 或 dbo.Orders")],
+    columns: Annotated[str, Field(description="以逗號分隔的欄位名稱；留空則回傳所有欄位")] = ""
+) -> str:
+    """get_column_profile 的非同步版本"""
+    refused = _over_budget()
+    if refused:
+        return refused
+    try:
+        return await run_blocking(get_column_profile, table, columns)
+    except asyncio.TimeoutError:
+        return f"取得欄位統計逾時（{_timeout_detail()}），請改為直接撰寫 SQL。"
+
+
+@ai_function(
+    name="get_join_path",
+    description=get_join_path.description
+)
+async def get_join_path_async(
+    source: Annotated[str, Field(description="起點資料表名稱，例如 Orders 或 dbo.Orders")],
+    target: Annotated[str, Field(description="終點資料表名稱，例如 Customers 或 dbo.Customers")]
+) -> str:
+    """get_join_path 的非同步版本"""
+    refused = _over_budget()
+    if refused:
+        return refused
+    try:
+        return await run_blocking(get_join_path, source, target)
+    except asyncio.TimeoutError:
+        return f"取得 JOIN 路徑逾時（{_timeout_detail()}），請依 Schema 中的外鍵撰寫 JOIN。"
+
+
+@ai_function(
+    name="test_connection",
+    description=test_connection.description
+)
+async def test_connection_async() -> str:
+    """test_connection 的非同步版本"""
+    refused = _over_budget()
+    if refused:
+        return refused
+    try:
+        return await run_blocking(test_connection)
+    except asyncio.TimeoutError:
+        return f"連線測試逾時（{_timeout_detail()}）"
+
+
+# Agent 使用的非同步工具組
+ASYNC_TOOLS = [
+    get_database_schema_async, execute_sql_async, get_column_profile_async, get_join_path_async, test_connection_async
+]
@@ -6,17 +6,18 @@ NL2SQL - 自然語言轉 T-SQL Web 應用程式
 """
 
 import streamlit as st
+import json
 import re
-from sql_agent import SQLAgent
-from db_connector import DatabaseConnector
-from schema_extractor import SchemaExtractor
-from config import azure_openai_config, sql_server_config
+from typing import Callable, Optional
+from sql_agent import AgentEvent, get_sql_agent
+from column_profiler import column_profiler
+from db_connector import DatabaseConnector, deadline, result_cache, rows_to_frame
+from schema_extractor import schema_cache
+from config import azure_openai_config, request_timeout, sql_server_config
 
 
 def init_session_state():
     """初始化 Session State"""
-    if "schema_text" not in st.session_state:
-        st.session_state.schema_text = ""
     if "generated_sql" not in st.session_state:
         st.session_state.generated_sql = ""
     if "agent_response" not in st.session_state:
@@ -25,6 +26,8 @@ def init_session_state():
         st.session_state.query_results = None
     if "error_message" not in st.session_state:
         st.session_state.error_message = ""
+    if "query_timing" not in st.session_state:
+        st.session_state.query_timing = ""
     if "connection_string" not in st.session_state:
         st.session_state.connection_string = sql_server_config.connection_string
 
@@ -49,7 +52,7 @@ def render_sidebar():
         st.header("⚙️ 設定")
         
         # Agent 模式狀態
-        agent = SQLAgent()
+        agent = get_sql_agent()
         mode = agent.get_mode()
         if "Agentic" in mode:
             st.success(f"🤖 Agentic Mode")
@@ -82,48 +85,99 @@ def render_sidebar():
         with col2:
             if st.button("載入 Schema", width="stretch"):
                 try:
-                    db = DatabaseConnector(connection_string)
-                    extractor = SchemaExtractor(db)
-                    st.session_state.schema_text = extractor.get_full_schema()
+                    schema_cache.invalidate(connection_string)
+                    schema_cache.get_schema_text(connection_string)
+                    # 在背景抽樣欄位統計（有速率限制），之後的問題可附上值提示
+                    column_profiler.invalidate(connection_string)
+                    column_profiler.request(schema_cache.get_tables(connection_string), connection_string)
                     st.success("✅ Schema 已載入")
                 except Exception as e:
                     st.error(f"❌ {str(e)}")
         
-        # 顯示已載入的資料表數量
-        if st.session_state.schema_text:
-            table_count = st.session_state.schema_text.count("### 資料表:")
-            st.caption(f"📋 已載入 {table_count} 個資料表")
+        # 顯示已載入的資料表數量（讀取共用快取，不查詢資料庫）
+        tables = schema_cache.peek_tables(connection_string)
+        if tables is not None:
+            stats = schema_cache.stats()
+            st.caption(f"📋 已載入 {len(tables)} 個資料表（快取命中率 {stats['hit_rate']:.0%}）")
+        
+        question_stats = agent.question_cache.stats()
+        if question_stats["size"]:
+            st.caption(
+                f"⚡ 問題快取 {question_stats['size']} 筆（命中率 {question_stats['hit_rate']:.0%}）"
+            )
+        
+        profile_stats = column_profiler.stats()
+        if profile_stats["tables"] or profile_stats["pending"]:
+            st.caption(
+                f"🔎 欄位統計 {profile_stats['tables']} 張資料表（背景待抽樣 {profile_stats['pending']} 張）"
+            )
+
+        example_stats = agent.example_store.stats()
+        if example_stats["size"]:
+            st.caption(
+                f"📚 範例問答 {example_stats['size']} 筆（找到相似範例 {example_stats['hit_rate']:.0%}）"
+            )
 
+        result_stats = result_cache.stats()
+        if result_stats["size"]:
+            st.caption(
+                f"🗃️ 結果快取 {result_stats['size']} 筆（命中率 {result_stats['hit_rate']:.0%}）"
+            )
 
-def run_query(natural_language: str) -> dict:
-    """執行完整查詢流程：自動載入 Schema → 生成 SQL → 執行 → 回傳結果"""
+
+def run_query(natural_language: str, on_event: Optional[Callable[[AgentEvent], None]] = None) -> dict:
+    """
+    執行完整查詢流程：自動載入 Schema → 生成 SQL → 執行 → 回傳結果
+    
+    整個流程共用 REQUEST_TIMEOUT 的時間預算，逾時的查詢會在伺服器端取消並回傳錯誤，
+    不會佔住 Streamlit 的執行緒。
+    
+    Args:
+        natural_language: 使用者的自然語言查詢
+        on_event: 生成 SQL 期間每個串流事件（文字片段、工具呼叫）的回呼，用於即時顯示進度
+    """
+    with deadline(request_timeout):
+        return _run_query(natural_language, on_event)
+
+
+def _run_query(natural_language: str, on_event: Optional[Callable[[AgentEvent], None]] = None) -> dict:
+    """run_query 的實作（在截止時間內執行）"""
     result = {
         "success": False,
         "sql": "",
         "explanation": "",
-        "columns": [],
-        "rows": [],
-        "error": ""
+        "data": None,
+        "error": "",
+        "first_output_time": None,
+        "generation_time": None,
+        "llm_turns": 0
     }
     
-    agent = SQLAgent()
+    agent = get_sql_agent()
     if not agent.is_ready():
         result["error"] = "Azure OpenAI 未設定"
         return result
     
-    # Step 0: 自動載入 Schema (如果尚未載入)
-    if not st.session_state.schema_text:
-        try:
-            db = DatabaseConnector(st.session_state.connection_string)
-            extractor = SchemaExtractor(db)
-            st.session_state.schema_text = extractor.get_full_schema()
-        except Exception as e:
-            result["error"] = f"無法載入資料庫 Schema: {str(e)}"
-            return result
+    # Step 0: 從共用快取取得與問題相關的 Schema (資料表有變更時自動增量更新)
+    try:
+        # 附上已抽樣的欄位值提示（例如狀態代碼有哪些值），Agent 不必先執行探索查詢
+        schema_text = agent.get_relevant_schema(natural_language, st.session_state.connection_string)
+    except Exception as e:
+        result["error"] = f"無法載入資料庫 Schema: {str(e)}"
+        return result
     
     # Step 1: 生成 SQL
-    schema_context = f"資料庫 Schema：\n{st.session_state.schema_text}"
-    response = agent.generate_sql(natural_language, schema_context)
+    schema_context = f"資料庫 Schema：\n{schema_text}"
+    run = None
+    for event in agent.stream(natural_language, schema_context, st.session_state.connection_string):
+        if event.kind == "final":
+            run = event.result
+        elif on_event is not None:
+            on_event(event)
+    response = run.response
+    result["first_output_time"] = run.first_output_time
+    result["generation_time"] = run.generation_time
+    result["llm_turns"] = run.llm_turns
     
     result["explanation"] = response
     result["sql"] = extract_sql_from_response(response)
@@ -132,19 +186,125 @@ def run_query(natural_language: str) -> dict:
         result["error"] = response
         return result
     
-    # Step 2: 執行 SQL
+    # Step 2: 顯示第一頁；Agent 測試最終 SQL 時已取得結果則直接使用，不重新執行
     try:
+        page_size = sql_server_config.page_size
         db = DatabaseConnector(st.session_state.connection_string)
-        columns, rows = db.execute_query(result["sql"])
-        result["columns"] = columns
-        result["rows"] = rows
+        # 與 Agent 測試時相同的成本檢查（執行計畫已快取），顯示與分頁都使用實際執行的 SQL
+        result["sql"] = db.guard_query(result["sql"])
+        if run.executed:
+            result["data"] = rows_to_frame(
+                run.columns, run.rows[:page_size], run.has_more or len(run.rows) > page_size
+            )
+        else:
+            result["data"] = db.fetch_page(result["sql"], 0, page_size, cache=True)
         result["success"] = True
+        # 執行成功才寫入問題快取，相同問題下次直接使用此 SQL
+        agent.remember_sql(natural_language, response, st.session_state.connection_string)
     except Exception as e:
         result["error"] = str(e)
     
     return result
 
 
+# 工具名稱在進度中顯示的說明
+TOOL_LABELS = {
+    "get_database_schema": "讀取相關資料表",
+    "execute_sql": "測試執行 SQL",
+    "get_column_profile": "查看欄位值分布",
+    "get_join_path": "查詢 JOIN 路徑",
+    "test_connection": "測試資料庫連線",
+}
+
+
+def agent_event_renderer(status) -> Callable[[AgentEvent], None]:
+    """
+    建立在 st.status 容器中逐步顯示 Agent 進度的回呼
+    
+    文字片段累積顯示在同一個區塊，遇到工具呼叫後另起新的區塊；
+    execute_sql 完成時顯示 Agent 測試的 SQL。
+    """
+    answer = None
+    parts = []
+
+    def render(event: AgentEvent):
+        nonlocal answer
+        if event.kind == "text":
+            if answer is None:
+                answer = status.empty()
+            parts.append(event.text)
+            answer.markdown("".join(parts))
+            return
+        answer = None
+        parts.clear()
+        label = TOOL_LABELS.get(event.tool, event.tool)
+        if event.kind == "tool_start":
+            status.update(label=f"🔧 {label}…")
+        elif event.kind == "tool_end":
+            status.markdown(f"✅ {label}（{event.elapsed:.1f} 秒）")
+            if event.tool == "execute_sql":
+                try:
+                    sql = json.loads(event.arguments).get("sql", "")
+                except (ValueError, AttributeError):
+                    sql = ""
+                if sql:
+                    status.code(sql, language="sql")
+
+    return render
+
+
+def load_page(page: int):
+    """讀取查詢結果的指定頁，Session State 只保留目前這一頁"""
+    results = st.session_state.query_results
+    try:
+        db = DatabaseConnector(st.session_state.connection_string)
+        results["data"] = db.fetch_page(
+            st.session_state.generated_sql, page, sql_server_config.page_size, cache=True
+        )
+        results["page"] = page
+        st.session_state.error_message = ""
+    except Exception as e:
+        st.session_state.error_message = str(e)
+
+
+def count_total():
+    """計算查詢結果總筆數（僅在使用者要求時查詢）"""
+    results = st.session_state.query_results
+    db = DatabaseConnector(st.session_state.connection_string)
+    total = db.count_rows(st.session_state.generated_sql)
+    results["total"] = total if total is not None else "無法計算"
+
+
+def render_pagination(results: dict):
+    """渲染分頁控制列"""
+    page = results["page"]
+    page_size = sql_server_config.page_size
+    df = results["data"]
+    has_more = df.attrs.get("truncated", False)
+    start = page * page_size
+    
+    # 只有一頁時不需要分頁控制
+    if page == 0 and not has_more:
+        st.caption(f"共 {len(df)} 筆資料")
+        return
+    
+    col1, col2, col3, col4 = st.columns([1, 1, 3, 1])
+    with col1:
+        st.button("⬅️ 上一頁", width="stretch", disabled=page == 0,
+                  on_click=load_page, args=(page - 1,))
+    with col2:
+        st.button("下一頁 ➡️", width="stretch", disabled=not has_more,
+                  on_click=load_page, args=(page + 1,))
+    with col3:
+        caption = f"第 {page + 1} 頁，第 {start + 1} - {start + len(df)} 筆"
+        if results["total"] is not None:
+            caption += f"（共 {results['total']} 筆）"
+        st.caption(caption)
+    with col4:
+        if results["total"] is None:
+            st.button("計算總筆數", width="stretch", on_click=count_total)
+
+
 def render_main_content():
     """渲染主要內容區域"""
     st.title("🔄 NL2SQL")
@@ -162,18 +322,30 @@ def render_main_content():
             st.warning("請輸入查詢問題")
             return
         
-        # 執行查詢
-        with st.spinner("🤖 AI 正在分析並查詢資料庫..."):
-            result = run_query(query)
+        # 執行查詢（Agent 的文字與工具呼叫即時顯示在狀態區塊中）
+        with st.status("🤖 AI 正在分析並查詢資料庫...", expanded=True) as status:
+            result = run_query(query, on_event=agent_event_renderer(status))
+            status.update(
+                label="✅ 查詢完成" if result["success"] else "❌ 查詢失敗",
+                state="complete" if result["success"] else "error",
+                expanded=False
+            )
         
         # 儲存結果
         st.session_state.generated_sql = result["sql"]
         st.session_state.agent_response = result["explanation"]
+        st.session_state.query_timing = ""
+        if result["generation_time"] is not None:
+            st.session_state.query_timing = (
+                f"⏱️ 首次顯示 {result['first_output_time']:.1f} 秒，"
+                f"生成 SQL {result['generation_time']:.1f} 秒（LLM 請求 {result['llm_turns']} 次）"
+            )
         
         if result["success"]:
             st.session_state.query_results = {
-                "columns": result["columns"],
-                "rows": result["rows"]
+                "data": result["data"],
+                "page": 0,
+                "total": None
             }
             st.session_state.error_message = ""
         else:
@@ -186,17 +358,22 @@ def render_main_content():
         
         # 結果表格
         st.subheader("📊 查詢結果")
-        if results["rows"]:
-            import pandas as pd
-            df = pd.DataFrame(results["rows"], columns=results["columns"])
+        df = results["data"]
+        if len(df) or results["page"] > 0:
             st.dataframe(df, width="stretch", hide_index=True)
-            st.caption(f"共 {len(results['rows'])} 筆資料")
+            render_pagination(results)
         else:
             st.info("查詢成功，但沒有資料")
         
+        # 切換頁面失敗時保留目前頁面並顯示錯誤
+        if st.session_state.error_message:
+            st.error(f"❌ {st.session_state.error_message}")
+        
         # 可展開的 SQL 詳情
         with st.expander("📝 查看生成的 SQL"):
             st.code(st.session_state.generated_sql, language="sql")
+        if st.session_state.query_timing:
+            st.caption(st.session_state.query_timing)
     
     elif st.session_state.error_message:
         st.error(f"❌ {st.session_state.error_message}")
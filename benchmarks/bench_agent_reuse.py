@@ -0,0 +1,120 @@
+"""
+Agent 重複使用效能測試
+
+以本機模擬的 Azure OpenAI Chat Completions 端點比較：
+1. 每次提問都建立新的 SQLAgent（舊版 Streamlit rerun 行為）
+2. 透過 get_sql_agent() 重複使用同一個 Agent 與其 keep-alive HTTP 連線
+
+模擬端點在每條新連線建立時加上固定延遲，代表 TCP + TLS 交握成本。
+Agent Framework 只接受 https 端點，因此本測試固定以 Legacy 模式量測；
+兩種模式的客戶端建立與連線重用行為相同。
+
+執行方式：
+    python benchmarks/bench_agent_reuse.py --questions 30 --handshake-ms 30
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COMPLETION = {
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-4o",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "```sql\nSELECT TOP 10 [Name] FROM [Customers]\n```"},
+        "finish_reason": "stop",
+    }],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+}
+
+
+def start_server(handshake: float, latency: float) -> ThreadingHTTPServer:
+    """啟動模擬端點，回傳伺服器實例"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            # 新連線：模擬 TCP + TLS 交握
+            time.sleep(handshake)
+            super().setup()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            body = json.dumps(COMPLETION).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(ask, questions: int) -> list[float]:
+    """重複提問並回傳每次的耗時（毫秒）"""
+    timings = []
+    for i in range(questions):
+        start = time.perf_counter()
+        ask(f"列出所有客戶的姓名和電話 #{i}")
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent 重複使用效能測試")
+    parser.add_argument("--questions", type=int, default=30, help="重複提問次數")
+    parser.add_argument("--handshake-ms", type=float, default=30.0, help="每條新連線的模擬交握延遲（毫秒）")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="模擬端點的回應延遲（毫秒）")
+    args = parser.parse_args()
+
+    server = start_server(args.handshake_ms / 1000, args.latency_ms / 1000)
+    endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ["AZURE_OPENAI_ENDPOINT"] = endpoint
+    os.environ["AZURE_OPENAI_CHAT_DEPLOYMENT_NAME"] = "gpt-4o"
+
+    import sql_agent
+    from config import AzureOpenAIConfig
+    from sql_agent import SQLAgent, get_sql_agent
+
+    sql_agent.AGENT_FRAMEWORK_AVAILABLE = False
+
+    config = AzureOpenAIConfig(
+        endpoint=endpoint,
+        api_key="bench-key",
+        deployment_name="gpt-4o",
+        api_version="2025-03-01-preview",
+    )
+    schema = "資料庫 Schema：\n### 資料表: [dbo].[Customers]"
+
+    cold = measure(lambda q: SQLAgent(config, "azure").generate_sql(q, schema), args.questions)
+    warm = measure(lambda q: get_sql_agent(config, "azure").generate_sql(q, schema), args.questions)
+    server.shutdown()
+
+    print(f"模式: {get_sql_agent(config, 'azure').get_mode()}")
+    print(f"提問次數: {args.questions}，模擬交握: {args.handshake_ms} ms，端點延遲: {args.latency_ms} ms")
+    print(f"{'方式':<16}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+    for label, timings in (("每次新建 Agent", cold), ("共用 Agent", warm)):
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(f"{label:<16}{statistics.median(timings):>10.1f}{p95:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Agent 串流輸出測試
+
+以本機模擬的串流 Chat Client（固定的首個 token 延遲與每個 token 的間隔）與慢速資料庫，
+比較使用者第一次看到輸出的時間：
+1. 不串流：SQLAgent.run() 完成所有工具往返後才顯示結果
+2. 串流：SQLAgent.stream() 的第一個事件（工具呼叫或文字片段）即可顯示
+
+每次執行都是「呼叫 execute_sql 測試 → 輸出最終 SQL 與說明」兩輪。
+
+執行方式：
+    python benchmarks/bench_agent_streaming.py --runs 5 --first-token-ms 800 --query-ms 300
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agent_framework import (  # noqa: E402
+    BaseChatClient,
+    ChatMessage,
+    ChatResponse,
+    ChatResponseUpdate,
+    FunctionCallContent,
+    FunctionResultContent,
+    Role,
+    TextContent,
+    use_function_invocation,
+)
+
+from bench_concurrent_tools import install_slow_database  # noqa: E402
+from config import AzureOpenAIConfig  # noqa: E402
+from sql_agent import QuestionCache, SQLAgent, schema_cache  # noqa: E402
+
+SQL = "SELECT TOP 10 [Name], [Phone] FROM [Customers] ORDER BY [Name]"
+ANSWER = f"```sql\n{SQL}\n```\n這個查詢列出前 10 位客戶的姓名與電話，依姓名排序。"
+
+
+@use_function_invocation
+class StreamingChatClient(BaseChatClient):
+    """第一輪串流出 execute_sql 呼叫，收到工具結果後逐 token 串流出最終回答"""
+
+    def __init__(self, first_token: float, per_token: float, **kwargs):
+        super().__init__(**kwargs)
+        self.first_token = first_token
+        self.per_token = per_token
+
+    def _tokens(self, messages) -> list:
+        answered = any(
+            isinstance(content, FunctionResultContent)
+            for message in messages
+            for content in message.contents
+        )
+        if answered:
+            # 約每 4 個字元一個 token
+            return [TextContent(text=ANSWER[i:i + 4]) for i in range(0, len(ANSWER), 4)]
+        arguments = f'{{"sql": "{SQL}"}}'
+        return [FunctionCallContent(call_id="call_1", name="execute_sql", arguments="")] + [
+            FunctionCallContent(call_id="", name="", arguments=arguments[i:i + 4])
+            for i in range(0, len(arguments), 4)
+        ]
+
+    async def _inner_get_response(self, *, messages, chat_options, **kwargs):
+        contents = []
+        for i, content in enumerate(self._tokens(messages)):
+            await asyncio.sleep(self.first_token if i == 0 else self.per_token)
+            contents.append(content)
+        if isinstance(contents[0], FunctionCallContent):
+            arguments = "".join(content.arguments for content in contents)
+            contents = [FunctionCallContent(call_id="call_1", name="execute_sql", arguments=arguments)]
+        else:
+            contents = [TextContent(text="".join(content.text for content in contents))]
+        return ChatResponse(messages=[ChatMessage(role=Role.ASSISTANT, contents=contents)])
+
+    async def _inner_get_streaming_response(self, *, messages, chat_options, **kwargs):
+        for i, content in enumerate(self._tokens(messages)):
+            await asyncio.sleep(self.first_token if i == 0 else self.per_token)
+            yield ChatResponseUpdate(role=Role.ASSISTANT, contents=[content])
+
+
+def build_agent(first_token: float, per_token: float) -> SQLAgent:
+    """建立使用模擬 Chat Client 的 Agent（不使用問題快取）"""
+    config = AzureOpenAIConfig(endpoint="https://bench", api_key="bench", deployment_name="bench", api_version="bench")
+    agent = SQLAgent(config, cache=QuestionCache())
+    agent.chat_client = StreamingChatClient(first_token, per_token)
+    agent._use_agent_framework = True
+    agent.get_cached_sql = lambda *args, **kwargs: None
+    return agent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent 串流輸出測試")
+    parser.add_argument("--runs", type=int, default=5, help="每種模式的執行次數")
+    parser.add_argument("--first-token-ms", type=float, default=800.0, help="每輪 LLM 回應的首個 token 延遲（毫秒）")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="之後每個 token 的間隔（毫秒）")
+    parser.add_argument("--query-ms", type=float, default=300.0, help="模擬查詢的阻塞時間（毫秒）")
+    args = parser.parse_args()
+
+    install_slow_database(args.query_ms / 1000)
+    schema_cache.get_version = lambda connection_string=None: "bench"
+    agent = build_agent(args.first_token_ms / 1000, args.token_ms / 1000)
+
+    blocking, streaming_first, streaming_total, events = [], [], [], []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        result = agent.run("列出客戶")
+        blocking.append(time.perf_counter() - start)
+        assert result.executed and result.sql == SQL
+
+        count = 0
+        for event in agent.stream("列出客戶"):
+            count += 1
+            if event.kind == "final":
+                assert event.result.executed and event.result.sql == SQL
+                streaming_first.append(event.result.first_output_time)
+                streaming_total.append(event.result.generation_time)
+        events.append(count)
+
+    print(f"執行次數: {args.runs}，首個 token: {args.first_token_ms} ms，"
+          f"token 間隔: {args.token_ms} ms，查詢: {args.query_ms} ms")
+    print(f"{'模式':<10}{'首次可見輸出 (秒)':>18}{'總耗時 (秒)':>14}")
+    print(f"{'不串流':<10}{statistics.median(blocking):>18.3f}{statistics.median(blocking):>14.3f}")
+    print(f"{'串流':<10}{statistics.median(streaming_first):>18.3f}{statistics.median(streaming_total):>14.3f}")
+    print(f"每次串流事件數（中位數）: {statistics.median(events):.0f}")
+
+
+if __name__ == "__main__":
+    main()
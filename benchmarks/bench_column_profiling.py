@@ -0,0 +1,240 @@
+"""
+欄位統計（值提示）測試
+
+1. 抽樣成本：以模擬的資料庫（依 TOP 與 TABLESAMPLE 比例計算讀取的資料列數）抽樣三種大小的資料表，
+   確認大型資料表只讀取部分資料頁，不會完整掃描
+2. 探索查詢：以本機模擬的 LLM 依序回答需要代碼值的問題（例如「已出貨」→ [Status] = 'SHP'）
+   - 無值提示：先以 execute_sql 執行 SELECT DISTINCT 探索欄位值，再撰寫並測試 SQL
+   - 值提示：預先載入的 Schema 已附上常見值，直接撰寫並測試 SQL
+   比較每個問題的 LLM 請求次數與探索查詢次數
+
+執行方式：
+    python benchmarks/bench_column_profiling.py --sample-rows 5000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_framework import (  # noqa: E402
+    BaseChatClient,
+    ChatMessage,
+    ChatResponse,
+    FunctionCallContent,
+    FunctionResultContent,
+    Role,
+    TextContent,
+    use_function_invocation,
+)
+
+import agent_tools  # noqa: E402
+import sql_agent  # noqa: E402
+from column_profiler import ColumnProfiler  # noqa: E402
+from config import AzureOpenAIConfig  # noqa: E402
+from db_connector import DatabaseConnector  # noqa: E402
+from example_store import ExampleStore  # noqa: E402
+from schema_extractor import render_tables  # noqa: E402
+from sql_agent import QuestionCache, SQLAgent, schema_cache  # noqa: E402
+
+# 資料表：(名稱, 資料列數, 代碼欄位, {說法: 代碼})
+TABLES = [
+    ("Employees", 10, "Department", {"工程部": "ENG", "行銷部": "MKT", "業務部": "SAL"}),
+    ("Orders", 50_000, "Status", {"已出貨": "SHP", "處理中": "PRC", "已取消": "CXL"}),
+    ("OrderLines", 20_000_000, "LineType", {"贈品": "G", "一般商品": "N", "退貨": "R"}),
+]
+
+
+def build_tables() -> list[dict]:
+    """產生資料表資訊（格式同 get_schema_metadata）"""
+    tables = []
+    for object_id, (name, _, code_column, _) in enumerate(TABLES, start=1):
+        columns = [
+            {"name": f"{name}ID", "data_type": "int", "max_length": None, "nullable": "NO", "primary_key": True},
+            {"name": code_column, "data_type": "varchar", "max_length": 3, "nullable": "NO", "primary_key": False},
+            {"name": "Notes", "data_type": "nvarchar", "max_length": -1, "nullable": "YES", "primary_key": False},
+            {"name": "CreatedAt", "data_type": "datetime", "max_length": None, "nullable": "YES", "primary_key": False},
+        ]
+        tables.append({
+            "schema": "dbo", "name": name, "type": "BASE TABLE", "object_id": object_id,
+            "columns": columns, "primary_key": [f"{name}ID"], "foreign_keys": [],
+        })
+    return tables
+
+
+class SimulatedDatabase:
+    """依 SQL 產生資料，並記錄每個查詢實際讀取的資料列數"""
+
+    def __init__(self, tables: list[dict]):
+        self.tables = {table["name"]: table for table in tables}
+        self.sizes = {name: size for name, size, _, _ in TABLES}
+        self.codes = {name: list(codes.values()) for name, _, _, codes in TABLES}
+        self.rows_read = 0
+        self.exploration_queries = 0
+
+    def install(self):
+        database = self
+
+        def execute_query(connector, sql, cache=False):
+            return database.execute(sql)
+
+        def fetch_preview(connector, sql, *args, **kwargs):
+            if "DISTINCT" in sql.upper():
+                database.exploration_queries += 1
+            columns, rows = database.execute(sql)
+            return columns, rows[:50], False
+
+        DatabaseConnector.execute_query = execute_query
+        DatabaseConnector.fetch_preview = fetch_preview
+        DatabaseConnector.guard_query = lambda connector, sql: sql
+        agent_tools.sql_validation_enabled = False
+
+    def execute(self, sql: str) -> tuple[list[str], list[tuple]]:
+        match = re.search(r"object_id = (\d+)", sql)
+        if match:
+            name = next(name for name, table in self.tables.items() if table["object_id"] == int(match.group(1)))
+            return [""], [(self.sizes[name],)]
+
+        name = re.search(r"FROM (?:\[dbo\]\.)?\[(\w+)\]", sql).group(1)
+        size = self.sizes[name]
+        top = re.search(r"TOP \((\d+)\)", sql)
+        percent = re.search(r"TABLESAMPLE SYSTEM \(([\d.]+) PERCENT\)", sql)
+        # TABLESAMPLE 只讀取抽中的資料頁；沒有 TABLESAMPLE 時讀到 TOP 筆數即停止
+        scanned = int(size * float(percent.group(1)) / 100) if percent else size
+        count = min(scanned, int(top.group(1))) if top else scanned
+        self.rows_read += count
+
+        if "DISTINCT" in sql.upper():
+            column = re.search(r"DISTINCT (?:TOP \d+ )?\[(\w+)\]", sql).group(1)
+            return [column], [(code,) for code in self.codes[name]]
+        rng = random.Random(name)
+        columns = re.findall(r"(?:^SELECT TOP \(\d+\) |, )(?:CAST\()?\[(\w+)\]", sql)
+        rows = []
+        for i in range(min(count, 20_000)):
+            values = {
+                f"{name}ID": i + 1,
+                "Notes": None if i % 5 == 0 else ("" if i % 7 == 0 else f"備註 {i}"),
+                "CreatedAt": None,
+            }
+            row = tuple(values.get(column, rng.choice(self.codes[name])) for column in columns)
+            rows.append(row)
+        return columns, rows
+
+
+@use_function_invocation
+class SimulatedModel(BaseChatClient):
+    """不知道代碼值時先執行 SELECT DISTINCT 探索，知道後撰寫並測試 SQL"""
+
+    def __init__(self, answers: dict, **kwargs):
+        super().__init__(**kwargs)
+        self.answers = answers
+
+    async def _inner_get_response(self, *, messages, chat_options, **kwargs):
+        question = next(message.text for message in messages if message.role == Role.USER)
+        table, column, code = self.answers[question]
+        context = "\n".join(
+            str(content.result) if isinstance(content, FunctionResultContent) else getattr(content, "text", "") or ""
+            for message in messages if message.role != Role.USER for content in message.contents
+        )
+        sql = f"SELECT TOP 100 * FROM [{table}] WHERE [{column}] = '{code}'"
+        tested = any(
+            isinstance(content, FunctionCallContent) and content.arguments == {"sql": sql}
+            for message in messages for content in message.contents
+        )
+        if tested:
+            contents = [TextContent(text=f"```sql\n{sql}\n```")]
+        elif re.search(rf"\b{code}\b", context):
+            contents = [FunctionCallContent(call_id=uuid.uuid4().hex, name="execute_sql", arguments={"sql": sql})]
+        else:
+            explore = f"SELECT DISTINCT TOP 50 [{column}] FROM [{table}]"
+            contents = [FunctionCallContent(call_id=uuid.uuid4().hex, name="execute_sql", arguments={"sql": explore})]
+        return ChatResponse(messages=[ChatMessage(role=Role.ASSISTANT, contents=contents)])
+
+    async def _inner_get_streaming_response(self, *, messages, chat_options, **kwargs):
+        raise NotImplementedError
+        yield
+
+
+def build_questions() -> dict:
+    """問題 → (資料表, 代碼欄位, 代碼)"""
+    questions = {}
+    for name, _, column, codes in TABLES:
+        for phrase, code in codes.items():
+            questions[f"列出{phrase}的 {name} 資料"] = (name, column, code)
+    return questions
+
+
+def measure_profiling(tables: list[dict], database: SimulatedDatabase, sample_rows: int) -> ColumnProfiler:
+    """抽樣每張資料表，列出讀取的資料列數與耗時"""
+    profiler = ColumnProfiler(sample_rows=sample_rows, min_interval=0)
+    print(f"{'資料表':<12}{'資料列數':>14}{'抽樣方式':>14}{'讀取列數':>12}{'讀取比例':>10}{'耗時 (ms)':>12}")
+    for table in tables:
+        database.rows_read = 0
+        profile = profiler.profile_table(table, "bench")
+        size = database.sizes[table["name"]]
+        print(f"{table['name']:<12}{size:>14,}{profile.sampling:>14}{database.rows_read:>12,}"
+              f"{database.rows_read / size:>10.2%}{profile.elapsed * 1000:>12.1f}")
+    print()
+    print(profiler.get_profile(tables[1], "bench").format(informative_only=True))
+    print()
+    return profiler
+
+
+def replay(questions: dict, hints: bool, database: SimulatedDatabase) -> tuple[list[int], int]:
+    """依序回答所有問題，回傳每個問題的 LLM 請求次數與探索查詢次數"""
+    sql_agent.column_profile_hint_tokens = 600 if hints else 0
+    config = AzureOpenAIConfig(endpoint="https://bench", api_key="bench", deployment_name="bench", api_version="bench")
+    agent = SQLAgent(config, cache=QuestionCache(), schema_injection="hybrid", examples=ExampleStore(), few_shot=0)
+    agent.chat_client = SimulatedModel(questions)
+    agent._use_agent_framework = True
+    agent.get_cached_sql = lambda *args, **kwargs: None
+
+    database.exploration_queries = 0
+    turns = []
+    for question, (table, column, code) in questions.items():
+        result = asyncio.run(agent.run_async(question))
+        assert result.executed and f"'{code}'" in result.sql, result.response
+        turns.append(result.llm_turns)
+    return turns, database.exploration_queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="欄位統計（值提示）測試")
+    parser.add_argument("--sample-rows", type=int, default=5000, help="每張資料表抽樣的列數上限")
+    args = parser.parse_args()
+
+    tables = build_tables()
+    database = SimulatedDatabase(tables)
+    database.install()
+    profiler = measure_profiling(tables, database, args.sample_rows)
+
+    # 預先載入的 Schema 使用抽樣完成的統計
+    sql_agent.column_profiler = profiler
+    schema_cache.get_relevant_schema = lambda question, *args, **kwargs: render_tables(tables, "ddl")
+    schema_cache.get_relevant_tables = lambda question, *args, **kwargs: tables
+    schema_cache.get_version = lambda connection_string=None: "bench"
+    profiler.describe = (lambda describe: lambda tables, connection_string=None, token_budget=None:
+                         describe(tables, "bench", token_budget))(profiler.describe)
+
+    questions = build_questions()
+    print(f"問題數: {len(questions)}")
+    print(f"{'模式':<10}{'平均 LLM 請求':>14}{'探索查詢':>10}{'耗時 (秒)':>12}")
+    summary = {}
+    for label, hints in (("無值提示", False), ("值提示", True)):
+        start = time.perf_counter()
+        turns, explorations = replay(questions, hints, database)
+        summary[label] = statistics.mean(turns)
+        print(f"{label:<10}{summary[label]:>14.2f}{explorations:>10}{time.perf_counter() - start:>12.3f}")
+    saved = summary["無值提示"] - summary["值提示"]
+    print(f"每個問題減少 {saved:.2f} 次 LLM 請求（{saved / summary['無值提示']:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
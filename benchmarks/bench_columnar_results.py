@@ -0,0 +1,140 @@
+"""
+欄位式結果效能測試
+
+以模擬游標產生 100 萬筆合成結果，比較 Web UI 結果表格的兩種建立方式：
+1. 舊版：execute_query 的 tuple 列表 → pd.DataFrame(rows, columns=...)
+2. 欄位式：execute_columnar 逐批轉置為型別化陣列後直接組成 DataFrame
+
+以 tracemalloc 量測峰值記憶體與最終 DataFrame 的大小；耗時另外在未啟用 tracemalloc 時量測
+（tracemalloc 追蹤每次配置，會讓配置次數不同的兩種方式耗時失真）。
+
+執行方式：
+    python benchmarks/bench_columnar_results.py --rows 1000000
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_connector import DatabaseConnector  # noqa: E402
+
+START = datetime(2024, 1, 1)
+
+
+class StandInCursor:
+    """依需求產生合成資料列的模擬游標（description 與 pyodbc 相同格式）"""
+
+    description = [
+        ("OrderID", int, None, 10, 10, 0, False),
+        ("CustomerID", int, None, 10, 10, 0, True),
+        ("TotalAmount", float, None, 53, 53, 0, True),
+        ("Status", str, None, 20, 20, 0, True),
+        ("OrderDate", datetime, None, 23, 23, 3, True),
+    ]
+
+    def __init__(self, row_count: int):
+        self._rows = (
+            (
+                i,
+                None if i % 17 == 0 else i % 5000,
+                float(i % 9973) * 1.5,
+                ("Pending", "Shipped", "Delivered", "Cancelled")[i % 4],
+                START + timedelta(minutes=i),
+            )
+            for i in range(row_count)
+        )
+
+    def execute(self, sql):
+        pass
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchmany(self, size):
+        return list(itertools.islice(self._rows, size))
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class StandInConnector(DatabaseConnector):
+    """不連線資料庫，直接提供模擬游標的連線器"""
+
+    def __init__(self, row_count: int):
+        super().__init__("stand-in")
+        self.row_count = row_count
+
+    def get_connection(self):
+        connector = self
+
+        class Connection:
+            def cursor(self):
+                return StandInCursor(connector.row_count)
+
+        class Context:
+            def __enter__(self):
+                return Connection()
+
+            def __exit__(self, *exc):
+                return False
+
+        return Context()
+
+
+def tuple_path(db: DatabaseConnector):
+    """舊版：tuple 列表再建立 DataFrame"""
+    import pandas as pd
+
+    columns, rows = db.execute_query("SELECT * FROM [Orders]")
+    return pd.DataFrame(rows, columns=columns), rows
+
+
+def columnar_path(db: DatabaseConnector):
+    """欄位式：直接建立 DataFrame"""
+    return db.execute_columnar("SELECT * FROM [Orders]"), None
+
+
+def measure(func, db: DatabaseConnector):
+    """回傳 (峰值記憶體 MB, 耗時秒數, 常駐結果 MB)；耗時取未啟用 tracemalloc 的一次執行"""
+    start = time.perf_counter()
+    df, rows = func(db)
+    seconds = time.perf_counter() - start
+    del df, rows
+
+    tracemalloc.start()
+    df, rows = func(db)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del df, rows
+    return peak / 1024 / 1024, seconds, retained / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="欄位式結果效能測試")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="合成結果筆數")
+    args = parser.parse_args()
+
+    import pandas  # noqa: F401  預先載入，避免計入第一次量測
+
+    db = StandInConnector(args.rows)
+    print(f"結果筆數: {args.rows:,}")
+    print(f"{'方式':<14}{'峰值 (MB)':>12}{'常駐 (MB)':>12}{'耗時 (秒)':>10}")
+    for label, func in (("tuple 列表", tuple_path), ("欄位式", columnar_path)):
+        peak, seconds, retained = measure(func, db)
+        print(f"{label:<14}{peak:>12.1f}{retained:>12.1f}{seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+工具並行執行測試
+
+以模擬的慢速資料庫（每次查詢阻塞固定秒數）與本機假的 Chat Client，
+同時啟動 N 個 ChatAgent 執行，每個執行都會呼叫一次 execute_sql 工具：
+1. 同步工具：pyodbc 呼叫直接在事件迴圈上阻塞，N 個執行依序完成
+2. 非同步工具：資料庫工作交給執行緒池，N 個執行彼此重疊
+
+非同步工具未能重疊執行時以非零結束碼離開。
+
+執行方式：
+    python benchmarks/bench_concurrent_tools.py --runs 8 --query-ms 300
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_framework import (  # noqa: E402
+    BaseChatClient,
+    ChatAgent,
+    ChatMessage,
+    ChatResponse,
+    FunctionCallContent,
+    FunctionResultContent,
+    Role,
+    TextContent,
+    use_function_invocation,
+)
+
+import agent_tools  # noqa: E402
+from db_connector import DatabaseConnector  # noqa: E402
+
+
+@use_function_invocation
+class ScriptedChatClient(BaseChatClient):
+    """第一輪要求呼叫 execute_sql，收到工具結果後回傳最終 SQL"""
+
+    async def _inner_get_response(self, *, messages, chat_options, **kwargs):
+        answered = any(
+            isinstance(content, FunctionResultContent)
+            for message in messages
+            for content in message.contents
+        )
+        if answered:
+            contents = [TextContent(text="```sql\nSELECT TOP 10 [Name] FROM [Customers]\n```")]
+        else:
+            contents = [FunctionCallContent(
+                call_id=uuid.uuid4().hex,
+                name="execute_sql",
+                arguments={"sql": "SELECT TOP 10 [Name] FROM [Customers]"},
+            )]
+        return ChatResponse(messages=[ChatMessage(role=Role.ASSISTANT, contents=contents)])
+
+    async def _inner_get_streaming_response(self, *, messages, chat_options, **kwargs):
+        raise NotImplementedError
+        yield
+
+
+def install_slow_database(delay: float):
+    """以阻塞固定秒數的假查詢取代真正的資料庫呼叫"""
+
+    def fetch_preview(self, sql, *args, **kwargs):
+        time.sleep(delay)
+        return ["Name"], [("大衛",)], False
+
+    DatabaseConnector.fetch_preview = fetch_preview
+    DatabaseConnector.guard_query = lambda self, sql: sql
+
+
+async def run_agents(tool, runs: int) -> float:
+    """同時執行 N 個 Agent，回傳總耗時（秒）"""
+    agent = ChatAgent(chat_client=ScriptedChatClient(), instructions="bench", tools=[tool])
+    start = time.perf_counter()
+    await asyncio.gather(*(agent.run(f"列出客戶 #{i}") for i in range(runs)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="工具並行執行測試")
+    parser.add_argument("--runs", type=int, default=8, help="同時執行的 Agent 數量")
+    parser.add_argument("--query-ms", type=float, default=300.0, help="模擬查詢的阻塞時間（毫秒）")
+    args = parser.parse_args()
+
+    delay = args.query_ms / 1000
+    install_slow_database(delay)
+
+    sync_seconds = asyncio.run(run_agents(agent_tools.execute_sql, args.runs))
+    async_seconds = asyncio.run(run_agents(agent_tools.execute_sql_async, args.runs))
+
+    # 執行緒池滿載時分批重疊，理想耗時為批次數 × 查詢時間
+    batches = math.ceil(args.runs / agent_tools.tool_max_workers)
+    overlapped = async_seconds < (batches + 1) * delay and async_seconds * 2 < sync_seconds
+    print(f"Agent 數: {args.runs}，每次查詢: {args.query_ms} ms，執行緒池上限: {agent_tools.tool_max_workers}")
+    print(f"同步工具總耗時:   {sync_seconds:.2f} 秒")
+    print(f"非同步工具總耗時: {async_seconds:.2f} 秒")
+    print(f"重疊執行: {'是' if overlapped else '否'}")
+    sys.exit(0 if overlapped else 1)
+
+
+if __name__ == "__main__":
+    main()
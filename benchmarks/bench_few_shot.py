@@ -0,0 +1,228 @@
+"""
+範例問答庫（few-shot）重播測試
+
+以 tests/test_data.sql 的 Employees 資料表為背景，依序重播一組問題（同一類問題換部門、人數、月份等條件），
+比較關閉與開啟範例問答庫時每個問題的工具呼叫輪數與 LLM 請求次數。
+
+本機模擬的 LLM 對每一類問題有固定的第一次錯誤：
+- 非空條件只寫 IS NOT NULL（execute_sql 的結果中仍有空字串）
+- 猜錯欄位名稱（[Status]、[Score]、[StartDate]、[Birthday]，資料庫回報 Invalid column name）
+看到錯誤後第二次即寫出正確 SQL；提示詞中的範例已包含該類問題的正確寫法時，第一次就寫對。
+另有一類沒有陷阱的問題作為對照。每個問題執行成功後與 app.py 相同呼叫 remember_sql 寫入範例庫。
+
+另外以大量範例測試搜尋延遲，以及 Schema 版本變更後舊範例不再被取用（其他資料庫的範例不受影響）。
+
+執行方式：
+    python benchmarks/bench_few_shot.py --questions 80 --top-k 3
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_framework import (  # noqa: E402
+    BaseChatClient,
+    ChatMessage,
+    ChatResponse,
+    FunctionCallContent,
+    FunctionResultContent,
+    Role,
+    TextContent,
+    use_function_invocation,
+)
+
+import agent_tools  # noqa: E402
+from config import AzureOpenAIConfig  # noqa: E402
+from db_connector import DatabaseConnector  # noqa: E402
+from example_store import ExampleStore  # noqa: E402
+from sql_agent import QuestionCache, SQLAgent, schema_cache  # noqa: E402
+
+# execute_sql 結果表格中的空字串欄位值（「張三 | 」或「 |  | 」）
+EMPTY_CELL = re.compile(r"\| (?:\||$)", re.MULTILINE)
+
+DEPARTMENTS = ["工程部", "行銷部", "人資部", "財務部", "業務部"]
+
+SCHEMA = """Employees(EmployeeID int PK, Name nvarchar(100), Email nvarchar(200), Phone nvarchar(50), Department nvarchar(100),
+Notes nvarchar(500), Salary decimal(10,2), BirthDate date, HireDate date, IsActive bit, PerformanceScore int)"""
+
+# (問題範本, 第一次的錯誤寫法, 正確寫法, 正確寫法的特徵)；{dept}、{n}、{month} 於產生問題時代入
+FAMILIES = [
+    (["列出{dept}有 Email 的員工", "{dept}有填 Email 的員工有哪些", "查詢{dept} Email 不是空的員工"],
+     "[Email] IS NOT NULL", "[Email] IS NOT NULL AND [Email] <> ''", "[Email] <> ''"),
+    (["列出{dept}有電話的員工", "{dept}哪些員工有留電話", "查詢{dept}電話有值的員工"],
+     "[Phone] IS NOT NULL", "[Phone] IS NOT NULL AND [Phone] <> ''", "[Phone] <> ''"),
+    (["{dept}在職員工名單", "列出{dept}目前在職的員工", "{dept}還在職的員工有誰"],
+     "[Status] = 'Active'", "[IsActive] = 1", "[IsActive]"),
+    (["{dept}績效最高的 {n} 位員工", "列出{dept}績效分數前 {n} 名", "{dept}績效前 {n} 高的員工"],
+     "[Score] >= 0", "[PerformanceScore] >= 0", "[PerformanceScore]"),
+    (["{dept}年資超過 {n} 年的員工", "列出{dept}到職滿 {n} 年的員工", "{dept}服務 {n} 年以上的員工"],
+     "DATEDIFF(YEAR, [StartDate], GETDATE()) >= {n}", "DATEDIFF(YEAR, [HireDate], GETDATE()) >= {n}", "[HireDate]"),
+    (["{month} 月生日的{dept}員工", "{dept}有誰是 {month} 月生日", "列出{dept} {month} 月出生的員工"],
+     "MONTH([Birthday]) = {month}", "MONTH([BirthDate]) = {month}", "[BirthDate]"),
+    # 對照組：沒有陷阱
+    (["{dept}的平均薪資", "計算{dept}員工平均薪水", "{dept}平均薪資是多少"],
+     "[Salary] IS NOT NULL", "[Salary] IS NOT NULL", ""),
+]
+
+
+def build_workload(count: int, seed: int = 11) -> list[tuple[str, str, str, str]]:
+    """產生重播的問題：(問題, 錯誤 SQL, 正確 SQL, 正確寫法的特徵)"""
+    rng = random.Random(seed)
+    workload = []
+    for _ in range(count):
+        templates, naive, fixed, marker = rng.choice(FAMILIES)
+        values = {"dept": rng.choice(DEPARTMENTS), "n": rng.choice([3, 5, 10]), "month": rng.randint(1, 12)}
+        condition = f"[Department] = N'{values['dept']}'"
+        workload.append((
+            rng.choice(templates).format(**values),
+            f"SELECT TOP 100 [Name] FROM [Employees] WHERE {condition} AND {naive.format(**values)}",
+            f"SELECT TOP 100 [Name] FROM [Employees] WHERE {condition} AND {fixed.format(**values)}",
+            marker,
+        ))
+    return workload
+
+
+@use_function_invocation
+class SimulatedModel(BaseChatClient):
+    """第一次寫出該類問題的錯誤 SQL，除非提示詞中的範例已示範正確寫法；依工具結果修正後再回答"""
+
+    def __init__(self, workload: list, **kwargs):
+        super().__init__(**kwargs)
+        self.answers = {question: (naive, fixed, marker) for question, naive, fixed, marker in workload}
+
+    async def _inner_get_response(self, *, messages, chat_options, **kwargs):
+        question = next(message.text for message in messages if message.role == Role.USER)
+        naive, fixed, marker = self.answers[question]
+        instructions = "\n".join(message.text for message in messages if message.role == Role.SYSTEM)
+        results = [
+            str(content.result) for message in messages for content in message.contents
+            if isinstance(content, FunctionResultContent)
+        ]
+
+        if results and "錯誤" not in results[-1] and not EMPTY_CELL.search(results[-1]):
+            contents = [TextContent(text=f"```sql\n{self._last_sql(messages)}\n```")]
+        else:
+            sql = fixed if results or marker in instructions else naive
+            contents = [FunctionCallContent(call_id=uuid.uuid4().hex, name="execute_sql", arguments={"sql": sql})]
+        return ChatResponse(messages=[ChatMessage(role=Role.ASSISTANT, contents=contents)])
+
+    @staticmethod
+    def _last_sql(messages) -> str:
+        calls = [
+            content for message in messages for content in message.contents
+            if isinstance(content, FunctionCallContent) and content.name == "execute_sql"
+        ]
+        arguments = calls[-1].arguments
+        return arguments["sql"] if isinstance(arguments, dict) else arguments
+
+    async def _inner_get_streaming_response(self, *, messages, chat_options, **kwargs):
+        raise NotImplementedError
+        yield
+
+
+def install_database():
+    """以記憶體中的假資料取代資料庫：猜錯的欄位回報 Invalid column name，只檢查 IS NOT NULL 時含空字串"""
+    bad_columns = ["Status", "Score", "StartDate", "Birthday"]
+
+    def fetch_preview(self, sql, *args, **kwargs):
+        for column in bad_columns:
+            if f"[{column}]" in sql:
+                raise RuntimeError(f"Invalid column name '{column}'.")
+        for column in ("Email", "Phone"):
+            if f"[{column}] IS NOT NULL" in sql and f"[{column}] <> ''" not in sql:
+                return ["Name", column], [("張三", "a@example.com"), ("趙六", ""), ("林八", "")], False
+        return ["Name"], [("張三",), ("李四",)], False
+
+    DatabaseConnector.fetch_preview = fetch_preview
+    DatabaseConnector.guard_query = lambda self, sql: sql
+    agent_tools.sql_validation_enabled = False
+    schema_cache.get_relevant_schema = lambda question, *args, **kwargs: SCHEMA
+    schema_cache.get_version = lambda connection_string=None: "bench"
+
+
+def replay(workload: list, top_k: int) -> list[int]:
+    """依序重播所有問題，回傳每個問題的 LLM 請求次數"""
+    config = AzureOpenAIConfig(endpoint="https://bench", api_key="bench", deployment_name="bench", api_version="bench")
+    agent = SQLAgent(config, cache=QuestionCache(), examples=ExampleStore(), few_shot=top_k)
+    agent.chat_client = SimulatedModel(workload)
+    agent._use_agent_framework = True
+    agent.get_cached_sql = lambda *args, **kwargs: None
+
+    turns = []
+    for question, _, fixed, _ in workload:
+        result = asyncio.run(agent.run_async(question))
+        assert result.executed and result.sql == fixed, result.response
+        agent.remember_sql(question, result.response)
+        turns.append(result.llm_turns)
+    return turns
+
+
+def search_latency(entries: int, top_k: int) -> tuple[float, float, int]:
+    """
+    以大量範例測試搜尋延遲與 Schema 版本淘汰
+
+    Returns:
+        tuple: (建立每筆範例的毫秒數, 每次搜尋的毫秒數, 版本變更後命中的範例數)
+    """
+    workload = build_workload(entries, seed=5)
+    store = ExampleStore(max_entries=entries)
+    start = time.perf_counter()
+    for i, (question, _, fixed, _) in enumerate(workload):
+        store.add(f"{question} #{i}", fixed, "v1")
+    add_ms = (time.perf_counter() - start) * 1000 / entries
+
+    queries = [question for question, *_ in build_workload(200, seed=7)]
+    start = time.perf_counter()
+    for question in queries:
+        store.search(question, "v1", top_k)
+    search_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    # Schema 變更：新版本的範例寫入後，舊版本的範例不會被取用，超過 max_versions 時整批淘汰；
+    # 版本數依資料庫分開計算，另一個資料庫的範例仍保留
+    store.add(workload[0][0], workload[0][2], "v1", database="other")
+    store.add(workload[0][0], workload[0][2], "v2")
+    store.add(workload[1][0], workload[1][2], "v3")
+    stale = len(store.search(queries[0], "v1", top_k))
+    assert store.search(workload[0][0], "v1", top_k, database="other")
+    return add_ms, search_ms, stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description="範例問答庫重播測試")
+    parser.add_argument("--questions", type=int, default=80, help="重播的問題數")
+    parser.add_argument("--top-k", type=int, default=3, help="每次放入提示詞的範例數")
+    parser.add_argument("--entries", type=int, default=500, help="搜尋延遲測試的範例數")
+    args = parser.parse_args()
+
+    install_database()
+    workload = build_workload(args.questions)
+    print(f"問題數: {args.questions}，問題類別: {len(FAMILIES)}（含 1 類對照組），範例數 top-k: {args.top_k}")
+    print(f"{'模式':<10}{'平均工具輪數':>12}{'平均 LLM 請求':>14}{'一次寫對':>10}{'後半段工具輪數':>16}")
+    summary = {}
+    for label, top_k in (("無範例", 0), ("範例庫", args.top_k)):
+        turns = replay(workload, top_k)
+        # 每一輪工具結果之後都會再請求一次 LLM，工具輪數 = LLM 請求次數 - 1
+        rounds = [turn - 1 for turn in turns]
+        first_try = sum(1 for value in rounds if value == 1) / len(rounds)
+        later = statistics.mean(rounds[len(rounds) // 2:])
+        summary[label] = statistics.mean(rounds)
+        print(f"{label:<10}{summary[label]:>12.2f}{statistics.mean(turns):>14.2f}{first_try:>10.0%}{later:>16.2f}")
+
+    saved = summary["無範例"] - summary["範例庫"]
+    print(f"每個問題減少 {saved:.2f} 輪工具呼叫（{saved / summary['無範例']:.0%}）")
+
+    add_ms, search_ms, stale = search_latency(args.entries, args.top_k)
+    print(f"{args.entries} 筆範例：寫入 {add_ms:.3f} ms/筆，搜尋 {search_ms:.3f} ms/次，"
+          f"Schema 版本淘汰後舊版本命中 {stale} 筆")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+模組匯入時間測試
+
+每個情境都在新的 Python 行程中以 -X importtime 執行，取多次的中位數：
+1. 只匯入模組（CLI 工具與測試常見的用法）
+2. 匯入後存取預設實例或建立 Agent（第一次真正使用時才付出的成本）
+
+並列出匯入後已載入的重量級套件，確認只匯入 db_connector / schema_extractor
+時不會載入 Agent Framework、OpenAI SDK、pyodbc 或 pandas。
+
+執行方式：
+    python benchmarks/bench_import_time.py --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("agent_framework", "openai", "pyodbc", "pandas", "dotenv")
+
+# (說明, 要執行的程式碼)
+SCENARIOS = [
+    ("import config", "import config"),
+    ("import db_connector", "import db_connector"),
+    ("import schema_extractor", "import schema_extractor"),
+    ("import sql_validator", "import sql_validator"),
+    ("import sql_agent", "import sql_agent"),
+    ("import agent_tools", "import agent_tools"),
+    # 第一次建立 Agent 時才匯入的部分（Agent Framework、OpenAI SDK 與工具）
+    ("建立 Agent 時的匯入", "import sql_agent; sql_agent.agent_framework_available(); import agent_tools"),
+]
+
+REPORT = (
+    "import sys; "
+    "print('LOADED=' + ','.join(m for m in {heavy!r} if m in sys.modules))"
+)
+
+
+def measure(code: str) -> tuple[float, list[str]]:
+    """
+    在新的行程中執行程式碼，並解析 -X importtime 的輸出
+
+    只計算執行程式碼期間的頂層匯入（不含直譯器啟動時的 site 等模組）。
+
+    Returns:
+        tuple: (匯入耗時秒數, 已載入的重量級套件)
+    """
+    script = f"import sys; sys.stderr.write('BEGIN\\n'); {code}; " + REPORT.format(heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    lines = result.stderr.splitlines()
+    top_level = []
+    for line in lines[lines.index("BEGIN") + 1:]:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # 縮排的是被其他模組間接匯入的模組，已計入上層的累計時間
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            continue
+        top_level.append(int(cumulative) / 1e6)
+    values = dict(line.split("=", 1) for line in result.stdout.splitlines() if "=" in line)
+    loaded = [name for name in values.get("LOADED", "").split(",") if name]
+    return sum(top_level), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模組匯入時間測試")
+    parser.add_argument("--runs", type=int, default=5, help="每個情境的執行次數（取中位數）")
+    args = parser.parse_args()
+
+    print(f"{'情境':<28}{'中位數 (ms)':>12}  已載入的重量級套件")
+    for label, code in SCENARIOS:
+        try:
+            samples = [measure(code) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{label:<28}{'失敗':>12}  {e}")
+            continue
+        elapsed = statistics.median(seconds for seconds, _ in samples)
+        print(f"{label:<28}{elapsed * 1000:>12.1f}  {', '.join(samples[-1][1]) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
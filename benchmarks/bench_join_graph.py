@@ -0,0 +1,282 @@
+"""
+外鍵關聯圖（JOIN 路徑）測試
+
+1. 規模：以隨機產生的大型 Schema（預設 3000 張資料表）建立關聯圖，
+   測量建立時間、第一次從某張資料表出發的路徑搜尋（BFS）與重複出發（快取）的延遲，
+   並與預先計算所有資料表兩兩之間路徑的成本比較
+2. JOIN 錯誤：以本機模擬的 LLM 回答需要 JOIN 的問題，外鍵欄位名稱不依慣例命名（例如 Orders.[CustID] → Customers.[CustomerNo]），
+   預先載入的 Schema 只含問題提到的兩張資料表（不含中介資料表）
+   - 無 JOIN 提示：先以慣例猜測 JOIN 欄位，執行失敗後呼叫 get_join_path，再撰寫並測試 SQL
+   - JOIN 提示：預先載入的 Schema 已附上 JOIN 路徑，直接撰寫並測試 SQL
+   比較每個問題的 LLM 請求次數與第一次 JOIN 失敗的次數
+
+執行方式：
+    python benchmarks/bench_join_graph.py --tables 3000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_framework import (  # noqa: E402
+    BaseChatClient,
+    ChatMessage,
+    ChatResponse,
+    FunctionCallContent,
+    FunctionResultContent,
+    Role,
+    TextContent,
+    use_function_invocation,
+)
+
+import agent_tools  # noqa: E402
+import sql_agent  # noqa: E402
+from config import AzureOpenAIConfig  # noqa: E402
+from db_connector import DatabaseConnector  # noqa: E402
+from example_store import ExampleStore  # noqa: E402
+from join_graph import JoinGraph  # noqa: E402
+from schema_extractor import render_tables  # noqa: E402
+from sql_agent import QuestionCache, SQLAgent, schema_cache  # noqa: E402
+
+# 模擬的銷售資料庫：(資料表, 主鍵, [(外鍵欄位, 參照資料表, 參照欄位)])
+SALES_TABLES = [
+    ("Regions", "RegionCode", []),
+    ("Customers", "CustomerNo", [("RegionRef", "Regions", "RegionCode")]),
+    ("Employees", "EmpNo", [("Region", "Regions", "RegionCode")]),
+    ("Orders", "OrderID", [("CustID", "Customers", "CustomerNo"), ("SalesRep", "Employees", "EmpNo")]),
+    ("Suppliers", "SupplierNo", []),
+    ("Products", "Code", [("Vendor", "Suppliers", "SupplierNo")]),
+    ("OrderLines", "LineID", [("OrderRef", "Orders", "OrderID"), ("ProductCode", "Products", "Code")]),
+]
+
+# 需要 JOIN 的問題：(問題, 起點資料表, 終點資料表)
+QUESTIONS = [
+    ("列出每位客戶的訂單數", "Customers", "Orders"),
+    ("各地區的客戶數", "Regions", "Customers"),
+    ("每位業務負責的訂單金額", "Employees", "Orders"),
+    ("每位客戶買過哪些商品", "Customers", "Products"),
+    ("各供應商商品的銷售數量", "Suppliers", "OrderLines"),
+    ("各地區賣出的商品", "Regions", "Products"),
+    ("每張訂單的商品明細", "Orders", "Products"),
+    ("各業務賣出的供應商商品", "Employees", "Suppliers"),
+]
+
+
+def _table(name: str, key: str, fks: list, schema: str = "dbo") -> dict:
+    """產生資料表資訊（格式同 get_schema_metadata）"""
+    columns = [{"name": key, "data_type": "int", "max_length": None, "nullable": "NO", "primary_key": True}]
+    columns += [
+        {"name": column, "data_type": "int", "max_length": None, "nullable": "YES", "primary_key": False}
+        for column, _, _ in fks
+    ]
+    columns.append({"name": "Name", "data_type": "nvarchar", "max_length": 100, "nullable": "YES", "primary_key": False})
+    return {
+        "schema": schema, "name": name, "type": "BASE TABLE", "columns": columns, "primary_key": [key],
+        "foreign_keys": [
+            {"name": f"FK_{name}_{ref}_{column}", "columns": [column], "ref_schema": schema,
+             "ref_table": ref, "ref_columns": [ref_column]}
+            for column, ref, ref_column in fks
+        ],
+    }
+
+
+def build_large_schema(count: int, seed: int = 3) -> list[dict]:
+    """
+    產生大型 Schema：資料表分為 30 張一組的業務領域，組內參照同組較早的資料表，
+    每組第一張資料表參照前一組，部分資料表參照共用的主檔（Users、Companies 等），形成有少數熱門節點的關聯圖
+    """
+    rng = random.Random(seed)
+    hubs = ["Users", "Companies", "Currencies", "Countries"]
+    tables = [_table(name, "ID", []) for name in hubs]
+    names = list(hubs)
+    for i in range(count - len(hubs)):
+        group_start = len(hubs) + i // 30 * 30
+        earlier = names[group_start:] or names[-30:]
+        fks = []
+        for ref in rng.sample(earlier, min(len(earlier), rng.randint(1, 3))):
+            fks.append((f"{ref}Ref{len(fks)}", ref, "ID"))
+        if rng.random() < 0.3:
+            fks.append(("OwnerID", rng.choice(hubs), "ID"))
+        name = f"T{i:05d}"
+        tables.append(_table(name, "ID", fks, schema=f"s{i // 30 % 20}"))
+        names.append(name)
+    # 外鍵參照的資料表可能在其他結構描述
+    schemas = {table["name"]: table["schema"] for table in tables}
+    for table in tables:
+        for fk in table["foreign_keys"]:
+            fk["ref_schema"] = schemas[fk["ref_table"]]
+    return tables
+
+
+def measure_scale(count: int, queries: int = 500) -> None:
+    """測量大型 Schema 的建立與路徑搜尋延遲"""
+    tables = build_large_schema(count)
+    start = time.perf_counter()
+    graph = JoinGraph(tables, max_hops=4, cache_size=256)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    rng = random.Random(7)
+    keys = [(table["schema"], table["name"]) for table in tables]
+    # 問題通常集中在少數常用資料表：從 100 張資料表中挑選起點
+    sources = rng.sample(keys, 100)
+    pairs = [(rng.choice(sources), rng.choice(keys)) for _ in range(queries)]
+
+    cold, warm, found = [], [], 0
+    seen = set()
+    for source, target in pairs:
+        start = time.perf_counter()
+        path = graph.find_path(source, target)
+        elapsed = (time.perf_counter() - start) * 1000
+        (warm if source in seen else cold).append(elapsed)
+        seen.add(source)
+        found += path is not None
+
+    stats = graph.stats()
+    all_pairs_s = statistics.mean(cold) * len(keys) / 1000
+    print(f"資料表 {len(graph):,} 張，外鍵 {stats['edges']:,} 個，建立關聯圖 {build_ms:.1f} ms")
+    print(f"路徑查詢 {queries} 次（{found} 次在 {graph.max_hops} 個外鍵內找到）："
+          f"第一次出發 {statistics.mean(cold):.3f} ms，快取 {statistics.mean(warm):.4f} ms，"
+          f"快取命中率 {stats['hit_rate']:.0%}")
+    print(f"預先計算所有資料表兩兩之間的路徑估計需 {all_pairs_s:.1f} 秒"
+          f"（{len(keys):,} 次 BFS，保存 {len(keys) ** 2:,} 組路徑），即時計算只執行 {stats['misses']} 次")
+    print()
+
+
+@use_function_invocation
+class SimulatedModel(BaseChatClient):
+    """
+    沒有 JOIN 路徑時依慣例猜測 JOIN 欄位（[A].[BID] = [B].[BID]），
+    失敗後呼叫 get_join_path，取得路徑後撰寫並測試 SQL
+    """
+
+    def __init__(self, questions: dict, **kwargs):
+        super().__init__(**kwargs)
+        self.questions = questions
+
+    async def _inner_get_response(self, *, messages, chat_options, **kwargs):
+        question = next(message.text for message in messages if message.role == Role.USER)
+        source, target = self.questions[question]
+        instructions = "\n".join(message.text for message in messages if message.role == Role.SYSTEM)
+        results = [
+            str(content.result) for message in messages for content in message.contents
+            if isinstance(content, FunctionResultContent)
+        ]
+        calls = [
+            content for message in messages for content in message.contents
+            if isinstance(content, FunctionCallContent)
+        ]
+
+        def call(name: str, arguments: dict) -> list:
+            return [FunctionCallContent(call_id=uuid.uuid4().hex, name=name, arguments=arguments)]
+
+        if calls and calls[-1].name == "execute_sql" and "錯誤" not in results[-1]:
+            contents = [TextContent(text=f"```sql\n{calls[-1].arguments['sql']}\n```")]
+        elif calls and calls[-1].name == "get_join_path":
+            contents = call("execute_sql", {"sql": f"SELECT TOP 100 * {results[-1].splitlines()[0]}"})
+        elif calls:
+            contents = call("get_join_path", {"source": source, "target": target})
+        else:
+            hint = re.search(rf"^- (?:{source} → {target}|{target} → {source})：(.+)$", instructions, re.MULTILINE)
+            if hint:
+                sql = f"SELECT TOP 100 * {hint.group(1)}"
+            else:
+                sql = (f"SELECT TOP 100 * FROM [{source}] "
+                       f"JOIN [{target}] ON [{source}].[{target[:-1]}ID] = [{target}].[{target[:-1]}ID]")
+            contents = call("execute_sql", {"sql": sql})
+        return ChatResponse(messages=[ChatMessage(role=Role.ASSISTANT, contents=contents)])
+
+    async def _inner_get_streaming_response(self, *, messages, chat_options, **kwargs):
+        raise NotImplementedError
+        yield
+
+
+class SimulatedDatabase:
+    """JOIN 條件與外鍵路徑相符時執行成功，否則回報 Invalid column name"""
+
+    def __init__(self, tables: list[dict], questions: dict):
+        graph = JoinGraph(tables)
+        self.expected = {}
+        for question, (source, target) in questions.items():
+            path = graph.find_path(("dbo", source), ("dbo", target))
+            self.expected[(source, target)] = [edge.condition() for step in path for edge in step.edges[:1]]
+        self.join_errors = 0
+
+    def install(self, tables: list[dict], questions: dict):
+        database = self
+
+        def fetch_preview(connector, sql, *args, **kwargs):
+            for conditions in database.expected.values():
+                if all(condition in sql for condition in conditions):
+                    return ["Name"], [("張三",), ("李四",)], False
+            database.join_errors += 1
+            column = re.search(r"ON \[\w+\]\.\[(\w+)\]", sql)
+            raise RuntimeError(f"Invalid column name '{column.group(1) if column else '?'}'.")
+
+        DatabaseConnector.fetch_preview = fetch_preview
+        DatabaseConnector.guard_query = lambda connector, sql: sql
+        agent_tools.sql_validation_enabled = False
+        by_name = {table["name"]: table for table in tables}
+        schema_cache.get_tables = lambda connection_string=None: tables
+        schema_cache.get_version = lambda connection_string=None: "bench"
+        # 依問題只選出兩端的資料表（不含中介資料表）
+        schema_cache.get_relevant_tables = lambda question, *args, **kwargs: [
+            by_name[name] for name in questions[question]
+        ]
+        schema_cache.get_relevant_schema = lambda question, *args, **kwargs: render_tables(
+            schema_cache.get_relevant_tables(question), "ddl"
+        )
+
+
+def replay(questions: dict, hints: bool, database: SimulatedDatabase) -> tuple[list[int], int]:
+    """依序回答所有問題，回傳每個問題的 LLM 請求次數與 JOIN 失敗次數"""
+    sql_agent.join_hint_tokens = 300 if hints else 0
+    sql_agent.column_profile_hint_tokens = 0
+    config = AzureOpenAIConfig(endpoint="https://bench", api_key="bench", deployment_name="bench", api_version="bench")
+    agent = SQLAgent(config, cache=QuestionCache(), schema_injection="hybrid", examples=ExampleStore(), few_shot=0)
+    agent.chat_client = SimulatedModel(questions)
+    agent._use_agent_framework = True
+    agent.get_cached_sql = lambda *args, **kwargs: None
+
+    database.join_errors = 0
+    turns = []
+    for question in questions:
+        result = asyncio.run(agent.run_async(question))
+        assert result.executed, result.response
+        turns.append(result.llm_turns)
+    return turns, database.join_errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="外鍵關聯圖（JOIN 路徑）測試")
+    parser.add_argument("--tables", type=int, default=3000, help="規模測試的資料表數")
+    args = parser.parse_args()
+
+    measure_scale(args.tables)
+
+    tables = [_table(name, key, fks) for name, key, fks in SALES_TABLES]
+    questions = {question: (source, target) for question, source, target in QUESTIONS}
+    database = SimulatedDatabase(tables, questions)
+    database.install(tables, questions)
+
+    print(f"問題數: {len(questions)}（其中 {sum(1 for path in database.expected.values() if len(path) > 1)} 題需要中介資料表）")
+    print(f"{'模式':<10}{'平均 LLM 請求':>14}{'JOIN 失敗':>10}{'耗時 (秒)':>12}")
+    summary = {}
+    for label, hints in (("無 JOIN 提示", False), ("JOIN 提示", True)):
+        start = time.perf_counter()
+        turns, errors = replay(questions, hints, database)
+        summary[label] = statistics.mean(turns)
+        print(f"{label:<10}{summary[label]:>14.2f}{errors:>10}{time.perf_counter() - start:>12.3f}")
+    saved = summary["無 JOIN 提示"] - summary["JOIN 提示"]
+    print(f"每個問題減少 {saved:.2f} 次 LLM 請求（{saved / summary['無 JOIN 提示']:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+結果分頁測試
+
+以模擬的資料庫（依 SQL 的 TOP 與 OFFSET / FETCH 計算結果筆數）讀取不同頁，
+比較原始 SQL 與經過 guard_query（自動加上 TOP (QUERY_ROW_LIMIT)）的 SQL：
+- 伺服器分頁（OFFSET / FETCH）每頁只傳輸 page_size + 1 列
+- 用戶端分頁（串流後略過前面的列）第 n 頁需要傳輸 n * page_size 列
+並確認加上 TOP 的 SQL 仍由伺服器分頁，且最後一頁不超過 TOP 的列數上限。
+
+執行方式：
+    python benchmarks/bench_paging.py --rows 1000000 --page-size 50
+"""
+
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import sql_server_config  # noqa: E402
+from db_connector import DatabaseConnector, paginate_sql  # noqa: E402
+
+SQL = "SELECT [EmployeeID], [Name] FROM [dbo].[Employees] ORDER BY [EmployeeID]"
+
+
+class SimulatedDatabase:
+    """依 SQL 計算結果筆數並產生資料列，記錄每次查詢傳輸的資料列數"""
+
+    def __init__(self, rows: int):
+        self.rows = rows
+        self.transferred = 0
+        self.server_side = False
+
+    def install(self):
+        database = self
+
+        def read_rows(connector, sql, limit, offset=0, max_bytes=None):
+            return database.read(sql, limit, offset)
+
+        DatabaseConnector._read_rows = read_rows
+        DatabaseConnector.estimate_plan = lambda connector, sql: None
+
+    def read(self, sql: str, limit: int, offset: int) -> tuple[list[str], list, list[tuple], bool]:
+        """串流讀取第 offset 列起的 limit 列（多讀一列判斷是否還有更多資料）"""
+        paging = re.search(r"OFFSET (\d+) ROWS FETCH NEXT (\d+) ROWS ONLY", sql)
+        top = re.search(r"TOP \((\d+)\)", sql)
+        # fetch_page 改寫後的 SQL：OFFSET / FETCH，或超過 TOP 上限時的 TOP (0)
+        self.server_side = paging is not None or (top is not None and top.group(1) == "0")
+        if paging:
+            start = int(paging.group(1))
+            count = max(0, min(int(paging.group(2)), self.rows - start))
+        else:
+            start, count = 0, min(int(top.group(1)), self.rows) if top else self.rows
+        read = min(count, offset + limit + 1)
+        self.transferred += read
+        rows = [(start + i + 1, f"員工 {start + i + 1}") for i in range(offset, min(read, offset + limit))]
+        return ["EmployeeID", "Name"], [int, str], rows, count > offset + limit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="結果分頁測試")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="模擬資料表的資料列數")
+    parser.add_argument("--page-size", type=int, default=50, help="每頁筆數")
+    args = parser.parse_args()
+
+    limit = sql_server_config.guard_row_limit
+    sql_server_config.guard_enabled = True
+    database = SimulatedDatabase(args.rows)
+    database.install()
+    connector = DatabaseConnector("bench")
+    guarded = connector.guard_query(SQL)
+    print(f"原始 SQL: {SQL}")
+    print(f"guard_query: {guarded}")
+    print()
+
+    last_page = (limit - 1) // args.page_size
+    pages = [0, 10, 100, last_page, last_page + 1]
+    print(f"{'SQL':<10}{'頁碼':>8}{'分頁方式':>10}{'傳輸列數':>12}{'本頁筆數':>10}{'有下一頁':>10}")
+    for label, sql in (("原始", SQL), ("TOP 上限", guarded)):
+        for page in pages:
+            database.transferred = 0
+            df = connector.fetch_page(sql, page, args.page_size)
+            mode = "伺服器" if database.server_side else "用戶端"
+            print(f"{label:<10}{page:>8}{mode:>10}{database.transferred:>12,}{len(df):>10}"
+                  f"{str(df.attrs['truncated']):>10}")
+
+            # 加上 TOP 的 SQL 仍由伺服器分頁，且結果與原本的 TOP 相同
+            assert paginate_sql(sql, page * args.page_size, args.page_size + 1) is not None
+            assert database.server_side and database.transferred <= args.page_size + 1
+            if sql is guarded:
+                expected = max(0, min(args.page_size, limit - page * args.page_size))
+                assert len(df) == expected, (page, len(df))
+                assert df.attrs["truncated"] == (page < last_page)
+                if expected:
+                    assert df.iloc[0, 0] == page * args.page_size + 1
+    print()
+    print(f"加上 TOP ({limit}) 的 SQL 每頁只傳輸 {args.page_size + 1} 列，最後一頁於第 {limit:,} 列截止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Schema 提取效能測試
+
+以本機模擬的系統目錄（數千張資料表）比較兩種提取方式：
+1. 逐表查詢：get_tables() + 每張資料表一次 get_columns()（N+1）
+2. 集合式查詢：get_schema_metadata() 兩次目錄查詢後於記憶體分組
+
+每次查詢都模擬一次網路來回延遲，藉此呈現查詢次數對總時間的影響。
+
+執行方式：
+    python benchmarks/bench_schema_extraction.py --tables 3000 --latency-ms 1
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_extractor import SchemaExtractor  # noqa: E402
+
+
+class CatalogStandIn:
+    """模擬 SQL Server 系統目錄的連線器，每次查詢加上固定來回延遲"""
+
+    def __init__(self, table_count: int, columns_per_table: int, latency: float):
+        self.latency = latency
+        self.query_count = 0
+        self.tables = []
+        for i in range(table_count):
+            name = f"Table{i:05d}"
+            columns = [
+                (f"{name}ID", "int", None, "NO", None, 1),
+            ] + [
+                (f"Col{j}", "nvarchar", 50 + j, "YES", None, 0)
+                for j in range(1, columns_per_table)
+            ]
+            self.tables.append(("dbo", name, columns))
+
+    def execute_query(self, sql: str) -> tuple[list[str], list[tuple]]:
+        self.query_count += 1
+        time.sleep(self.latency)
+
+        if "INFORMATION_SCHEMA.KEY_COLUMN_USAGE" in sql:
+            rows = [
+                (schema, name, *col, object_id)
+                for object_id, (schema, name, columns) in enumerate(self.tables)
+                for col in columns
+            ]
+            return [], rows
+        if "sys.foreign_key_columns" in sql:
+            rows = [
+                (f"FK_{name}_{prev}", schema, name, "Col1", schema, prev, f"{prev}ID")
+                for (schema, name, _), (_, prev, _) in zip(self.tables[1:], self.tables)
+            ]
+            return [], rows
+
+        match = re.search(r"TABLE_SCHEMA = '(.+?)' AND TABLE_NAME = '(.+?)'", sql)
+        if match:
+            for schema, name, columns in self.tables:
+                if (schema, name) == match.groups():
+                    return [], [col[:5] for col in columns]
+            return [], []
+        return [], [(schema, name, "BASE TABLE") for schema, name, _ in self.tables]
+
+
+def run(extractor: SchemaExtractor, bulk: bool) -> tuple[str, int, float]:
+    """執行一次提取，回傳 (Schema 文字, 查詢次數, 秒數)"""
+    extractor.db.query_count = 0
+    start = time.perf_counter()
+    text = extractor.get_full_schema(bulk=bulk)
+    return text, extractor.db.query_count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema 提取效能測試")
+    parser.add_argument("--tables", type=int, default=3000, help="模擬資料表數量")
+    parser.add_argument("--columns", type=int, default=8, help="每張資料表的欄位數")
+    parser.add_argument("--latency-ms", type=float, default=1.0, help="每次查詢的模擬來回延遲（毫秒）")
+    args = parser.parse_args()
+
+    catalog = CatalogStandIn(args.tables, args.columns, args.latency_ms / 1000)
+    extractor = SchemaExtractor(catalog)
+
+    per_table_text, per_table_queries, per_table_seconds = run(extractor, bulk=False)
+    bulk_text, bulk_queries, bulk_seconds = run(extractor, bulk=True)
+
+    print(f"資料表: {args.tables}，每表欄位: {args.columns}，模擬延遲: {args.latency_ms} ms")
+    print(f"{'方式':<10}{'查詢次數':>10}{'耗時 (秒)':>12}")
+    print(f"{'逐表查詢':<10}{per_table_queries:>10}{per_table_seconds:>12.3f}")
+    print(f"{'集合式查詢':<10}{bulk_queries:>10}{bulk_seconds:>12.3f}")
+    print(f"加速倍數: {per_table_seconds / bulk_seconds:.1f}x")
+    print(f"輸出一致: {'是' if per_table_text == bulk_text else '否'}")
+
+
+if __name__ == "__main__":
+    main()
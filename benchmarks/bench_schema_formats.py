@@ -0,0 +1,134 @@
+"""
+Schema 格式 token 數比較
+
+在合成的大型 Schema（沿用 bench_schema_pruning 的資料表，另加稽核欄位與多種型別）上比較：
+1. 完整 Schema 在 markdown / ddl / compact 三種格式下的 token 數
+2. 依問題裁剪後（top-k + 外鍵相鄰資料表）的平均 token 數
+3. token 預算模式：平均 token 數、需要的資料表召回率與欄位保留率
+
+已安裝 tiktoken 時以 o200k_base 實際計算 token，否則使用 estimate_tokens 估算。
+
+執行方式：
+    python benchmarks/bench_schema_formats.py --modules 60 --token-budget 1000
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_schema_pruning import build_questions, build_schema  # noqa: E402
+from schema_extractor import SCHEMA_FORMATS, SchemaIndex, _column_priority, estimate_tokens, render_tables  # noqa: E402
+
+# 稽核欄位與其他型別：每張資料表隨機加入幾個
+EXTRA_COLUMNS = [
+    ("CreatedBy", "nvarchar", 50), ("ModifiedBy", "nvarchar", 50), ("ModifiedDate", "datetime2", None),
+    ("RowVersion", "timestamp", None), ("Attachment", "varbinary", -1), ("Price", "decimal", None),
+    ("IsActive", "bit", None), ("StartDate", "date", None), ("ExternalKey", "uniqueidentifier", None),
+    ("IsDeleted", "bit", None),
+]
+
+# 欄位保留優先度（0 一律保留，數字越大越先省略）：軟刪除欄位是 WHERE 條件需要的欄位，不可當成稽核欄位
+EXPECTED_PRIORITIES = [
+    ("IsDeleted", "bit", 1), ("Deleted", "bit", 1), ("DeletedAt", "datetime2", 1),
+    ("ModifiedDate", "datetime2", 2), ("UpdatedAt", "datetime2", 2), ("LastModified", "datetime", 2),
+    ("ModifiedBy", "nvarchar", 3), ("RowVersion", "timestamp", 3),
+]
+
+
+def check_column_priorities():
+    """確認欄位保留優先度"""
+    for name, data_type, expected in EXPECTED_PRIORITIES:
+        priority = _column_priority({"name": name, "data_type": data_type}, set())
+        assert priority == expected, f"{name}: 優先度 {priority}，預期 {expected}"
+
+
+def count_tokens_with():
+    """回傳 (token 計數函數, 說明)"""
+    try:
+        import tiktoken
+    except ImportError:
+        return estimate_tokens, "estimate_tokens 估算"
+    encoding = tiktoken.get_encoding("o200k_base")
+    return lambda text: len(encoding.encode(text)), "tiktoken o200k_base"
+
+
+def add_extra_columns(tables: list[dict], seed: int = 5):
+    """為每張資料表加入 3~6 個稽核或其他型別的欄位"""
+    rng = random.Random(seed)
+    for table in tables:
+        for name, data_type, max_length in rng.sample(EXTRA_COLUMNS, rng.randint(3, 6)):
+            table["columns"].append({
+                "name": name, "data_type": data_type, "max_length": max_length,
+                "nullable": "YES", "default": None, "primary_key": False,
+            })
+
+
+def table_blocks(text: str, format: str) -> dict[str, str]:
+    """把 Schema 文字切成 {資料表名稱: 該資料表的文字}"""
+    blocks = {}
+    if format == "markdown":
+        for chunk in text.split("### 資料表: ")[1:]:
+            header, _, body = chunk.partition("\n")
+            blocks[header.strip().split("].[")[-1].rstrip("]")] = body
+        return blocks
+    for line in text.splitlines():
+        if line.startswith("--") or line.startswith("（"):
+            continue
+        name = line.split("(" if format == "ddl" else ":", 1)[0]
+        blocks[name] = line[len(name):]
+    return blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema 格式 token 數比較")
+    parser.add_argument("--modules", type=int, default=60, help="模組數量（資料表數 = 模組數 × 20）")
+    parser.add_argument("--questions", type=int, default=200, help="測試問題數")
+    parser.add_argument("--top-k", type=int, default=8, help="直接命中的資料表數量")
+    parser.add_argument("--token-budget", type=int, default=1000, help="token 預算模式的上限")
+    args = parser.parse_args()
+
+    check_column_priorities()
+    count_tokens, counter_name = count_tokens_with()
+    tables = build_schema(args.modules)
+    questions = build_questions(tables, args.questions)
+    add_extra_columns(tables)
+    index = SchemaIndex(tables)
+    selections = [(index.select(question, top_k=args.top_k), needed) for question, needed in questions]
+    column_total = sum(len(table["columns"]) for table in tables)
+
+    print(f"資料表: {len(tables)}，欄位: {column_total}，問題: {len(questions)}，token 計算: {counter_name}")
+    print(f"{'格式':<10}{'完整 Schema':>14}{'相對 markdown':>14}{'裁剪後平均':>12}"
+          f"{'預算模式平均':>14}{'資料表召回':>12}{'欄位保留':>10}")
+
+    baseline = None
+    for format in SCHEMA_FORMATS:
+        full = count_tokens(render_tables(tables, format))
+        baseline = baseline or full
+        pruned, budgeted, recalled, kept_columns, needed_columns = [], [], 0, 0, 0
+        for selected, needed in selections:
+            pruned.append(count_tokens(render_tables(selected, format)))
+            text = render_tables(selected, format, args.token_budget)
+            budgeted.append(count_tokens(text))
+            blocks = table_blocks(text, format)
+            # 需要的資料表仍在輸出中（未被整張省略）即算召回
+            if all(name in blocks for name in needed):
+                recalled += 1
+            for table in selected:
+                if table["name"] not in needed:
+                    continue
+                needed_columns += len(table["columns"])
+                block = blocks.get(table["name"], "")
+                kept_columns += sum(1 for col in table["columns"] if col["name"] in block)
+        print(
+            f"{format:<10}{full:>14,}{full / baseline:>14.0%}{sum(pruned) / len(pruned):>12,.0f}"
+            f"{sum(budgeted) / len(budgeted):>14,.0f}{recalled / len(selections):>12.1%}"
+            f"{kept_columns / max(needed_columns, 1):>10.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
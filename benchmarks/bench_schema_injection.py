@@ -0,0 +1,159 @@
+"""
+Schema 預先注入測試
+
+以合成的大型 Schema（沿用 bench_schema_pruning 的資料表與問題）與本機模擬的 LLM 比較兩種 Agentic 模式：
+1. tool：Agent 先呼叫 get_database_schema(question)，再撰寫並測試 SQL
+2. hybrid：依問題裁剪的 Schema 直接放入指示，Agent 直接撰寫並測試 SQL；
+   需要的資料表不在其中時才呼叫 get_database_schema 補齊
+
+模擬的 LLM 每輪耗時 = 固定延遲 + 輸入 token 數 × 每 token 處理時間；
+需要的資料表都已出現在對話中時才撰寫 SQL，否則呼叫 get_database_schema（先帶問題，再不帶參數）。
+統計每個問題的平均 LLM 請求次數、呼叫 Schema 工具的問題數與耗時。
+
+執行方式：
+    python benchmarks/bench_schema_injection.py --modules 60 --questions 40 --turn-ms 400
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from agent_framework import (  # noqa: E402
+    BaseChatClient,
+    ChatMessage,
+    ChatResponse,
+    FunctionCallContent,
+    Role,
+    TextContent,
+    use_function_invocation,
+)
+
+from bench_concurrent_tools import install_slow_database  # noqa: E402
+from bench_schema_pruning import build_questions, build_schema  # noqa: E402
+from config import AzureOpenAIConfig  # noqa: E402
+from schema_extractor import SchemaIndex, estimate_tokens, render_tables  # noqa: E402
+from sql_agent import QuestionCache, SQLAgent, schema_cache  # noqa: E402
+
+
+@use_function_invocation
+class SimulatedModel(BaseChatClient):
+    """需要的資料表都出現在對話中才撰寫 SQL，否則呼叫 get_database_schema"""
+
+    def __init__(self, needed: dict, turn_seconds: float, token_seconds: float, **kwargs):
+        super().__init__(**kwargs)
+        self.needed = needed
+        self.turn_seconds = turn_seconds
+        self.token_seconds = token_seconds
+
+    async def _inner_get_response(self, *, messages, chat_options, **kwargs):
+        text = "\n".join(str(content.result) if hasattr(content, "result") else getattr(content, "text", "") or ""
+                         for message in messages for content in message.contents)
+        await asyncio.sleep(self.turn_seconds + estimate_tokens(text) * self.token_seconds)
+
+        question = next(message.text for message in messages if message.role == Role.USER)
+        sql = f"SELECT TOP 10 * FROM [{'], ['.join(sorted(self.needed[question]))}]"
+        schema_calls = [
+            content for message in messages for content in message.contents
+            if isinstance(content, FunctionCallContent) and content.name == "get_database_schema"
+        ]
+        tested = any(
+            isinstance(content, FunctionCallContent) and content.name == "execute_sql"
+            for message in messages for content in message.contents
+        )
+        known = all(re.search(rf"\b{name}\b", text) for name in self.needed[question])
+
+        if tested:
+            contents = [TextContent(text=f"```sql\n{sql}\n```")]
+        elif known or len(schema_calls) >= 2:
+            contents = [FunctionCallContent(call_id=uuid.uuid4().hex, name="execute_sql", arguments={"sql": sql})]
+        else:
+            arguments = {"question": question if not schema_calls else ""}
+            contents = [FunctionCallContent(
+                call_id=uuid.uuid4().hex, name="get_database_schema", arguments=json.dumps(arguments)
+            )]
+        return ChatResponse(messages=[ChatMessage(role=Role.ASSISTANT, contents=contents)])
+
+    async def _inner_get_streaming_response(self, *, messages, chat_options, **kwargs):
+        raise NotImplementedError
+        yield
+
+
+def install_schema(tables: list[dict], schema_seconds: float):
+    """以合成 Schema 取代共用 Schema 快取的資料庫查詢（每次呼叫固定延遲，模擬已快取的讀取）"""
+    index = SchemaIndex(tables)
+    full = render_tables(tables, "ddl")
+
+    def get_relevant_schema(question, connection_string=None, *args, **kwargs):
+        time.sleep(schema_seconds)
+        return render_tables(index.select(question, top_k=8), "ddl", 4000)
+
+    def get_schema_text(connection_string=None, *args, **kwargs):
+        time.sleep(schema_seconds)
+        return full
+
+    schema_cache.get_relevant_schema = get_relevant_schema
+    schema_cache.get_schema_text = get_schema_text
+    schema_cache.get_version = lambda connection_string=None: "bench"
+
+
+async def run_mode(mode: str, questions: list, model: SimulatedModel) -> list:
+    """以指定模式同時執行所有問題，回傳每個問題的 (LLM 請求次數, 耗時)"""
+    config = AzureOpenAIConfig(endpoint="https://bench", api_key="bench", deployment_name="bench", api_version="bench")
+    agent = SQLAgent(config, max_concurrency=len(questions), cache=QuestionCache(), schema_injection=mode)
+    agent.chat_client = model
+    agent._use_agent_framework = True
+    agent.get_cached_sql = lambda *args, **kwargs: None
+    results = await asyncio.gather(*(agent.run_async(question) for question, _ in questions))
+    for result, (question, needed) in zip(results, questions):
+        assert result.executed and all(f"[{name}]" in result.sql for name in needed), result.response
+    return [(result.llm_turns, result.generation_time) for result in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema 預先注入測試")
+    parser.add_argument("--modules", type=int, default=60, help="模組數量（資料表數 = 模組數 × 20）")
+    parser.add_argument("--questions", type=int, default=40, help="測試問題數")
+    parser.add_argument("--turn-ms", type=float, default=400.0, help="每輪 LLM 請求的固定延遲（毫秒）")
+    parser.add_argument("--token-us", type=float, default=30.0, help="每個輸入 token 的處理時間（微秒）")
+    parser.add_argument("--schema-ms", type=float, default=20.0, help="每次讀取 Schema 的時間（毫秒）")
+    parser.add_argument("--query-ms", type=float, default=100.0, help="每次測試 SQL 的時間（毫秒）")
+    args = parser.parse_args()
+
+    tables = build_schema(args.modules)
+    questions = build_questions(tables, args.questions)
+    install_schema(tables, args.schema_ms / 1000)
+    install_slow_database(args.query_ms / 1000)
+    model = SimulatedModel(
+        {question: needed for question, needed in questions}, args.turn_ms / 1000, args.token_us / 1e6
+    )
+
+    print(f"資料表: {len(tables)}，問題: {len(questions)}，每輪 LLM: {args.turn_ms} ms + {args.token_us} µs/token")
+    print(f"{'模式':<8}{'平均 LLM 請求':>14}{'呼叫 Schema 工具':>14}{'平均耗時 (秒)':>16}{'中位數 (秒)':>14}")
+    summary = {}
+    for mode in ("tool", "hybrid"):
+        runs = asyncio.run(run_mode(mode, questions, model))
+        turns = [turn for turn, _ in runs]
+        seconds = [elapsed for _, elapsed in runs]
+        # 撰寫並測試 SQL 需要兩輪，超過兩輪即表示呼叫過 get_database_schema
+        schema_calls = sum(1 for turn in turns if turn > 2)
+        summary[mode] = (statistics.mean(turns), statistics.mean(seconds))
+        print(f"{mode:<8}{summary[mode][0]:>14.2f}{schema_calls:>14}{summary[mode][1]:>16.3f}"
+              f"{statistics.median(seconds):>14.3f}")
+
+    saved_turns = summary["tool"][0] - summary["hybrid"][0]
+    saved_seconds = summary["tool"][1] - summary["hybrid"][1]
+    print(f"每個問題省下: {saved_turns:.2f} 次 LLM 請求，{saved_seconds:.3f} 秒"
+          f"（{saved_seconds / summary['tool'][1]:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Schema 裁剪效能測試
+
+在合成的大型 Schema（數千張資料表，含中文說明與外鍵）上，
+比較完整 Schema 與依問題裁剪後的 Schema：
+- 提示詞大小（估算 token 數）的縮減比例
+- 召回率：問題需要的資料表是否都被選入
+
+執行方式：
+    python benchmarks/bench_schema_pruning.py --modules 60 --top-k 8
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from schema_extractor import SchemaExtractor, SchemaIndex, estimate_tokens  # noqa: E402
+
+MODULES = [
+    ("Sales", "銷售"), ("Hr", "人事"), ("Finance", "財務"), ("Stock", "庫存"),
+    ("Purchase", "採購"), ("Service", "客服"), ("Market", "行銷"), ("Ship", "物流"),
+    ("Factory", "工廠"), ("Quality", "品管"), ("Legal", "法務"), ("Asset", "資產"),
+]
+NOUNS = [
+    ("Customer", "客戶"), ("Order", "訂單"), ("Invoice", "發票"), ("Product", "產品"),
+    ("Employee", "員工"), ("Supplier", "供應商"), ("Contract", "合約"), ("Payment", "付款"),
+    ("Warehouse", "倉庫"), ("Shipment", "出貨"), ("Campaign", "活動"), ("Ticket", "工單"),
+    ("Budget", "預算"), ("Region", "區域"), ("Department", "部門"), ("Project", "專案"),
+    ("Vendor", "廠商"), ("Coupon", "折價券"), ("Refund", "退款"), ("Account", "帳戶"),
+]
+ATTRIBUTES = [
+    ("Name", "名稱"), ("Phone", "電話"), ("Email", "電子郵件"), ("Amount", "金額"),
+    ("Status", "狀態"), ("CreatedDate", "建立日期"), ("City", "城市"), ("Note", "備註"),
+]
+
+
+def build_schema(module_count: int, seed: int = 7) -> list[dict]:
+    """建立合成 Schema：每個模組 × 名詞一張資料表，並隨機建立外鍵"""
+    rng = random.Random(seed)
+    modules = [
+        (f"{en}{i // len(MODULES) or ''}", f"{zh}{i // len(MODULES) or ''}")
+        for i, (en, zh) in enumerate(MODULES * (module_count // len(MODULES) + 1))
+    ][:module_count]
+
+    tables = []
+    for module_en, module_zh in modules:
+        for noun_en, noun_zh in NOUNS:
+            name = f"{module_en}{noun_en}"
+            columns = [{
+                "name": f"{noun_en}ID", "data_type": "int", "max_length": None,
+                "nullable": "NO", "default": None, "primary_key": True,
+                "description": f"{noun_zh}編號",
+            }]
+            for attr_en, attr_zh in rng.sample(ATTRIBUTES, 5):
+                columns.append({
+                    "name": f"{noun_en}{attr_en}", "data_type": "nvarchar", "max_length": 100,
+                    "nullable": "YES", "default": None, "primary_key": False,
+                    "description": f"{noun_zh}{attr_zh}",
+                })
+            tables.append({
+                "schema": "dbo", "name": name, "type": "BASE TABLE",
+                "description": f"{module_zh}{noun_zh}",
+                "columns": columns, "primary_key": [columns[0]["name"]], "foreign_keys": [],
+                "_module": (module_en, module_zh), "_noun": (noun_en, noun_zh),
+            })
+
+    # 每張資料表參照同模組的另一張資料表
+    by_module: dict[str, list[dict]] = {}
+    for table in tables:
+        by_module.setdefault(table["_module"][0], []).append(table)
+    for table in tables:
+        target = rng.choice([t for t in by_module[table["_module"][0]] if t is not table])
+        ref_column = target["columns"][0]["name"]
+        table["columns"].append({
+            "name": ref_column, "data_type": "int", "max_length": None,
+            "nullable": "YES", "default": None, "primary_key": False,
+        })
+        table["foreign_keys"].append({
+            "name": f"FK_{table['name']}_{target['name']}", "columns": [ref_column],
+            "ref_schema": "dbo", "ref_table": target["name"], "ref_columns": [ref_column],
+        })
+    return tables
+
+
+def build_questions(tables: list[dict], count: int, seed: int = 11) -> list[tuple[str, set]]:
+    """產生問題與其需要的資料表（單表查詢與一對外鍵 JOIN 各半）"""
+    rng = random.Random(seed)
+    by_name = {table["name"]: table for table in tables}
+    questions = []
+    for i in range(count):
+        table = rng.choice(tables)
+        module_zh, noun_zh = table["_module"][1], table["_noun"][1]
+        attr = rng.choice(table["columns"][1:-1])["description"][len(noun_zh):]
+        if i % 2 == 0:
+            questions.append((f"列出所有{module_zh}{noun_zh}的{attr}", {table["name"]}))
+        else:
+            target = by_name[table["foreign_keys"][0]["ref_table"]]
+            questions.append((
+                f"查詢每筆{module_zh}{noun_zh}對應的{target['_noun'][1]}{attr}",
+                {table["name"], target["name"]},
+            ))
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema 裁剪效能測試")
+    parser.add_argument("--modules", type=int, default=60, help="模組數量（資料表數 = 模組數 × 20）")
+    parser.add_argument("--questions", type=int, default=200, help="測試問題數")
+    parser.add_argument("--top-k", type=int, default=8, help="直接命中的資料表數量")
+    parser.add_argument("--token-budget", type=int, default=4000, help="裁剪後的 token 上限")
+    args = parser.parse_args()
+
+    tables = build_schema(args.modules)
+    questions = build_questions(tables, args.questions)
+
+    start = time.perf_counter()
+    index = SchemaIndex(tables)
+    build_seconds = time.perf_counter() - start
+
+    full_tokens = estimate_tokens(SchemaExtractor.render_schema(tables))
+    pruned_tokens, recalled, search_seconds = [], 0, 0.0
+    for question, needed in questions:
+        start = time.perf_counter()
+        selected = index.select(question, top_k=args.top_k, token_budget=args.token_budget)
+        search_seconds += time.perf_counter() - start
+        pruned_tokens.append(estimate_tokens(SchemaExtractor.render_schema(selected)))
+        if needed <= {table["name"] for table in selected}:
+            recalled += 1
+
+    avg_pruned = sum(pruned_tokens) / len(pruned_tokens)
+    print(f"資料表: {len(tables)}，問題: {len(questions)}，top-k: {args.top_k}，token 上限: {args.token_budget}")
+    print(f"建立索引: {build_seconds * 1000:.1f} ms，平均檢索: {search_seconds / len(questions) * 1000:.2f} ms")
+    print(f"完整 Schema: {full_tokens:,} tokens")
+    print(f"裁剪後平均: {avg_pruned:,.0f} tokens（縮減 {1 - avg_pruned / full_tokens:.1%}）")
+    print(f"召回率: {recalled / len(questions):.1%}")
+
+
+if __name__ == "__main__":
+    main()
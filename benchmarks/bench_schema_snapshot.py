@@ -0,0 +1,122 @@
+"""
+Schema 快照冷啟動測試
+
+以本機模擬的系統目錄（數千張資料表，每次查詢有來回延遲、每列有傳輸成本）比較
+重新啟動後第一個問題取得 Schema 的時間：
+1. 沒有快照：完整提取目錄（標記 + 欄位 + 外鍵 + 說明）
+2. 有快照：載入磁碟快照立即回應，背景再比對目錄
+
+並以固定的模擬 LLM 延遲估算「第一個回答」的總時間。
+
+執行方式：
+    python benchmarks/bench_schema_snapshot.py --tables 3000 --llm-ms 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import schema_extractor  # noqa: E402
+from schema_extractor import SchemaCache  # noqa: E402
+
+QUESTION = "列出 Table00042 的所有資料"
+
+
+class CatalogStandIn:
+    """模擬 SQL Server 系統目錄的連線器：每次查詢固定延遲，另加每列的傳輸時間"""
+
+    def __init__(self, table_count: int, columns_per_table: int, latency: float, row_cost: float):
+        self.latency = latency
+        self.row_cost = row_cost
+        self.query_count = 0
+        self.tables = []
+        modified = datetime(2024, 1, 1)
+        for i in range(table_count):
+            name = f"Table{i:05d}"
+            columns = [(f"{name}ID", "int", None, "NO", None, 1)] + [
+                (f"Col{j}", "nvarchar", 50, "YES", None, 0) for j in range(1, columns_per_table)
+            ]
+            self.tables.append((i, "dbo", name, columns, modified + timedelta(minutes=i)))
+
+    def execute_query(self, sql: str, cache: bool = False) -> tuple[list[str], list[tuple]]:
+        self.query_count += 1
+        if "sys.objects" in sql and "modify_date" in sql:
+            rows = [(object_id, schema, name, modified) for object_id, schema, name, _, modified in self.tables]
+        elif "INFORMATION_SCHEMA.KEY_COLUMN_USAGE" in sql:
+            rows = [
+                (schema, name, *col, object_id)
+                for object_id, schema, name, columns, _ in self.tables
+                for col in columns
+            ]
+        elif "sys.foreign_key_columns" in sql:
+            rows = [
+                (f"FK_{name}_{prev}", schema, name, "Col1", schema, prev, f"{prev}ID")
+                for (_, schema, name, _, _), (_, _, prev, _, _) in zip(self.tables[1:], self.tables)
+            ]
+        elif "MS_Description" in sql:
+            rows = [(object_id, None, f"{name} 說明") for object_id, _, name, _, _ in self.tables]
+        else:
+            rows = []
+        time.sleep(self.latency + self.row_cost * len(rows))
+        return [], rows
+
+
+def wait_for_background(cache: SchemaCache, timeout: float = 60.0) -> float:
+    """等待背景重新驗證完成，回傳等待秒數"""
+    start = time.perf_counter()
+    while cache.stats()["background_refreshes"] == 0 and time.perf_counter() - start < timeout:
+        time.sleep(0.005)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema 快照冷啟動測試")
+    parser.add_argument("--tables", type=int, default=3000, help="模擬資料表數量")
+    parser.add_argument("--columns", type=int, default=10, help="每張資料表的欄位數")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="每次查詢的模擬來回延遲（毫秒）")
+    parser.add_argument("--row-us", type=float, default=20.0, help="每列的模擬傳輸時間（微秒）")
+    parser.add_argument("--llm-ms", type=float, default=2000.0, help="模擬的 LLM 回應時間（毫秒）")
+    args = parser.parse_args()
+
+    catalog = CatalogStandIn(args.tables, args.columns, args.latency_ms / 1000, args.row_us / 1e6)
+    schema_extractor.DatabaseConnector = lambda connection_string=None: catalog
+    llm_seconds = args.llm_ms / 1000
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        # 第一次啟動：沒有快照，完整提取並寫入快照
+        cold_cache = SchemaCache(snapshot_dir=snapshot_dir)
+        catalog.query_count = 0
+        start = time.perf_counter()
+        cold_text = cold_cache.get_relevant_schema(QUESTION, "bench")
+        cold_seconds = time.perf_counter() - start
+        cold_queries = catalog.query_count
+        snapshot_bytes = sum(
+            os.path.getsize(os.path.join(snapshot_dir, name)) for name in os.listdir(snapshot_dir)
+        )
+
+        # 重新啟動：新的快取實例從快照載入
+        warm_cache = SchemaCache(snapshot_dir=snapshot_dir)
+        catalog.query_count = 0
+        start = time.perf_counter()
+        warm_text = warm_cache.get_relevant_schema(QUESTION, "bench")
+        warm_seconds = time.perf_counter() - start
+        background_seconds = wait_for_background(warm_cache)
+        background_queries = catalog.query_count
+
+    print(f"資料表: {args.tables}，每表欄位: {args.columns}，"
+          f"模擬延遲: {args.latency_ms} ms + {args.row_us} µs/列，快照大小: {snapshot_bytes / 1e6:.1f} MB")
+    print(f"{'啟動方式':<12}{'取得 Schema (秒)':>18}{'第一個回答 (秒)':>18}")
+    print(f"{'沒有快照':<12}{cold_seconds:>18.3f}{cold_seconds + llm_seconds:>18.3f}")
+    print(f"{'載入快照':<12}{warm_seconds:>18.3f}{warm_seconds + llm_seconds:>18.3f}")
+    print(f"完整提取: {cold_queries} 次目錄查詢；背景重新驗證: {background_queries} 次目錄查詢"
+          f"（載入後再等待 {background_seconds:.3f} 秒完成，Schema 未變更）")
+    print(f"Schema 輸出一致: {'是' if cold_text == warm_text else '否'}")
+
+
+if __name__ == "__main__":
+    main()
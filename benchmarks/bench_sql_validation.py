@@ -0,0 +1,132 @@
+"""
+SQL 靜態驗證效能測試
+
+以 tests/test_data.sql 的資料表與測試案例驗證查詢為基準：
+1. 原始（正確）查詢不應被誤判
+2. 對每個查詢產生常見的名稱錯誤（拼錯欄位、欄位多加 s、資料表單複數錯誤、同時拼錯兩個欄位）
+3. 統計本機攔截的錯誤數（每個都省下一次資料庫來回）與 LLM 修正輪數
+
+輪數估算：資料庫的錯誤訊息不含建議名稱，Agent 通常要先再呼叫一次 get_database_schema
+才能修正（2 輪）；驗證器的建議全部正確時 Agent 可直接修正（1 輪）。
+
+執行方式：
+    python benchmarks/bench_sql_validation.py
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sql_validator import SqlValidator  # noqa: E402
+
+TEST_DATA = os.path.join(ROOT, "tests", "test_data.sql")
+
+
+def load_test_data(path: str) -> tuple[list[dict], list[str]]:
+    """從測試資料檔解析資料表定義與「測試 N 驗證查詢」"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    tables = []
+    for match in re.finditer(r"CREATE TABLE \[(\w+)\] \((.*?)\n\);", text, re.DOTALL):
+        columns = re.findall(r"^\s*\[(\w+)\]", match.group(2), re.MULTILINE)
+        tables.append({
+            "schema": "dbo",
+            "name": match.group(1),
+            "columns": [{"name": name} for name in columns],
+        })
+
+    queries = [
+        query.strip()
+        for query in re.findall(r"-- 測試 \d+ 驗證查詢\n(.*?;)", text, re.DOTALL)
+    ]
+    return tables, queries
+
+
+def typo(name: str) -> str:
+    """產生一個常見的拼字錯誤：交換相鄰兩個字元"""
+    i = len(name) // 2
+    return name[:i - 1] + name[i] + name[i - 1] + name[i + 1:]
+
+
+def mutate(query: str, tables: list[dict]) -> list[tuple[str, str, list[str]]]:
+    """
+    產生錯誤的查詢
+
+    Returns:
+        list: (錯誤類型, 錯誤的查詢, 正確名稱列表)
+    """
+    columns = re.findall(r"\[(\w+)\]", query)
+    table_names = {table["name"] for table in tables}
+    column_names = [name for name in dict.fromkeys(columns) if name not in table_names]
+    cases = []
+    if column_names:
+        first = column_names[0]
+        cases.append(("拼錯欄位", query.replace(f"[{first}]", f"[{typo(first)}]", 1), [first]))
+        cases.append(("欄位加 s", query.replace(f"[{first}]", f"[{first}s]"), [first]))
+        cases.append(("去掉方括號拼錯", query.replace(f"[{first}]", typo(first)), [first]))
+    if len(column_names) > 1:
+        wrong = query
+        for name in column_names[:2]:
+            wrong = wrong.replace(f"[{name}]", f"[{typo(name)}]")
+        cases.append(("兩個欄位拼錯", wrong, column_names[:2]))
+    for table in table_names:
+        if f"[{table}]" in query:
+            cases.append(("資料表單數", query.replace(f"[{table}]", f"[{table[:-1]}]"), [table]))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQL 靜態驗證效能測試")
+    parser.add_argument("--repeat", type=int, default=2000, help="計時時重複驗證的次數")
+    args = parser.parse_args()
+
+    tables, queries = load_test_data(TEST_DATA)
+    validator = SqlValidator(tables)
+    print(f"資料表: {', '.join(table['name'] for table in tables)}，測試查詢: {len(queries)} 個")
+
+    false_positives = [query for query in queries if not validator.validate(query).ok]
+    print(f"正確查詢誤判: {len(false_positives)} / {len(queries)}")
+    for query in false_positives:
+        print(f"  ! {query}")
+
+    cases = [case for query in queries for case in mutate(query, tables)]
+    detected = suggested = errors = turns_without = turns_with = 0
+    for label, query, expected in cases:
+        result = validator.validate(query)
+        errors += len(expected)
+        if result.ok:
+            print(f"  未偵測 [{label}] {query}")
+            continue
+        detected += 1
+        hits = sum(
+            1 for name in expected
+            if any(issue.suggestions[:1] == [name] for issue in result.issues)
+        )
+        suggested += hits
+        # 無驗證器：資料庫回報錯誤後，一輪重新查 Schema、一輪修正
+        turns_without += 2
+        # 有驗證器：建議全部正確時直接修正，否則同樣需要查 Schema
+        turns_with += 1 if hits == len(expected) else 2
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for query in queries:
+            validator.validate(query)
+    per_query = (time.perf_counter() - start) / (args.repeat * len(queries))
+
+    print(f"錯誤查詢: {len(cases)} 個（共 {errors} 個無效名稱）")
+    print(f"本機攔截: {detected} / {len(cases)}，省下資料庫來回 {detected} 次")
+    print(f"首選建議正確: {suggested} / {errors}")
+    print(f"LLM 修正輪數: {turns_without} → {turns_with}（省下 {turns_without - turns_with} 輪）")
+    print(f"平均驗證時間: {per_query * 1e6:.0f} µs / 查詢")
+    sys.exit(1 if false_positives or detected < len(cases) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+串流讀取記憶體測試
+
+以模擬的游標（可產生任意筆數的資料列）比較 execute_sql 工具的兩種讀取方式：
+1. execute_query：fetchall 後只顯示前 50 筆（舊版行為）
+2. fetch_preview：fetchmany 讀取前 50 筆後取消查詢
+
+以 tracemalloc 量測峰值記憶體，串流讀取的峰值應與結果大小無關。
+
+執行方式：
+    python benchmarks/bench_streaming_fetch.py --sizes 10000 100000 1000000
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_connector import DatabaseConnector  # noqa: E402
+
+
+class StandInCursor:
+    """依需求產生資料列的模擬游標"""
+
+    # DB-API 的 7 欄 description：(名稱, 型別, display_size, internal_size, precision, scale, null_ok)
+    description = [
+        ("OrderID", int, None, 10, 10, 0, False),
+        ("CustomerName", str, None, 50, 50, 0, True),
+        ("Notes", str, None, 200, 200, 0, True),
+    ]
+
+    def __init__(self, row_count: int):
+        self._rows = ((i, f"客戶{i % 1000}", "備註" * 20) for i in range(row_count))
+
+    def execute(self, sql):
+        pass
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchmany(self, size):
+        return list(itertools.islice(self._rows, size))
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def cancel(self):
+        self._rows = iter(())
+
+    def close(self):
+        pass
+
+
+class StandInConnector(DatabaseConnector):
+    """不連線資料庫，直接提供模擬游標的連線器"""
+
+    def __init__(self, row_count: int):
+        super().__init__("stand-in")
+        self.row_count = row_count
+
+    def get_connection(self):
+        connector = self
+
+        class Connection:
+            def cursor(self):
+                return StandInCursor(connector.row_count)
+
+        class Context:
+            def __enter__(self):
+                return Connection()
+
+            def __exit__(self, *exc):
+                return False
+
+        return Context()
+
+
+def measure(func) -> tuple[float, float]:
+    """回傳 (峰值記憶體 MB, 耗時秒數)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="串流讀取記憶體測試")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="結果筆數")
+    args = parser.parse_args()
+
+    print(f"{'結果筆數':>10}{'fetchall 峰值 (MB)':>20}{'耗時 (秒)':>10}{'串流峰值 (MB)':>16}{'耗時 (秒)':>10}")
+    for size in args.sizes:
+        db = StandInConnector(size)
+        full_mb, full_seconds = measure(lambda: db.execute_query("SELECT * FROM [Orders]")[1][:50])
+        preview_mb, preview_seconds = measure(lambda: db.fetch_preview("SELECT * FROM [Orders]", limit=50))
+        print(f"{size:>10,}{full_mb:>20.1f}{full_seconds:>10.2f}{preview_mb:>16.3f}{preview_seconds:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
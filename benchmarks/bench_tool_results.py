@@ -0,0 +1,100 @@
+"""
+execute_sql 工具結果大小測試
+
+以三種合成的結果集（窄表、含 NVARCHAR(500) 備註的寬列、40 欄的寬表）比較回傳給 LLM 的文字大小：
+1. 原本的格式：固定 50 列，每個值直接 str() 後以 " | " 串接
+2. 摘要格式：長欄位值截斷、依 TOOL_RESULT_MAX_BYTES 決定樣本列數，附欄位摘要
+3. 只回傳形狀（shape_only）
+
+工具結果會留在對話中，之後每一輪 LLM 請求都會再次送出，
+因此另外估算 Agent 測試 SQL 之後還有 N 輪時累計送出的 token 數。
+
+已安裝 tiktoken 時以 o200k_base 實際計算 token，否則使用 estimate_tokens 估算。
+
+執行方式：
+    python benchmarks/bench_tool_results.py --later-turns 2
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_schema_formats import count_tokens_with  # noqa: E402
+from result_summarizer import summarize_result  # noqa: E402
+
+ROWS = 50
+WORDS = ["客戶", "反映", "交期", "延誤", "請", "協助", "確認", "訂單", "狀態", "已", "聯絡", "業務", "處理", "退貨", "發票"]
+
+
+def legacy_format(columns: list[str], rows: list[tuple]) -> str:
+    """原本 execute_sql 的表格格式"""
+    header = " | ".join(str(col) for col in columns)
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(" | ".join(str(val) if val is not None else "NULL" for val in row))
+    lines.append(f"... (僅顯示前 {len(rows)} 筆，尚有更多資料)")
+    return "\n".join(lines)
+
+
+def note(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice(WORDS) for _ in range(length // 2))[:length]
+
+
+def build_results(seed: int = 3) -> dict:
+    """產生三種結果集：{名稱: (欄位, 資料列)}"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    narrow = (
+        ["CustomerID", "Name", "City", "Phone"],
+        [(i, f"客戶{i:03d}", rng.choice(["台北", "台中", "高雄"]), None if i % 7 == 0 else f"02-2{i:07d}")
+         for i in range(ROWS)],
+    )
+    notes = (
+        ["OrderID", "CustomerID", "OrderDate", "Status", "Amount", "Notes", "InternalNotes", "CreatedBy"],
+        [(i, rng.randint(1, 500), start + timedelta(hours=i * 7), rng.choice(["Open", "Shipped", "Closed"]),
+          Decimal(rng.randint(100, 99999)) / 100, note(rng, rng.randint(200, 500)),
+          "" if i % 3 else note(rng, 480), "system")
+         for i in range(ROWS)],
+    )
+    wide_columns = [f"Attribute{j:02d}" for j in range(40)]
+    wide = (
+        wide_columns,
+        [tuple(rng.choice([None, rng.randint(0, 10_000), f"值{rng.randint(0, 999)}"]) for _ in wide_columns)
+         for _ in range(ROWS)],
+    )
+    return {"窄表 4 欄": narrow, "備註 8 欄": notes, "寬表 40 欄": wide}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="execute_sql 工具結果大小測試")
+    parser.add_argument("--later-turns", type=int, default=2, help="測試 SQL 之後還有幾輪 LLM 請求")
+    parser.add_argument("--max-bytes", type=int, default=None, help="摘要的容量上限（預設 TOOL_RESULT_MAX_BYTES）")
+    args = parser.parse_args()
+
+    count_tokens, counter_name = count_tokens_with()
+    print(f"每個結果集 {ROWS} 列，token 計算: {counter_name}，測試後再 {args.later_turns} 輪")
+    print(f"{'結果集':<12}{'原本 token':>12}{'摘要 token':>12}{'樣本列':>8}{'形狀 token':>12}"
+          f"{'累計省下':>12}{'摘要耗時 (ms)':>16}")
+    for name, (columns, rows) in build_results().items():
+        legacy = count_tokens(legacy_format(columns, rows))
+        start = time.perf_counter()
+        text = summarize_result(columns, rows, has_more=True, max_bytes=args.max_bytes)
+        elapsed = (time.perf_counter() - start) * 1000
+        summary = count_tokens(text)
+        shape = count_tokens(summarize_result(columns, rows, has_more=True, shape_only=True))
+        header = text.splitlines()[0]
+        sample = int(header.rsplit("前 ", 1)[1].split(" ")[0]) if "前 " in header else len(rows)
+        # 工具結果在當輪與之後每一輪都會送出
+        saved = (legacy - summary) * (1 + args.later_turns)
+        print(f"{name:<12}{legacy:>12,}{summary:>12,}{sample:>8}{shape:>12,}{saved:>12,}{elapsed:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
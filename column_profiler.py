@@ -0,0 +1,492 @@
+"""
+欄位統計模組
+
+在背景以抽樣查詢計算每個欄位的 NULL 比例、空字串比例、不同值數量、低基數欄位的常見值與最小 / 最大值，
+讓 Agent 撰寫 SQL 前就知道 [Status] 有哪些值、[Email] 是否有空字串，不必先執行探索查詢。
+
+抽樣方式：
+- 資料列數取自 sys.partitions（只讀取中繼資料，不掃描資料表）
+- 列數不超過抽樣上限的小型資料表以 TOP 讀取整張表
+- 較大的資料表以 TABLESAMPLE SYSTEM 只讀取部分資料頁，再以 TOP 限制筆數，不會完整掃描
+背景工作一次只執行一個抽樣查詢，兩次查詢之間至少間隔 COLUMN_PROFILE_MIN_INTERVAL 秒。
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+from config import (
+    column_profile_hint_tokens,
+    column_profile_max_distinct,
+    column_profile_min_interval,
+    column_profile_refresh_interval,
+    column_profile_sample_rows,
+    sql_server_config,
+)
+from db_connector import DatabaseConnector, deadline
+from result_summarizer import summarize_columns
+from schema_extractor import estimate_tokens
+
+
+# 資料表的資料列數（堆積或叢集索引的分割區合計），不掃描資料表
+ROW_COUNT_SQL = """
+SELECT SUM(p.rows)
+FROM sys.partitions p
+WHERE p.object_id = {object_id} AND p.index_id IN (0, 1)
+"""
+
+# 不抽樣的欄位型別（無法比較或對撰寫 SQL 沒有幫助）
+_SKIPPED_TYPES = {
+    "binary", "varbinary", "image", "timestamp", "rowversion", "xml",
+    "geography", "geometry", "hierarchyid", "sql_variant",
+}
+
+# 長字串欄位只讀取前段文字，避免抽樣時傳回大量資料
+_LONG_TEXT_TYPES = {"text", "ntext"}
+_LONG_TEXT_CHARS = 100
+
+# 值提示中最小 / 最大值只列出日期時間欄位，常見值的最大字元數
+_RANGE_TYPES = {"date", "datetime", "datetime2", "smalldatetime", "datetimeoffset"}
+_HINT_VALUE_CHARS = 30
+
+# TABLESAMPLE 依資料頁抽樣，筆數不固定：抽樣比例取目標筆數的兩倍，
+# 取回的筆數少於目標的四分之一時改以 TOP 讀取
+_SAMPLE_OVERSHOOT = 2
+_MIN_SAMPLE_FRACTION = 4
+
+
+def _quote(name: str) -> str:
+    """以方括號包裹識別字"""
+    return "[" + name.replace("]", "]]") + "]"
+
+
+def _display(value) -> str:
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, datetime):
+        text = value.isoformat(sep=" ")
+    elif value == "":
+        text = "''"
+    else:
+        text = " ".join(str(value).split())
+    return text if len(text) <= _HINT_VALUE_CHARS else text[:_HINT_VALUE_CHARS - 1] + "…"
+
+
+@dataclass
+class ColumnProfile:
+    """單一欄位在樣本中的統計"""
+    name: str
+    data_type: str
+    sampled: int
+    nulls: int = 0
+    empty: Optional[int] = None
+    distinct: int = 0
+    top_values: list[tuple[object, int]] = field(default_factory=list)
+    minimum: object = None
+    maximum: object = None
+
+    @property
+    def null_rate(self) -> float:
+        return self.nulls / self.sampled if self.sampled else 0.0
+
+    @property
+    def empty_rate(self) -> float:
+        return (self.empty or 0) / self.sampled if self.sampled else 0.0
+
+    def format(self, complete: bool = True) -> str:
+        """
+        格式化為一行說明
+
+        Args:
+            complete: 樣本是否為整張資料表（否則不同值數量為下限）
+        """
+        parts = []
+        if self.nulls:
+            parts.append(f"NULL {self.null_rate:.0%}")
+        if self.empty:
+            parts.append(f"空字串 {self.empty_rate:.0%}")
+        if self.top_values:
+            values = "、".join(f"{_display(value)} ({count})" for value, count in self.top_values)
+            parts.append(f"值：{values}")
+        elif self.distinct:
+            parts.append(f"不同值 {'' if complete else '≥ '}{self.distinct}")
+        # 字串的最小 / 最大值對撰寫 SQL 沒有幫助，只列出數值與日期的範圍
+        if self.minimum is not None and self.minimum != self.maximum and not isinstance(self.minimum, str):
+            parts.append(f"範圍 {_display(self.minimum)} ~ {_display(self.maximum)}")
+        return f"- {self.name} ({self.data_type})：" + ("，".join(parts) or "全部 NULL")
+
+    def is_informative(self) -> bool:
+        """是否值得放入值提示（有空值、空字串、常見值清單或日期範圍）"""
+        return bool(
+            self.nulls or self.empty or self.top_values
+            or (self.data_type in _RANGE_TYPES and self.minimum is not None)
+        )
+
+
+@dataclass
+class TableProfile:
+    """單一資料表的欄位統計"""
+    schema: str
+    name: str
+    row_count: int
+    sampled_rows: int
+    sampling: str
+    columns: dict[str, ColumnProfile]
+    profiled_at: float = field(default_factory=time.monotonic)
+    elapsed: float = 0.0
+
+    @property
+    def complete(self) -> bool:
+        """樣本是否為整張資料表"""
+        return self.sampling == "full"
+
+    def format(self, columns: Optional[list[str]] = None, informative_only: bool = False) -> str:
+        """
+        格式化為資料表標題與每個欄位一行的說明
+
+        Args:
+            columns: 只列出這些欄位（不分大小寫），若未提供則列出全部
+            informative_only: 只列出有空值、空字串、常見值或日期範圍的欄位
+
+        Returns:
+            str: 統計說明；沒有任何欄位符合時只有標題
+        """
+        source = "全部資料" if self.complete else f"抽樣 {self.sampled_rows:,} 筆"
+        lines = [f"{_quote(self.schema)}.{_quote(self.name)}（約 {self.row_count:,} 筆，{source}）"]
+        wanted = {name.lower() for name in columns} if columns else None
+        for column in self.columns.values():
+            if wanted is not None and column.name.lower() not in wanted:
+                continue
+            if informative_only and not column.is_informative():
+                continue
+            lines.append(column.format(self.complete))
+        return "\n".join(lines)
+
+
+def build_sample_sql(table: dict, row_count: int, sample_rows: int, tablesample: bool = True) -> Optional[str]:
+    """
+    組成讀取樣本的查詢（受 TOP 限制，大型資料表以 TABLESAMPLE 只讀取部分資料頁）
+
+    Args:
+        table: get_schema_metadata() 回傳的資料表資訊
+        row_count: 資料表的資料列數
+        sample_rows: 抽樣的列數上限
+        tablesample: 資料列數超過上限時是否使用 TABLESAMPLE
+
+    Returns:
+        str: SELECT 語句；沒有可統計的欄位時回傳 None
+    """
+    select_list = []
+    for col in table["columns"]:
+        data_type = col["data_type"].lower()
+        if data_type in _SKIPPED_TYPES:
+            continue
+        quoted = _quote(col["name"])
+        if data_type in _LONG_TEXT_TYPES or col.get("max_length") == -1:
+            select_list.append(f"CAST({quoted} AS NVARCHAR({_LONG_TEXT_CHARS})) AS {quoted}")
+        else:
+            select_list.append(quoted)
+    if not select_list:
+        return None
+
+    source = f"{_quote(table['schema'])}.{_quote(table['name'])}"
+    if tablesample and row_count > sample_rows:
+        percent = min(100.0, sample_rows * _SAMPLE_OVERSHOOT * 100 / row_count)
+        source += f" TABLESAMPLE SYSTEM ({percent:.6f} PERCENT)"
+    return f"SELECT TOP ({sample_rows}) {', '.join(select_list)} FROM {source}"
+
+
+def profile_rows(
+    table: dict,
+    columns: list[str],
+    rows: list[tuple],
+    max_distinct: int = 20,
+    top_values: int = 10
+) -> dict[str, ColumnProfile]:
+    """
+    由樣本資料列計算每個欄位的統計
+
+    Args:
+        table: 資料表資訊（取得欄位型別）
+        columns: 樣本的欄位名稱
+        rows: 樣本資料列
+        max_distinct: 不同值數量不超過此值時列出常見值
+        top_values: 最多列出的常見值數量
+
+    Returns:
+        dict: 欄位名稱 → ColumnProfile
+    """
+    types = {col["name"]: col["data_type"].lower() for col in table["columns"]}
+    profiles = {}
+    for i, summary in enumerate(summarize_columns(columns, rows)):
+        data_type = types.get(summary.name, summary.type)
+        counts = Counter(row[i] for row in rows if row[i] is not None)
+        profile = ColumnProfile(
+            name=summary.name,
+            data_type=data_type,
+            sampled=len(rows),
+            nulls=summary.nulls,
+            empty=summary.empty if summary.type == "str" else None,
+            distinct=len(counts),
+            minimum=summary.minimum,
+            maximum=summary.maximum,
+        )
+        # 每個值都只出現一次（例如主鍵）時不列出
+        if 0 < len(counts) <= max_distinct and len(counts) < len(rows) - summary.nulls:
+            profile.top_values = counts.most_common(top_values)
+        profiles[summary.name] = profile
+    return profiles
+
+
+class ColumnProfiler:
+    """
+    以（連線字串, object_id）為 key 的欄位統計快取
+
+    get_profile() 只回傳快取，缺少或過期時排入背景佇列；
+    背景執行緒依序抽樣，兩次查詢之間至少間隔 min_interval 秒。
+    資料表的欄位變更後，舊的統計視為過期。
+    """
+
+    def __init__(
+        self,
+        sample_rows: int = 5000,
+        min_interval: float = 2.0,
+        refresh_interval: float = 3600,
+        max_distinct: int = 20,
+        query_timeout: float = 15.0
+    ):
+        """
+        初始化欄位統計快取
+
+        Args:
+            sample_rows: 每張資料表抽樣的列數上限
+            min_interval: 背景抽樣查詢之間的最小間隔秒數
+            refresh_interval: 統計的有效秒數，超過後在背景重新抽樣（過期前仍可使用）
+            max_distinct: 不同值數量不超過此值的欄位列出常見值
+            query_timeout: 每個抽樣查詢的逾時秒數
+        """
+        self.sample_rows = sample_rows
+        self.min_interval = min_interval
+        self.refresh_interval = refresh_interval
+        self.max_distinct = max_distinct
+        self.query_timeout = query_timeout
+        self._profiles: dict[tuple[str, int], TableProfile] = {}
+        self._pending: "OrderedDict[tuple[str, int], dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 同時只執行一個抽樣查詢（背景與即時查詢共用）
+        self._query_lock = threading.Lock()
+        self._last_query = 0.0
+        self._worker: Optional[threading.Thread] = None
+        self._stats = {"hits": 0, "misses": 0, "profiled": 0, "errors": 0, "rows_sampled": 0}
+
+    def get_profile(
+        self,
+        table: dict,
+        connection_string: Optional[str] = None,
+        wait: bool = False
+    ) -> Optional[TableProfile]:
+        """
+        取得資料表的欄位統計
+
+        Args:
+            table: get_schema_metadata() 回傳的資料表資訊
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            wait: 沒有快取時立即抽樣並等待結果（不受背景查詢間隔限制）
+
+        Returns:
+            TableProfile: 快取的統計（過期時仍回傳並在背景更新）；沒有快取且未等待時回傳 None
+        """
+        connection_string = connection_string or sql_server_config.connection_string
+        key = (connection_string, table["object_id"])
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is not None and not self._matches(profile, table):
+                profile = None
+            self._count_locked("hits" if profile is not None else "misses")
+        if profile is None and wait:
+            return self.profile_table(table, connection_string)
+        if profile is None or time.monotonic() - profile.profiled_at > self.refresh_interval:
+            self.request([table], connection_string, first=True)
+        return profile
+
+    def request(self, tables: list[dict], connection_string: Optional[str] = None, first: bool = False):
+        """
+        將資料表排入背景抽樣佇列（已在佇列中的不重複排入）
+
+        Args:
+            tables: 資料表資訊列表
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            first: 排在佇列最前面（與目前問題相關的資料表優先）
+        """
+        connection_string = connection_string or sql_server_config.connection_string
+        with self._lock:
+            for table in tables:
+                key = (connection_string, table["object_id"])
+                self._pending[key] = table
+                if first:
+                    self._pending.move_to_end(key, last=False)
+            if self._pending and (self._worker is None or not self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._work, name="column-profiler", daemon=True)
+                self._worker.start()
+
+    def profile_table(self, table: dict, connection_string: Optional[str] = None) -> TableProfile:
+        """
+        立即抽樣並更新快取
+
+        Args:
+            table: get_schema_metadata() 回傳的資料表資訊
+            connection_string: 連線字串，若未提供則使用環境變數設定
+
+        Returns:
+            TableProfile: 抽樣結果
+        """
+        return self._profile(table, connection_string or sql_server_config.connection_string, throttle=False)
+
+    def describe(
+        self,
+        tables: list[dict],
+        connection_string: Optional[str] = None,
+        token_budget: Optional[int] = None
+    ) -> str:
+        """
+        已快取資料表的值提示文字（不等待資料庫；缺少統計的資料表排入背景抽樣）
+
+        Args:
+            tables: 資料表資訊列表（依重要性排序）
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            token_budget: 文字的 token 上限，若未提供則使用 COLUMN_PROFILE_HINT_TOKENS
+
+        Returns:
+            str: 每張資料表的值提示；沒有可用的統計時回傳空字串
+        """
+        token_budget = column_profile_hint_tokens if token_budget is None else token_budget
+        blocks, used = [], 0
+        for table in tables:
+            profile = self.get_profile(table, connection_string)
+            if profile is None:
+                continue
+            text = profile.format(informative_only=True)
+            if "\n" not in text:
+                continue
+            cost = estimate_tokens(text)
+            if used + cost > token_budget:
+                break
+            blocks.append(text)
+            used += cost
+        return "\n".join(blocks)
+
+    def invalidate(self, connection_string: Optional[str] = None):
+        """
+        清除統計快取
+
+        Args:
+            connection_string: 要清除的連線字串，若未提供則清除全部
+        """
+        with self._lock:
+            for key in [key for key in self._profiles if connection_string in (None, key[0])]:
+                del self._profiles[key]
+
+    def stats(self) -> dict:
+        """取得快取與抽樣統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["tables"] = len(self._profiles)
+            stats["pending"] = len(self._pending)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    def _work(self):
+        """背景執行緒：依序抽樣佇列中的資料表，佇列清空後結束"""
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._worker = None
+                    return
+                (connection_string, _), table = self._pending.popitem(last=False)
+            try:
+                self._profile(table, connection_string, throttle=True)
+            except Exception:
+                # 連線失敗或查詢逾時時略過，下次使用時重新排入
+                self._count("errors")
+
+    def _profile(self, table: dict, connection_string: str, throttle: bool) -> TableProfile:
+        """抽樣並寫入快取；throttle 為 True 時與上一次查詢至少間隔 min_interval 秒"""
+        db = DatabaseConnector(connection_string)
+        start = time.perf_counter()
+        while True:
+            # 在鎖外等待間隔，等待期間前景的即時抽樣不會被擋住
+            wait = self._last_query + self.min_interval - time.monotonic() if throttle else 0
+            if wait > 0:
+                time.sleep(wait)
+            with self._query_lock:
+                if throttle and time.monotonic() < self._last_query + self.min_interval:
+                    # 等待期間有其他查詢執行過，重新計算間隔
+                    continue
+                try:
+                    with deadline(self.query_timeout):
+                        row_count, columns, rows, sampling = self._sample(db, table)
+                finally:
+                    self._last_query = time.monotonic()
+            break
+
+        profile = TableProfile(
+            schema=table["schema"],
+            name=table["name"],
+            row_count=max(row_count, len(rows)),
+            sampled_rows=len(rows),
+            sampling=sampling,
+            columns=profile_rows(table, columns, rows, self.max_distinct),
+            elapsed=time.perf_counter() - start,
+        )
+        with self._lock:
+            self._profiles[(connection_string, table["object_id"])] = profile
+            self._count_locked("profiled")
+            self._count_locked("rows_sampled", len(rows))
+        return profile
+
+    def _sample(self, db: DatabaseConnector, table: dict) -> tuple[int, list[str], list[tuple], str]:
+        """
+        讀取資料列數與樣本
+
+        Returns:
+            tuple: (資料列數, 樣本欄位, 樣本資料列, 抽樣方式 full / tablesample / top)
+        """
+        _, count_rows = db.execute_query(ROW_COUNT_SQL.format(object_id=int(table["object_id"])))
+        row_count = int(count_rows[0][0] or 0) if count_rows else 0
+        sql = build_sample_sql(table, row_count, self.sample_rows)
+        if sql is None:
+            return row_count, [], [], "full"
+        columns, rows = db.execute_query(sql)
+        if row_count <= self.sample_rows:
+            return row_count, columns, rows, "full"
+        if len(rows) >= self.sample_rows // _MIN_SAMPLE_FRACTION:
+            return row_count, columns, rows, "tablesample"
+        # 資料頁很少或分布不均時 TABLESAMPLE 可能幾乎沒有取回資料，改讀取前 N 筆（仍受 TOP 限制）
+        columns, rows = db.execute_query(build_sample_sql(table, row_count, self.sample_rows, tablesample=False))
+        return row_count, columns, rows, "top"
+
+    @staticmethod
+    def _matches(profile: TableProfile, table: dict) -> bool:
+        """統計是否對應資料表目前的欄位（欄位新增、刪除或改名後視為過期）"""
+        names = {col["name"] for col in table["columns"] if col["data_type"].lower() not in _SKIPPED_TYPES}
+        return names == set(profile.columns)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._count_locked(key, amount)
+
+    def _count_locked(self, key: str, amount: int = 1):
+        self._stats[key] += amount
+
+
+# 全域欄位統計快取（Agent 工具與 Web UI 共用；建立時不連線，第一次排入資料表時才啟動背景執行緒）
+column_profiler = ColumnProfiler(
+    sample_rows=column_profile_sample_rows,
+    min_interval=column_profile_min_interval,
+    refresh_interval=column_profile_refresh_interval,
+    max_distinct=column_profile_max_distinct,
+)
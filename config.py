@@ -39,12 +39,40 @@ class AzureOpenAIConfig:
 class SQLServerConfig:
     """SQL Server 設定"""
     connection_string: str
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    pool_idle_timeout: float = 300.0
+    pool_acquire_timeout: float = 30.0
+    preview_max_bytes: int = 1_000_000
+    page_size: int = 100
+    result_cache_ttl: float = 300.0
+    result_cache_max_bytes: int = 64 * 1024 * 1024
+    guard_enabled: bool = True
+    guard_max_cost: float = 1000.0
+    guard_max_rows: int = 1_000_000
+    guard_row_limit: int = 10_000
+    plan_cache_ttl: float = 600.0
+    query_timeout: int = 30
 
     @classmethod
     def from_env(cls) -> "SQLServerConfig":
         """從環境變數建立設定"""
         return cls(
-            connection_string=os.getenv("SQL_SERVER_CONNECTION_STRING", "")
+            connection_string=os.getenv("SQL_SERVER_CONNECTION_STRING", ""),
+            pool_min_size=int(os.getenv("SQL_POOL_MIN_SIZE", "1")),
+            pool_max_size=int(os.getenv("SQL_POOL_MAX_SIZE", "10")),
+            pool_idle_timeout=float(os.getenv("SQL_POOL_IDLE_TIMEOUT", "300")),
+            pool_acquire_timeout=float(os.getenv("SQL_POOL_ACQUIRE_TIMEOUT", "30")),
+            preview_max_bytes=int(os.getenv("QUERY_PREVIEW_MAX_BYTES", "1000000")),
+            page_size=int(os.getenv("QUERY_PAGE_SIZE", "100")),
+            result_cache_ttl=float(os.getenv("RESULT_CACHE_TTL", "300")),
+            result_cache_max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            guard_enabled=os.getenv("QUERY_GUARD_ENABLED", "true").lower() in ("1", "true", "yes"),
+            guard_max_cost=float(os.getenv("QUERY_MAX_COST", "1000")),
+            guard_max_rows=int(os.getenv("QUERY_MAX_ESTIMATED_ROWS", "1000000")),
+            guard_row_limit=int(os.getenv("QUERY_ROW_LIMIT", "10000")),
+            plan_cache_ttl=float(os.getenv("PLAN_CACHE_TTL", "600")),
+            query_timeout=int(os.getenv("QUERY_TIMEOUT", "30")),
         )
 
     def is_valid(self) -> bool:
@@ -58,3 +86,64 @@ sql_server_config = SQLServerConfig.from_env()
 
 # OpenAI Provider 設定 (azure / openai / litellm)
 openai_provider = os.getenv("OPENAI_PROVIDER", "azure")
+
+# 每個 Agent 同時進行的 LLM 請求上限
+agent_max_concurrency = int(os.getenv("AGENT_MAX_CONCURRENCY", "4"))
+
+# Agent 工具：資料庫執行緒池大小與每次工具呼叫的逾時秒數
+tool_max_workers = int(os.getenv("TOOL_MAX_WORKERS", "8"))
+tool_timeout = float(os.getenv("TOOL_TIMEOUT", "60"))
+
+# execute_sql 回傳給 LLM 的結果上限（UTF-8 位元組，含樣本列與欄位摘要）與單一欄位值顯示的最大字元數
+tool_result_max_bytes = int(os.getenv("TOOL_RESULT_MAX_BYTES", "4000"))
+tool_result_max_cell_chars = int(os.getenv("TOOL_RESULT_MAX_CELL_CHARS", "60"))
+
+# 每個問題的總時間預算（秒，涵蓋 LLM、所有工具呼叫與結果讀取）與單次 Agent 執行的工具呼叫上限
+request_timeout = float(os.getenv("REQUEST_TIMEOUT", "120"))
+agent_max_tool_calls = int(os.getenv("AGENT_MAX_TOOL_CALLS", "12"))
+
+# Agentic 模式的 Schema 提供方式：hybrid 把依問題裁剪的 Schema 直接放入指示，工具只在缺少資料表時使用；
+# tool 則由 Agent 先呼叫 get_database_schema（多一輪 LLM 往返）
+agent_schema_injection = os.getenv("AGENT_SCHEMA_INJECTION", "hybrid").lower()
+
+# Schema 快取：距上次檢查超過此秒數才重新比對資料表修改時間
+schema_cache_revalidate_interval = float(os.getenv("SCHEMA_CACHE_REVALIDATE_INTERVAL", "5"))
+
+# Schema 快照目錄：每個連線字串一個 JSON 檔，重新啟動後立即載入並在背景重新驗證（空白表示停用）
+schema_snapshot_dir = os.getenv("SCHEMA_SNAPSHOT_DIR", ".schema_snapshots")
+
+# Schema 裁剪：只送出與問題相關的前 K 張資料表（0 表示送出完整 Schema）與 token 上限
+schema_prune_top_k = int(os.getenv("SCHEMA_PRUNE_TOP_K", "8"))
+schema_prune_token_budget = int(os.getenv("SCHEMA_PRUNE_TOKEN_BUDGET", "4000"))
+
+# 送給 Agent 的 Schema 格式：ddl（資料表(欄位 型別, ...)）、compact（每表一行，只列欄位名稱）或 markdown（表格）
+schema_format = os.getenv("SCHEMA_FORMAT", "ddl").lower()
+
+# 問題 → SQL 快取：最多保留的筆數、存活秒數與 SQLite 檔案路徑（空白表示只存於記憶體）
+question_cache_max_entries = int(os.getenv("QUESTION_CACHE_MAX_ENTRIES", "1000"))
+question_cache_ttl = float(os.getenv("QUESTION_CACHE_TTL", "86400"))
+question_cache_path = os.getenv("QUESTION_CACHE_PATH", "")
+
+# 範例問答庫：依詞彙相似度挑出前 K 筆執行成功的問題與 SQL 放入提示詞（0 表示停用）、
+# 最多保留的筆數與每個資料庫（連線字串）的 Schema 版本數、SQLite 檔案路徑（空白表示只存於記憶體）
+few_shot_top_k = int(os.getenv("FEW_SHOT_TOP_K", "3"))
+few_shot_max_entries = int(os.getenv("FEW_SHOT_MAX_ENTRIES", "500"))
+few_shot_max_versions = int(os.getenv("FEW_SHOT_MAX_VERSIONS", "2"))
+few_shot_path = os.getenv("FEW_SHOT_PATH", "")
+
+# 欄位統計（值提示）：每張資料表抽樣的列數上限、背景抽樣查詢的最小間隔秒數、統計的有效秒數、
+# 列出常見值的不同值數上限，以及預先載入的 Schema 附上值提示的 token 上限（0 表示不附上）
+column_profile_sample_rows = int(os.getenv("COLUMN_PROFILE_SAMPLE_ROWS", "5000"))
+column_profile_min_interval = float(os.getenv("COLUMN_PROFILE_MIN_INTERVAL", "2"))
+column_profile_refresh_interval = float(os.getenv("COLUMN_PROFILE_REFRESH_INTERVAL", "3600"))
+column_profile_max_distinct = int(os.getenv("COLUMN_PROFILE_MAX_DISTINCT", "20"))
+column_profile_hint_tokens = int(os.getenv("COLUMN_PROFILE_HINT_TOKENS", "600"))
+
+# 外鍵關聯路徑：路徑最多經過的外鍵數、保留 BFS 結果的資料表數，
+# 以及預先載入的 Schema 附上 JOIN 提示的 token 上限（0 表示不附上）
+join_path_max_hops = int(os.getenv("JOIN_PATH_MAX_HOPS", "4"))
+join_path_cache_size = int(os.getenv("JOIN_PATH_CACHE_SIZE", "256"))
+join_hint_tokens = int(os.getenv("JOIN_HINT_TOKENS", "300"))
+
+# 執行前以快取的 Schema 驗證 SQL 中的資料表與欄位名稱
+sql_validation_enabled = os.getenv("SQL_VALIDATION_ENABLED", "true").lower() in ("1", "true", "yes")
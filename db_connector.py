@@ -2,14 +2,1171 @@
 SQL Server 資料庫連線模組
 
 提供 SQL Server 的連線管理和查詢執行功能。
+連線透過以連線字串為 key 的連線池共用，避免每次查詢都重新進行 TDS 登入。
 """
 
-import pyodbc
-from typing import Optional
+import contextvars
+import hashlib
+import importlib
+import math
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterator, Optional
 from contextlib import contextmanager
+
 from config import sql_server_config
 
 
+class _NotImportedError(Exception):
+    """延後匯入的模組尚未匯入時，代替其例外類別（不會被拋出）"""
+
+
+class _LazyModule:
+    """
+    第一次存取屬性時才匯入的模組
+
+    pyodbc 會在匯入時載入 ODBC 驅動程式管理員；只用到 SQL 工具函數或快取的程式
+    （CLI、測試、效能測試）因此不必付出這個成本，也不需要安裝 ODBC 驅動程式。
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            if attr.endswith("Error") and self._name not in sys.modules:
+                # except 子句在任何例外經過時都會求值；尚未匯入就不可能拋出此模組的例外，
+                # 回傳不會符合的例外類別，避免沒有 ODBC 驅動程式時以 ImportError 蓋掉原本的錯誤
+                return _NotImportedError
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+pyodbc = _LazyModule("pyodbc")
+
+
+class PoolTimeoutError(Exception):
+    """等待連線池釋出連線逾時"""
+
+
+class QueryCostError(Exception):
+    """查詢的估計成本或筆數超過上限，未執行"""
+
+
+class QueryTimeoutError(Exception):
+    """查詢超過執行逾時或請求的時間預算，已在伺服器端取消"""
+
+
+@dataclass
+class PoolStats:
+    """連線池統計資訊"""
+    created: int = 0
+    closed: int = 0
+    checkouts: int = 0
+    health_check_failures: int = 0
+    timeouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    idle: int = 0
+    in_use: int = 0
+
+    @property
+    def avg_wait(self) -> float:
+        """平均借出等待時間（秒）"""
+        return self.total_wait / self.checkouts if self.checkouts else 0.0
+
+
+class ConnectionPool:
+    """執行緒安全的 pyodbc 連線池"""
+
+    def __init__(
+        self,
+        connection_string: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        acquire_timeout: float = 30.0,
+        health_check_interval: float = 5.0,
+    ):
+        """
+        初始化連線池
+
+        Args:
+            connection_string: 連線字串
+            min_size: 閒置回收時至少保留的連線數
+            max_size: 同時存在的最大連線數
+            idle_timeout: 連線閒置超過此秒數即關閉（保留 min_size 條）
+            acquire_timeout: 連線池滿載時等待借出的最長秒數
+            health_check_interval: 連線閒置超過此秒數，借出前先以 SELECT 1 檢查
+        """
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("連線池大小設定無效")
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+
+        # 閒置連線：(連線, 歸還時間)，尾端為最近歸還者
+        self._idle: "deque[tuple[pyodbc.Connection, float]]" = deque()
+        self._size = 0  # 閒置 + 借出 + 建立中
+        self._cond = threading.Condition(threading.Lock())
+        self._stats = PoolStats()
+
+    def acquire(self) -> "pyodbc.Connection":
+        """
+        從連線池借出一條連線
+
+        Returns:
+            pyodbc.Connection: 已通過健康檢查的連線
+
+        Raises:
+            PoolTimeoutError: 超過 acquire_timeout 仍無可用連線
+        """
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+
+        while True:
+            conn, idle_since, expired = None, None, []
+            with self._cond:
+                expired = self._evict_idle_locked(time.monotonic())
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats.timeouts += 1
+                        raise PoolTimeoutError(
+                            f"等待資料庫連線逾時（{self.acquire_timeout:.0f} 秒，上限 {self.max_size} 條）"
+                        )
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    # 先保留名額，於鎖外建立連線
+                    self._size += 1
+            self._close_all(expired)
+
+            if conn is None:
+                try:
+                    conn = pyodbc.connect(self.connection_string)
+                except Exception:
+                    self._discard_slot()
+                    raise
+                with self._cond:
+                    self._stats.created += 1
+            elif not self._is_healthy(conn, time.monotonic() - idle_since):
+                self._close_all([conn])
+                self._discard_slot(health_check_failed=True)
+                continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._stats.checkouts += 1
+                self._stats.total_wait += waited
+                self._stats.max_wait = max(self._stats.max_wait, waited)
+            return conn
+
+    def release(self, conn: "pyodbc.Connection", discard: bool = False):
+        """
+        歸還連線；未提交的交易會被回滾，回滾失敗的連線直接丟棄
+
+        Args:
+            conn: 由 acquire() 借出的連線
+            discard: 是否直接關閉而不放回連線池
+        """
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+
+        if discard:
+            self._close_all([conn])
+            self._discard_slot()
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        借出連線的 Context Manager
+
+        Yields:
+            pyodbc.Connection: 資料庫連線物件
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def warm_up(self):
+        """預先建立 min_size 條連線"""
+        conns = []
+        try:
+            while len(conns) < self.min_size:
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                self.release(conn)
+
+    def warm_up_in_background(self):
+        """在背景執行緒預先建立連線；連線失敗時忽略，由第一次借出時回報錯誤"""
+
+        def warm_up():
+            try:
+                self.warm_up()
+            except Exception:
+                pass
+
+        threading.Thread(target=warm_up, name="pool-warm-up", daemon=True).start()
+
+    def close(self):
+        """關閉所有閒置連線（借出中的連線於歸還後照常回收）"""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        self._close_all(idle)
+
+    def stats(self) -> PoolStats:
+        """取得連線池統計資訊快照"""
+        with self._cond:
+            idle = len(self._idle)
+            return PoolStats(
+                created=self._stats.created,
+                closed=self._stats.closed,
+                checkouts=self._stats.checkouts,
+                health_check_failures=self._stats.health_check_failures,
+                timeouts=self._stats.timeouts,
+                total_wait=self._stats.total_wait,
+                max_wait=self._stats.max_wait,
+                idle=idle,
+                in_use=self._size - idle,
+            )
+
+    def _is_healthy(self, conn: "pyodbc.Connection", idle_for: float) -> bool:
+        """借出前的健康檢查：閒置太久的連線以 SELECT 1 確認仍可用"""
+        if getattr(conn, "closed", False):
+            return False
+        if idle_for < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle_locked(self, now: float) -> list:
+        """移除閒置過久的連線（需持有鎖），回傳待關閉的連線"""
+        expired = []
+        # 最舊的閒置連線位於前端
+        while (
+            self._idle
+            and self._size > self.min_size
+            and now - self._idle[0][1] > self.idle_timeout
+        ):
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            expired.append(conn)
+        return expired
+
+    def _discard_slot(self, health_check_failed: bool = False):
+        """釋放一個連線名額"""
+        with self._cond:
+            self._size -= 1
+            if health_check_failed:
+                self._stats.health_check_failures += 1
+            self._cond.notify()
+
+    def _close_all(self, conns: list):
+        """關閉連線並計入統計"""
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if conns:
+            with self._cond:
+                self._stats.closed += len(conns)
+
+
+# 以連線字串為 key 的全域連線池
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(connection_string: str) -> ConnectionPool:
+    """
+    取得（或建立）指定連線字串的共用連線池
+
+    Args:
+        connection_string: 連線字串
+
+    Returns:
+        ConnectionPool: 共用連線池（第一次建立時在背景預先建立 min_size 條連線）
+    """
+    with _pools_lock:
+        pool = _pools.get(connection_string)
+        if pool is not None:
+            return pool
+        pool = ConnectionPool(
+            connection_string,
+            min_size=sql_server_config.pool_min_size,
+            max_size=sql_server_config.pool_max_size,
+            idle_timeout=sql_server_config.pool_idle_timeout,
+            acquire_timeout=sql_server_config.pool_acquire_timeout,
+        )
+        _pools[connection_string] = pool
+    pool.warm_up_in_background()
+    return pool
+
+
+def close_all_pools():
+    """關閉所有連線池的閒置連線"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+class Deadline:
+    """
+    一次請求的截止時間
+
+    以 contextvars 傳遞到同一請求中的每個工具呼叫與 SQL 語句：語句逾時取剩餘時間與
+    QUERY_TIMEOUT 較小者，期間開啟的游標都會登記，到期或呼叫 cancel() 時在伺服器端取消。
+    子截止時間（例如單次工具呼叫）不會晚於父截止時間，取消父截止時間也會取消子截止時間的游標。
+    """
+
+    def __init__(self, seconds: Optional[float], parent: Optional["Deadline"] = None):
+        """
+        初始化截止時間
+        
+        Args:
+            seconds: 從現在起的秒數，None 表示不限制（仍受父截止時間限制）
+            parent: 父截止時間
+        """
+        expires_at = math.inf if seconds is None else time.monotonic() + seconds
+        if parent is not None:
+            expires_at = min(expires_at, parent.expires_at)
+        self.expires_at = expires_at
+        self.parent = parent
+        self.cancelled = False
+        self._cursors: set = set()
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """剩餘秒數（不限制時為 math.inf，已取消時為 0）"""
+        if self.cancelled or (self.parent is not None and self.parent.remaining() <= 0):
+            return 0.0
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        """是否已到期或已取消"""
+        return self.remaining() <= 0
+
+    def check(self):
+        """
+        已到期時拋出例外
+        
+        Raises:
+            QueryTimeoutError: 已到期或已取消
+        """
+        if self.expired:
+            raise QueryTimeoutError("已超過本次請求的時間上限，查詢未執行。")
+
+    def statement_timeout(self, default: int = 0) -> int:
+        """
+        單一語句的逾時秒數（pyodbc 的 Connection.timeout，0 表示不限制）
+        
+        Args:
+            default: 未受截止時間限制時的逾時秒數（QUERY_TIMEOUT）
+            
+        Returns:
+            int: 逾時秒數，至少 1 秒
+        """
+        remaining = self.remaining()
+        if remaining == math.inf:
+            return default
+        seconds = max(1, math.ceil(remaining))
+        return min(seconds, default) if default > 0 else seconds
+
+    def cancel(self):
+        """標記為已取消，並在伺服器端取消所有執行中的查詢（可從其他執行緒呼叫）"""
+        self.cancelled = True
+        with self._lock:
+            cursors = list(self._cursors)
+        for cursor in cursors:
+            try:
+                cursor.cancel()
+            except Exception:
+                pass
+
+    @contextmanager
+    def activate(self):
+        """在此區塊（含複製此 context 的工具執行緒）內使用此截止時間"""
+        token = _current_deadline.set(self)
+        try:
+            yield self
+        finally:
+            _current_deadline.reset(token)
+
+    def _track(self, cursor):
+        """登記執行中的游標（同時登記到所有父截止時間）"""
+        scope: Optional[Deadline] = self
+        while scope is not None:
+            with scope._lock:
+                scope._cursors.add(cursor)
+            scope = scope.parent
+
+    def _untrack(self, cursor):
+        """取消登記已結束的游標"""
+        scope: Optional[Deadline] = self
+        while scope is not None:
+            with scope._lock:
+                scope._cursors.discard(cursor)
+            scope = scope.parent
+
+
+# 目前請求的截止時間（未設定時為 None，只套用 QUERY_TIMEOUT）
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "query_deadline", default=None
+)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """取得目前請求的截止時間"""
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """
+    設定此區塊的截止時間（不會晚於外層的截止時間）
+    
+    Args:
+        seconds: 從現在起的秒數，None 表示沿用外層的截止時間
+        
+    Yields:
+        Deadline: 此區塊的截止時間
+    """
+    with Deadline(seconds, parent=current_deadline()).activate() as scope:
+        yield scope
+
+
+def estimate_row_bytes(row) -> int:
+    """粗估一列資料在記憶體中的大小（位元組），用於串流讀取的容量上限"""
+    size = 56 + 8 * len(row)
+    for value in row:
+        if value is None:
+            continue
+        if isinstance(value, str):
+            size += 49 + len(value)
+        elif isinstance(value, (bytes, bytearray)):
+            size += 33 + len(value)
+        elif isinstance(value, (Decimal, datetime, date)):
+            size += 48
+        else:
+            size += 28
+    return size
+
+
+_SQL_TOKEN = re.compile(
+    r"--[^\n]*|/\*.*?\*/|N?'(?:[^']|'')*'|\[(?:[^\]]|\]\])*\]|\"[^\"]*\"|[()]|[A-Za-z_]\w*",
+    re.DOTALL
+)
+
+
+def strip_sql(sql: str) -> str:
+    """移除 SQL 前後空白與結尾的分號"""
+    return sql.strip().rstrip(";").strip()
+
+
+def find_top_level_keyword(sql: str, keyword: str) -> int:
+    """
+    找出最外層（不在括號、字串、註解或方括號識別字內）最後一個關鍵字的位置
+    
+    Args:
+        sql: SQL 語句
+        keyword: 要尋找的關鍵字（不分大小寫）
+        
+    Returns:
+        int: 關鍵字的起始位置，找不到時回傳 -1
+    """
+    depth, found = 0, -1
+    keyword = keyword.upper()
+    for match in _SQL_TOKEN.finditer(sql):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token.upper() == keyword:
+            found = match.start()
+    return found
+
+
+# 最外層 SELECT 開頭的固定列數 TOP（limit_rows 加上的 TOP (n) 或 TOP n；不含 PERCENT / WITH TIES）
+_LEADING_TOP = re.compile(
+    r"(SELECT(?:\s+(?:DISTINCT|ALL)\b)?)\s+(TOP\s*(?:\(\s*(\d+)\s*\)|(\d+)\b))(?!\s*(?:PERCENT|WITH)\b)\s*",
+    re.IGNORECASE
+)
+
+
+def _split_top(sql: str) -> Optional[tuple[str, str, int]]:
+    """
+    拆出最外層 SELECT 的固定列數 TOP
+
+    Returns:
+        tuple: (SELECT [DISTINCT], TOP 之後的 SQL, 列數上限)；沒有可拆出的 TOP 時回傳 None
+    """
+    match = _LEADING_TOP.match(sql)
+    if match is None or find_top_level_keyword(sql, "TOP") != match.start(2):
+        return None
+    return match.group(1), sql[match.end():], int(match.group(3) or match.group(4))
+
+
+def paginate_sql(sql: str, offset: int, fetch: int) -> Optional[str]:
+    """
+    以 OFFSET / FETCH 改寫查詢，只取回其中一頁
+    
+    已有最外層 ORDER BY 時直接接上 OFFSET / FETCH；沒有排序時以 ORDER BY (SELECT NULL)
+    分頁（不保證各頁之間的順序穩定）。最外層有固定列數的 TOP (n)（例如 guard_query 加上的列數上限）時，
+    移除 TOP 並以 FETCH NEXT min(fetch, n - offset) 限制，分頁結果與原本的 TOP 相同。
+    
+    Args:
+        sql: 單一 SELECT 語句
+        offset: 略過的列數
+        fetch: 取回的列數
+        
+    Returns:
+        str: 分頁後的 SQL；語句無法直接分頁（例如 CTE、已含 OFFSET 或 TOP PERCENT、DISTINCT 或 UNION 且無排序）時回傳 None
+    """
+    sql = strip_sql(sql)
+    if not sql.upper().startswith("SELECT"):
+        return None
+    set_operation = any(
+        find_top_level_keyword(sql, keyword) >= 0 for keyword in ("UNION", "EXCEPT", "INTERSECT")
+    )
+    # 集合運算中的 TOP 只限制第一個 SELECT，不能改為整體的 FETCH
+    split = None if set_operation else _split_top(sql)
+    if split is not None:
+        select, body, limit = split
+        sql = f"{select} {body}"
+        fetch = min(fetch, limit - offset)
+    for keyword in ("TOP", "OFFSET", "INTO", "FOR", "OPTION"):
+        if find_top_level_keyword(sql, keyword) >= 0:
+            return None
+    if not set_operation and find_top_level_keyword(sql, "SELECT") != 0:
+        return None
+    if fetch <= 0:
+        # 已超過 TOP 的列數上限：TOP (0) 不傳回資料列，只取得欄位資訊；
+        # 沒有拆出 TOP 時 FETCH NEXT 0 不合法，交由呼叫端改用其他方式讀取
+        return f"{select} TOP (0) {body}" if split is not None else None
+
+    paging = f"OFFSET {int(offset)} ROWS FETCH NEXT {int(fetch)} ROWS ONLY"
+    if find_top_level_keyword(sql, "ORDER") > 0:
+        return f"{sql}\n{paging}"
+
+    # DISTINCT 與集合運算的 ORDER BY 項目必須出現在選取清單中，無法以常數排序
+    if set_operation or re.match(r"SELECT\s+DISTINCT\b", sql, re.IGNORECASE):
+        return None
+    return f"{sql}\nORDER BY (SELECT NULL) {paging}"
+
+
+def _to_column_array(values: tuple, type_code):
+    """
+    將單一欄位的一批值轉為型別化陣列
+
+    整數與布林欄位有 NULL 時使用 pandas 的可為空型別，
+    浮點數使用 float64（NULL 轉為 NaN），日期時間使用 datetime64，其餘保留為 object。
+    """
+    import numpy as np
+    import pandas as pd
+
+    try:
+        if type_code is int or type_code is bool:
+            dtype = np.int64 if type_code is int else np.bool_
+            if None in values:
+                # 先以遮罩標出 NULL 再整批轉型，比 pd.array(values, dtype="Int64") 逐值判斷快
+                objects = np.array(values, dtype=object)
+                mask = np.equal(objects, None)
+                objects[mask] = 0
+                if type_code is int:
+                    return pd.arrays.IntegerArray(objects.astype(dtype), mask)
+                return pd.arrays.BooleanArray(objects.astype(dtype), mask)
+            return np.fromiter(values, dtype=dtype, count=len(values))
+        if type_code is float:
+            return np.array(values, dtype=np.float64)
+        if type_code is datetime:
+            # DatetimeIndex 以 C 實作解析 datetime 物件，np.array(..., "datetime64") 慢約 30 倍
+            return pd.DatetimeIndex(values).array
+    except (TypeError, ValueError, OverflowError):
+        pass
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _build_frame(columns: list[str], arrays: list, truncated: bool):
+    """由各欄位的陣列建立 DataFrame，並以 attrs["truncated"] 記錄是否截斷"""
+    import pandas as pd
+
+    # 以位置建立再設定欄位名稱，容許重複的欄位名稱（例如 SELECT a.ID, b.ID）
+    df = pd.DataFrame(dict(enumerate(arrays)), copy=False)
+    df.columns = columns
+    df.attrs["truncated"] = truncated
+    return df
+
+
+def rows_to_frame(columns: list[str], rows: list, truncated: bool = False, type_codes: Optional[list] = None):
+    """
+    將少量資料列（例如一頁）轉置為欄位式 DataFrame
+    
+    Args:
+        columns: 欄位名稱列表
+        rows: 資料列列表
+        truncated: 是否還有更多資料（記錄在 attrs["truncated"]）
+        type_codes: 欄位的 Python 型別（cursor.description），若未提供則依第一個非 NULL 值推斷
+        
+    Returns:
+        pandas.DataFrame: 資料列組成的 DataFrame
+    """
+    import numpy as np
+
+    if rows:
+        if type_codes is None:
+            type_codes = [
+                next((type(value) for value in values if value is not None), None)
+                for values in zip(*rows)
+            ]
+        arrays = [_to_column_array(values, type_codes[i]) for i, values in enumerate(zip(*rows))]
+    else:
+        arrays = [np.array([], dtype=object) for _ in columns]
+    return _build_frame(columns, arrays, truncated)
+
+
+class QueryStream:
+    """
+    以 fetchmany 分批讀取的查詢結果
+
+    達到列數或容量上限時立即取消伺服器端的查詢，記憶體用量與結果大小無關。
+    """
+
+    def __init__(
+        self,
+        cursor: "pyodbc.Cursor",
+        batch_size: int = 500,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        as_tuples: bool = True
+    ):
+        """
+        初始化查詢串流
+        
+        Args:
+            cursor: 已執行查詢的游標
+            batch_size: 每次 fetchmany 的列數
+            max_rows: 最多讀取的列數，若未提供則不限制
+            max_bytes: 最多讀取的估計容量（位元組），若未提供則不限制
+            as_tuples: 是否把 pyodbc.Row 複製為 tuple；False 時直接產生 Row 物件
+        """
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.as_tuples = as_tuples
+        self.type_codes = [column[1] for column in cursor.description] if cursor.description else []
+        self.columns = [column[0] for column in cursor.description] if cursor.description else []
+        self.rows_fetched = 0
+        self.bytes_fetched = 0
+        self.truncated = False
+        self._done = cursor.description is None
+        self._deadline = current_deadline()
+
+    def __iter__(self) -> Iterator[list[tuple]]:
+        """逐批產生資料列（tuple 列表）"""
+        while not self._done:
+            if self._deadline is not None and self._deadline.expired:
+                # 讀取期間到期：取消伺服器端的查詢，不再等待剩餘的資料
+                self.close()
+                raise QueryTimeoutError("讀取查詢結果時超過本次請求的時間上限，已取消查詢。")
+            size = self.batch_size
+            if self.max_rows is not None:
+                size = min(size, self.max_rows - self.rows_fetched)
+            if size <= 0:
+                # 已達列數上限：多讀一列判斷是否還有資料，接著取消查詢
+                self.truncated = self.cursor.fetchone() is not None
+                self.close()
+                return
+
+            rows = self.cursor.fetchmany(size)
+            if not rows:
+                self._done = True
+                return
+
+            if self.max_bytes is None:
+                self.rows_fetched += len(rows)
+                yield [tuple(row) for row in rows] if self.as_tuples else rows
+                continue
+
+            batch = []
+            for row in rows:
+                row_bytes = estimate_row_bytes(row)
+                over_budget = self.max_bytes is not None and self.bytes_fetched + row_bytes > self.max_bytes
+                # 至少保留一列，避免單一超大列導致沒有任何結果
+                if over_budget and self.rows_fetched:
+                    self.truncated = True
+                    break
+                batch.append(tuple(row) if self.as_tuples else row)
+                self.rows_fetched += 1
+                self.bytes_fetched += row_bytes
+
+            if batch:
+                yield batch
+            if self.truncated:
+                self.close()
+                return
+
+    def close(self):
+        """取消尚未讀完的查詢並關閉游標"""
+        if not self._done:
+            self._done = True
+            try:
+                self.cursor.cancel()
+            except Exception:
+                pass
+        try:
+            self.cursor.close()
+        except Exception:
+            pass
+
+
+# 結果會隨時間或每次執行而不同的函數，查詢中出現時不快取
+_NONDETERMINISTIC = {
+    "GETDATE", "GETUTCDATE", "SYSDATETIME", "SYSUTCDATETIME", "SYSDATETIMEOFFSET",
+    "CURRENT_TIMESTAMP", "NEWID", "NEWSEQUENTIALID", "RAND", "CRYPT_GEN_RANDOM",
+}
+
+# 多段式物件名稱，例如 dbo.Orders、[Sales].[Order Details]
+_OBJECT_NAME = re.compile(
+    r"(?:\[(?:[^\]]|\]\])*\]|[A-Za-z_#@]\w*)(?:\s*\.\s*(?:\[(?:[^\]]|\]\])*\]|[A-Za-z_]\w*)){0,3}"
+)
+
+# 查詢參考的資料表之變更標記：修改時間（DDL）與最後一次寫入時間（DML，需要 VIEW SERVER STATE）
+RESULT_MARKERS_SQL = """
+SELECT
+    o.object_id,
+    o.type,
+    o.modify_date{usage_column}
+FROM sys.objects o
+WHERE o.object_id IN ({object_ids})
+"""
+
+RESULT_MARKERS_USAGE_COLUMN = """,
+    (SELECT MAX(u.last_user_update) FROM sys.dm_db_index_usage_stats u
+     WHERE u.database_id = DB_ID() AND u.object_id = o.object_id)"""
+
+# 單一查詢最多追蹤的物件名稱數量，超過時不快取
+MAX_RESULT_CACHE_NAMES = 64
+
+
+# 不需要以 OBJECT_ID 解析的常見關鍵字
+_RESERVED_WORDS = {
+    "SELECT", "FROM", "WHERE", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "CROSS", "APPLY",
+    "ON", "AND", "OR", "NOT", "IN", "IS", "NULL", "AS", "BY", "GROUP", "ORDER", "HAVING", "TOP",
+    "DISTINCT", "UNION", "ALL", "EXCEPT", "INTERSECT", "WITH", "CASE", "WHEN", "THEN", "ELSE",
+    "END", "ASC", "DESC", "LIKE", "BETWEEN", "EXISTS", "OVER", "PARTITION", "OFFSET", "FETCH",
+    "NEXT", "ROWS", "ROW", "ONLY", "PERCENT", "TIES", "COUNT", "SUM", "AVG", "MIN", "MAX",
+    "CAST", "CONVERT", "COALESCE", "ISNULL", "NOLOCK",
+}
+
+
+def sql_fingerprint(sql: str) -> str:
+    """
+    計算正規化後的 SQL 指紋
+    
+    移除註解、合併空白、去除簡單識別字的方括號或雙引號並轉為大寫；
+    字串常值保持原樣。僅空白、引號或大小寫不同的查詢會得到相同的指紋。
+    
+    Args:
+        sql: SQL 語句
+        
+    Returns:
+        str: SHA-1 指紋
+    """
+    sql = strip_sql(sql)
+    parts, position = [], 0
+    for match in _SQL_TOKEN.finditer(sql):
+        parts.extend(re.findall(r"\d+(?:\.\d+)?|\S", sql[position:match.start()]))
+        position = match.end()
+        token = match.group(0)
+        if token.startswith(("--", "/*")):
+            continue
+        if token.startswith(("'", "N'", "n'")):
+            parts.append(token if token[0] == "'" else "N" + token[1:])
+            continue
+        if token[0] in "[\"" and re.fullmatch(r"\w+", token[1:-1]):
+            token = token[1:-1]
+        parts.append(token.upper())
+    parts.extend(re.findall(r"\d+(?:\.\d+)?|\S", sql[position:]))
+    return hashlib.sha1(" ".join(parts).encode("utf-8")).hexdigest()
+
+
+def referenced_object_names(sql: str) -> Optional[list[str]]:
+    """
+    找出查詢中可能參考的物件名稱（供 OBJECT_ID 解析）
+    
+    Args:
+        sql: SQL 語句
+        
+    Returns:
+        list: 候選物件名稱；查詢不適合快取（非單一 SELECT、SELECT INTO、暫存資料表、
+              變數或不確定性函數）時回傳 None
+    """
+    sql = strip_sql(sql)
+    if not re.match(r"(SELECT|WITH)\b", sql, re.IGNORECASE):
+        return None
+
+    # 移除註解與字串常值，只保留程式碼
+    code = _SQL_TOKEN.sub(lambda m: " " if m.group(0).startswith(("--", "/*", "'", "N'", "n'")) else m.group(0), sql)
+    words = {word.upper() for word in re.findall(r"[A-Za-z_]\w*", code)}
+    if ";" in code or "INTO" in words or words & _NONDETERMINISTIC:
+        return None
+
+    names = []
+    for match in _OBJECT_NAME.finditer(code):
+        name = match.group(0)
+        if name.startswith(("#", "@")):
+            return None
+        if name.upper() not in _RESERVED_WORDS and name not in names:
+            names.append(name)
+    if not names or len(names) > MAX_RESULT_CACHE_NAMES:
+        return None
+    return names
+
+
+@dataclass
+class _CachedResult:
+    """結果快取項目；complete 為 False 時只保存結果的前幾列"""
+    columns: list[str]
+    type_codes: list
+    rows: list[tuple]
+    complete: bool
+    markers: dict
+    stored_at: float
+    size: int
+
+    def covers(self, rows_needed: Optional[int]) -> bool:
+        """是否足以提供前 rows_needed 列（None 表示需要完整結果）"""
+        if self.complete:
+            return True
+        return rows_needed is not None and len(self.rows) >= rows_needed
+
+    def has_more(self, end: int) -> bool:
+        """第 end 列之後是否還有資料"""
+        return len(self.rows) > end or not self.complete
+
+
+class ResultCache:
+    """
+    查詢結果快取
+
+    以（連線字串, SQL 指紋）為 key，並記錄查詢參考之資料表的變更標記；
+    任一資料表的標記改變時，所有參考該資料表的項目一併失效。
+    另以 TTL 與總容量（LRU 淘汰）限制，單筆結果超過總容量的 1/4 時不快取。
+    """
+
+    def __init__(self, ttl: float = 300, max_bytes: int = 64 * 1024 * 1024):
+        """
+        初始化結果快取
+        
+        Args:
+            ttl: 每筆快取的存活秒數（0 表示停用）
+            max_bytes: 快取結果的估計總容量上限（位元組）
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple[str, str], _CachedResult]" = OrderedDict()
+        self._by_table: dict[tuple[str, int], set] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+    @property
+    def enabled(self) -> bool:
+        """是否啟用快取"""
+        return self.ttl > 0 and self.max_bytes > 0
+
+    def get(self, key: tuple[str, str], markers: dict, rows_needed: Optional[int]) -> Optional[_CachedResult]:
+        """
+        取得仍然有效的快取結果
+        
+        Args:
+            key: (連線字串, SQL 指紋)
+            markers: 參考資料表目前的變更標記 {object_id: 標記}
+            rows_needed: 需要的列數（None 表示需要完整結果）
+            
+        Returns:
+            _CachedResult: 快取結果，未命中時回傳 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                changed = [oid for oid, marker in entry.markers.items() if markers.get(oid) != marker]
+                for object_id in changed:
+                    self._invalidate_table_locked(key[0], object_id)
+                if not changed and time.monotonic() - entry.stored_at > self.ttl:
+                    self._remove_locked(key)
+                if key not in self._entries:
+                    entry = None
+            if entry is None or not entry.covers(rows_needed):
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry
+
+    def put(
+        self,
+        key: tuple[str, str],
+        markers: dict,
+        columns: list[str],
+        type_codes: list,
+        rows: list[tuple],
+        complete: bool
+    ):
+        """
+        寫入查詢結果
+        
+        Args:
+            key: (連線字串, SQL 指紋)
+            markers: 執行查詢前讀取的資料表變更標記
+            columns: 欄位名稱列表
+            type_codes: 欄位的 Python 型別
+            rows: 資料列（完整結果或從第一列開始的前幾列）
+            complete: rows 是否為完整結果
+        """
+        size = sum(estimate_row_bytes(row) for row in rows)
+        if size > self.max_bytes // 4:
+            return
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None and existing.covers(None if complete else len(rows)):
+                return
+            self._remove_locked(key)
+            self._entries[key] = _CachedResult(
+                columns, type_codes, rows, complete, markers, time.monotonic(), size
+            )
+            self._bytes += size
+            for object_id in markers:
+                self._by_table.setdefault((key[0], object_id), set()).add(key)
+            self._stats["stores"] += 1
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove_locked(next(iter(self._entries)))
+
+    def invalidate(self, connection_string: Optional[str] = None):
+        """
+        清除快取
+        
+        Args:
+            connection_string: 只清除此連線字串的項目，若未提供則全部清除
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if connection_string is None or key[0] == connection_string:
+                    self._remove_locked(key)
+
+    def stats(self) -> dict:
+        """取得快取命中統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    def _invalidate_table_locked(self, connection_string: str, object_id: int):
+        """移除所有參考此資料表的項目（呼叫端需持有鎖）"""
+        keys = self._by_table.pop((connection_string, object_id), set())
+        for key in keys:
+            self._remove_locked(key)
+        self._stats["invalidations"] += len(keys)
+
+    def _remove_locked(self, key: tuple[str, str]):
+        """移除單一項目（呼叫端需持有鎖）"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for object_id in entry.markers:
+            keys = self._by_table.get((key[0], object_id))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[(key[0], object_id)]
+
+
+# 全域共用的查詢結果快取
+result_cache = ResultCache(
+    ttl=sql_server_config.result_cache_ttl,
+    max_bytes=sql_server_config.result_cache_max_bytes
+)
+
+# 沒有 VIEW SERVER STATE 權限、無法讀取資料寫入時間的連線字串（只能依 TTL 失效）
+_no_usage_stats: set[str] = set()
+
+
+# SHOWPLAN_XML 的 XML 命名空間
+SHOWPLAN_NAMESPACE = "{http://schemas.microsoft.com/sqlserver/2004/07/showplan}"
+
+
+@dataclass
+class PlanEstimate:
+    """估計執行計畫的成本與筆數"""
+    cost: float
+    rows: float
+
+
+def parse_showplan(xml: str) -> PlanEstimate:
+    """
+    從 SHOWPLAN_XML 讀取估計成本與筆數
+    
+    Args:
+        xml: SET SHOWPLAN_XML ON 時查詢回傳的執行計畫
+        
+    Returns:
+        PlanEstimate: 所有語句的估計子樹成本總和，以及最大的估計筆數
+    """
+    import xml.etree.ElementTree as ElementTree
+
+    root = ElementTree.fromstring(xml)
+    cost, rows = 0.0, 0.0
+    for statement in root.iter(f"{SHOWPLAN_NAMESPACE}StmtSimple"):
+        cost += float(statement.get("StatementSubTreeCost", 0))
+        rows = max(rows, float(statement.get("StatementEstRows", 0)))
+    return PlanEstimate(cost, rows)
+
+
+def limit_rows(sql: str, limit: int) -> str:
+    """
+    替沒有列數限制的 SELECT 加上 TOP
+    
+    只處理最外層單一的 SELECT（可搭配 CTE）；已有 TOP / OFFSET、SELECT INTO
+    或集合運算（UNION 等）時維持原樣。
+    
+    Args:
+        sql: SQL 語句
+        limit: 列數上限
+        
+    Returns:
+        str: 加上 TOP (limit) 的 SQL，不適用時回傳原本的 SQL
+    """
+    stripped = strip_sql(sql)
+    if not re.match(r"(SELECT|WITH)\b", stripped, re.IGNORECASE):
+        return sql
+    for keyword in ("TOP", "OFFSET", "INTO", "UNION", "EXCEPT", "INTERSECT"):
+        if find_top_level_keyword(stripped, keyword) >= 0:
+            return sql
+
+    depth, selects = 0, []
+    for match in _SQL_TOKEN.finditer(stripped):
+        token = match.group(0)
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0 and token.upper() == "SELECT":
+            selects.append(match.start())
+    if len(selects) != 1:
+        return sql
+
+    match = re.compile(r"SELECT(\s+(?:DISTINCT|ALL)\b)?\s*", re.IGNORECASE).match(stripped, selects[0])
+    return f"{stripped[:match.end()].rstrip()} TOP ({int(limit)}) {stripped[match.end():]}"
+
+
+class PlanCache:
+    """
+    估計執行計畫快取
+
+    以（連線字串, SQL 指紋）為 key，TTL 到期或超過筆數上限（LRU）時淘汰。
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 1000):
+        """
+        初始化執行計畫快取
+        
+        Args:
+            ttl: 每筆快取的存活秒數
+            max_entries: 最多保留的筆數
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple[str, str], tuple[PlanEstimate, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: tuple[str, str]) -> Optional[PlanEstimate]:
+        """取得未過期的估計值，未命中時回傳 None"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or time.monotonic() - item[1] > self.ttl:
+                self._entries.pop(key, None)
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return item[0]
+
+    def put(self, key: tuple[str, str], estimate: PlanEstimate):
+        """寫入估計值"""
+        with self._lock:
+            self._entries[key] = (estimate, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """取得快取命中統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+
+# 全域共用的執行計畫快取
+plan_cache = PlanCache(ttl=sql_server_config.plan_cache_ttl)
+
+# 沒有 SHOWPLAN 權限的連線字串（不做成本檢查，只加上 TOP）
+_no_showplan: set[str] = set()
+
+
+def _is_timeout_error(error: "pyodbc.Error") -> bool:
+    """是否為語句逾時（HYT00）或被取消（HY008）的錯誤"""
+    state = error.args[0] if error.args else ""
+    return state in ("HYT00", "HYT01", "HY008")
+
+
 class DatabaseConnector:
     """SQL Server 資料庫連線器"""
 
@@ -22,34 +1179,80 @@ class DatabaseConnector:
         """
         self.connection_string = connection_string or sql_server_config.connection_string
 
+    @property
+    def pool(self) -> ConnectionPool:
+        """此連線字串對應的共用連線池"""
+        return get_pool(self.connection_string)
+
     @contextmanager
     def get_connection(self):
         """
-        取得資料庫連線的 Context Manager
+        從共用連線池借出連線的 Context Manager
         
         Yields:
             pyodbc.Connection: 資料庫連線物件
         """
-        conn = None
-        try:
-            conn = pyodbc.connect(self.connection_string)
+        with self.pool.connection() as conn:
             yield conn
+
+    @contextmanager
+    def _cursor(self, conn: "pyodbc.Connection"):
+        """
+        開啟套用逾時的游標：語句逾時取 QUERY_TIMEOUT 與目前截止時間的剩餘秒數較小者，
+        執行期間登記到截止時間，到期時可從其他執行緒在伺服器端取消
+        
+        Args:
+            conn: 資料庫連線
+            
+        Yields:
+            pyodbc.Cursor: 游標
+            
+        Raises:
+            QueryTimeoutError: 截止時間已到，或語句執行逾時／被取消
+        """
+        scope = current_deadline()
+        timeout = sql_server_config.query_timeout
+        if scope is not None:
+            timeout = scope.statement_timeout(timeout)
+        # 連線池的連線會重複使用，每次都重新設定
+        conn.timeout = timeout
+        cursor = conn.cursor()
+        if scope is not None:
+            # 先登記再檢查：之後才呼叫的 cancel() 一定會取消到此游標
+            scope._track(cursor)
+        try:
+            if scope is not None:
+                scope.check()
+            yield cursor
+        except pyodbc.Error as e:
+            if scope is not None and scope.expired:
+                raise QueryTimeoutError("已超過本次請求的時間上限，查詢已在伺服器端取消。") from e
+            if _is_timeout_error(e):
+                raise QueryTimeoutError(
+                    f"查詢執行超過 {timeout} 秒，已在伺服器端取消。"
+                    "請縮小查詢範圍，例如加上 TOP 或更嚴格的 WHERE 條件後重試。"
+                ) from e
+            raise
         finally:
-            if conn:
-                conn.close()
+            if scope is not None:
+                scope._untrack(cursor)
 
-    def execute_query(self, sql: str) -> tuple[list[str], list[tuple]]:
+    def execute_query(self, sql: str, cache: bool = False) -> tuple[list[str], list[tuple]]:
         """
         執行 SQL 查詢並回傳結果
         
         Args:
             sql: 要執行的 SQL 語句
+            cache: 是否使用查詢結果快取（參考的資料表未變更時不重新執行）
             
         Returns:
             tuple: (欄位名稱列表, 資料列列表)
         """
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        key, markers, entry = self._cache_lookup(sql, None) if cache else (None, None, None)
+        if entry is not None:
+            return entry.columns, list(entry.rows)
+
+        with self.get_connection() as conn, self._cursor(conn) as cursor:
             cursor.execute(sql)
             
             # 取得欄位名稱
@@ -58,7 +1261,346 @@ class DatabaseConnector:
             # 取得所有資料列
             rows = cursor.fetchall()
             
-            return columns, [tuple(row) for row in rows]
+            rows = [tuple(row) for row in rows]
+            if key is not None:
+                type_codes = [column[1] for column in cursor.description] if cursor.description else []
+                result_cache.put(key, markers, columns, type_codes, rows, complete=True)
+            return columns, rows
+
+    @contextmanager
+    def stream_query(
+        self,
+        sql: str,
+        batch_size: int = 500,
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        as_tuples: bool = True
+    ):
+        """
+        以串流方式執行查詢的 Context Manager
+        
+        Args:
+            sql: 要執行的 SQL 語句
+            batch_size: 每次 fetchmany 的列數
+            max_rows: 最多讀取的列數，若未提供則不限制
+            max_bytes: 最多讀取的估計容量（位元組），若未提供則不限制
+            as_tuples: 是否把 pyodbc.Row 複製為 tuple
+            
+        Yields:
+            QueryStream: 可逐批迭代的查詢結果
+        """
+        with self.get_connection() as conn, self._cursor(conn) as cursor:
+            cursor.execute(sql)
+            stream = QueryStream(cursor, batch_size, max_rows, max_bytes, as_tuples)
+            try:
+                yield stream
+            finally:
+                stream.close()
+
+    def fetch_preview(
+        self,
+        sql: str,
+        limit: int = 50,
+        max_bytes: Optional[int] = None,
+        cache: bool = False
+    ) -> tuple[list[str], list[tuple], bool]:
+        """
+        只讀取查詢結果的前幾列，其餘部分在伺服器端取消
+        
+        Args:
+            sql: 要執行的 SQL 語句
+            limit: 最多讀取的列數
+            max_bytes: 最多讀取的估計容量（位元組），若未提供則使用 QUERY_PREVIEW_MAX_BYTES
+            cache: 是否使用查詢結果快取
+            
+        Returns:
+            tuple: (欄位名稱列表, 資料列列表, 是否還有更多資料)
+        """
+        max_bytes = sql_server_config.preview_max_bytes if max_bytes is None else max_bytes
+        key, markers, entry = self._cache_lookup(sql, limit) if cache else (None, None, None)
+        if entry is not None:
+            return entry.columns, entry.rows[:limit], entry.has_more(limit)
+
+        columns, type_codes, rows, truncated = self._read_rows(sql, limit, max_bytes=max_bytes)
+        if key is not None:
+            result_cache.put(key, markers, columns, type_codes, rows, complete=not truncated)
+        return columns, rows, truncated
+
+    def execute_columnar(self, sql: str, batch_size: int = 10_000, max_rows: Optional[int] = None):
+        """
+        執行查詢並直接建立欄位式（columnar）的 DataFrame
+
+        每批 fetchmany 的 Row 物件直接轉置成各欄位的型別化陣列，
+        不經過 tuple 列表，結果在記憶體中只保留一份。
+        
+        Args:
+            sql: 要執行的 SQL 語句
+            batch_size: 每次 fetchmany 的列數
+            max_rows: 最多讀取的列數，若未提供則不限制
+            
+        Returns:
+            pandas.DataFrame: 查詢結果；DataFrame.attrs["truncated"] 表示是否因列數上限而截斷
+        """
+        import numpy as np
+        import pandas as pd
+
+        with self.stream_query(sql, batch_size=batch_size, max_rows=max_rows, as_tuples=False) as stream:
+            columns = stream.columns
+            type_codes = stream.type_codes
+            chunks: list[list] = [[] for _ in columns]
+            for batch in stream:
+                for i, values in enumerate(zip(*batch)):
+                    chunks[i].append(_to_column_array(values, type_codes[i]))
+                del batch
+            truncated = stream.truncated
+
+        arrays = []
+        for column_chunks in chunks:
+            if not column_chunks:
+                arrays.append(np.array([], dtype=object))
+            elif len(column_chunks) == 1:
+                arrays.append(column_chunks[0])
+            else:
+                arrays.append(pd.concat(
+                    [pd.Series(chunk, copy=False) for chunk in column_chunks], ignore_index=True
+                ))
+            column_chunks.clear()
+
+        return _build_frame(columns, arrays, truncated)
+
+    def fetch_page(self, sql: str, page: int = 0, page_size: int = 100, cache: bool = False):
+        """
+        只讀取查詢結果的其中一頁
+        
+        可改寫時由伺服器以 OFFSET / FETCH 分頁（多取一列判斷是否還有下一頁）；
+        否則改為串流讀取並在用戶端略過前面的列，讀滿一頁即取消查詢。
+        
+        Args:
+            sql: 單一 SELECT 語句
+            page: 頁碼（從 0 開始）
+            page_size: 每頁筆數
+            cache: 是否使用查詢結果快取（只有第一頁會寫入快取）
+            
+        Returns:
+            pandas.DataFrame: 該頁資料；DataFrame.attrs["truncated"] 表示是否還有下一頁
+        """
+        offset = page * page_size
+        key, markers, entry = self._cache_lookup(sql, offset + page_size) if cache else (None, None, None)
+        if entry is not None:
+            rows = entry.rows[offset:offset + page_size]
+            return rows_to_frame(entry.columns, rows, entry.has_more(offset + page_size), entry.type_codes)
+
+        columns = type_codes = rows = None
+        paged_sql = paginate_sql(sql, offset, page_size + 1)
+        if paged_sql is not None:
+            try:
+                columns, type_codes, rows, has_more = self._read_rows(paged_sql, page_size)
+            except pyodbc.ProgrammingError:
+                # 例如選取清單有未命名的欄位或排序項目不合法，改用用戶端分頁
+                pass
+        if rows is None:
+            columns, type_codes, rows, has_more = self._read_rows(sql, page_size, offset=offset)
+
+        if key is not None and offset == 0:
+            result_cache.put(key, markers, columns, type_codes, rows, complete=not has_more)
+        return rows_to_frame(columns, rows, has_more, type_codes)
+
+    def _read_rows(
+        self,
+        sql: str,
+        limit: int,
+        offset: int = 0,
+        max_bytes: Optional[int] = None
+    ) -> tuple[list[str], list, list[tuple], bool]:
+        """
+        串流讀取第 offset 列起的 limit 列，讀滿即取消查詢
+        
+        Returns:
+            tuple: (欄位名稱列表, 欄位型別列表, 資料列列表, 是否還有更多資料)
+        """
+        batch_size = min(offset + limit + 1, 10_000)
+        with self.stream_query(sql, batch_size=batch_size, max_rows=offset + limit, max_bytes=max_bytes) as stream:
+            rows = [row for batch in stream for row in batch][offset:]
+            return stream.columns, stream.type_codes, rows, stream.truncated
+
+    def _cache_lookup(self, sql: str, rows_needed: Optional[int]):
+        """
+        查詢結果快取
+        
+        執行查詢前先讀取參考資料表的變更標記，寫入快取時使用同一份標記，
+        查詢執行期間發生的變更會在下次查詢時使項目失效。
+        
+        Returns:
+            tuple: (快取 key, 變更標記, 快取結果)；查詢不可快取時 key 為 None
+        """
+        if not result_cache.enabled:
+            return None, None, None
+        names = referenced_object_names(sql)
+        markers = self._table_markers(names) if names else None
+        if not markers:
+            return None, None, None
+        key = (self.connection_string, sql_fingerprint(sql))
+        return key, markers, result_cache.get(key, markers, rows_needed)
+
+    def _table_markers(self, names: list[str]) -> Optional[dict]:
+        """
+        讀取物件名稱對應之資料表的變更標記
+        
+        Returns:
+            dict: {object_id: (修改時間, 最後寫入時間)}；沒有任何資料表，
+                  或參考了檢視表等無法追蹤變更的物件時回傳 None
+        """
+        object_ids = ", ".join("OBJECT_ID(?)" for _ in names)
+        use_usage_stats = self.connection_string not in _no_usage_stats
+        try:
+            with self.get_connection() as conn, self._cursor(conn) as cursor:
+                try:
+                    usage_column = RESULT_MARKERS_USAGE_COLUMN if use_usage_stats else ""
+                    cursor.execute(RESULT_MARKERS_SQL.format(usage_column=usage_column, object_ids=object_ids), *names)
+                except pyodbc.Error:
+                    if not use_usage_stats:
+                        raise
+                    # 沒有 VIEW SERVER STATE 權限：只比對修改時間，資料變更依 TTL 失效
+                    _no_usage_stats.add(self.connection_string)
+                    cursor.execute(RESULT_MARKERS_SQL.format(usage_column="", object_ids=object_ids), *names)
+                rows = cursor.fetchall()
+        except pyodbc.Error:
+            return None
+
+        markers = {}
+        for row in rows:
+            if row[1].strip() != "U":
+                return None
+            markers[row[0]] = tuple(row[2:])
+        return markers or None
+
+    def estimate_plan(self, sql: str) -> Optional[PlanEstimate]:
+        """
+        以 SET SHOWPLAN_XML ON 取得估計執行計畫（不實際執行查詢）
+        
+        Args:
+            sql: SELECT 語句
+            
+        Returns:
+            PlanEstimate: 估計成本與筆數；沒有 SHOWPLAN 權限時回傳 None
+            
+        Raises:
+            pyodbc.Error: 查詢無法編譯（例如名稱錯誤），與實際執行時的錯誤相同
+        """
+        if self.connection_string in _no_showplan:
+            return None
+        key = (self.connection_string, sql_fingerprint(sql))
+        estimate = plan_cache.get(key)
+        if estimate is not None:
+            return estimate
+
+        conn = self.pool.acquire()
+        discard = False
+        try:
+            with self._cursor(conn) as cursor:
+                cursor.execute("SET SHOWPLAN_XML ON")
+                try:
+                    cursor.execute(sql)
+                    xml = "".join(row[0] for row in cursor.fetchall())
+                finally:
+                    try:
+                        cursor.execute("SET SHOWPLAN_XML OFF")
+                    except pyodbc.Error:
+                        # 無法關閉 SHOWPLAN 的連線不可放回連線池
+                        discard = True
+        except pyodbc.Error as e:
+            if "SHOWPLAN" not in str(e).upper():
+                raise
+            _no_showplan.add(self.connection_string)
+            return None
+        finally:
+            self.pool.release(conn, discard=discard)
+
+        estimate = parse_showplan(xml)
+        plan_cache.put(key, estimate)
+        return estimate
+
+    def guard_query(self, sql: str) -> str:
+        """
+        執行前的成本檢查：缺少 TOP 時自動加上列數上限，再以估計執行計畫檢查成本與筆數
+        
+        Args:
+            sql: 要執行的 SQL 語句
+            
+        Returns:
+            str: 實際要執行的 SQL（可能已加上 TOP）
+            
+        Raises:
+            QueryCostError: 估計成本或筆數超過 QUERY_MAX_COST / QUERY_MAX_ESTIMATED_ROWS
+        """
+        config = sql_server_config
+        if not config.guard_enabled or not re.match(r"\s*(SELECT|WITH)\b", sql, re.IGNORECASE):
+            return sql
+        if config.guard_row_limit > 0:
+            sql = limit_rows(sql, config.guard_row_limit)
+
+        estimate = self.estimate_plan(sql)
+        if estimate is None:
+            return sql
+        if estimate.cost > config.guard_max_cost:
+            raise QueryCostError(
+                f"查詢估計成本過高（估計成本 {estimate.cost:,.1f}，上限 {config.guard_max_cost:,.0f}），未執行。"
+                "請加上更嚴格的 WHERE 條件、避免沒有條件的 JOIN（笛卡兒積），或改用彙總查詢後重試。"
+            )
+        if estimate.rows > config.guard_max_rows:
+            raise QueryCostError(
+                f"查詢估計回傳筆數過多（估計 {estimate.rows:,.0f} 筆，上限 {config.guard_max_rows:,}），未執行。"
+                "請加上較小的 TOP、更嚴格的 WHERE 條件，或改用彙總查詢後重試。"
+            )
+        return sql
+
+    def existing_objects(self, names: list[str]) -> set[str]:
+        """
+        找出實際存在於資料庫的物件名稱（資料表、檢視表、同義字等）
+        
+        Args:
+            names: 物件名稱（可含結構描述）
+            
+        Returns:
+            set: names 中 OBJECT_ID 不為 NULL 的名稱
+        """
+        if not names:
+            return set()
+        values = ", ".join("(?)" for _ in names)
+        with self.get_connection() as conn, self._cursor(conn) as cursor:
+            cursor.execute(
+                f"SELECT v.name FROM (VALUES {values}) AS v(name) WHERE OBJECT_ID(v.name) IS NOT NULL",
+                *names
+            )
+            return {row[0] for row in cursor.fetchall()}
+
+    def count_rows(self, sql: str) -> Optional[int]:
+        """
+        以 COUNT_BIG 計算查詢結果的總筆數（不傳回資料列）
+        
+        Args:
+            sql: 單一 SELECT 語句
+            
+        Returns:
+            int: 總筆數；語句無法包成子查詢（例如 CTE、多個語句），
+                 或計數查詢的估計成本超過 QUERY_MAX_COST（guard_query）時回傳 None
+        """
+        sql = strip_sql(sql)
+        if not sql.upper().startswith("SELECT") or find_top_level_keyword(sql, "SELECT") != 0:
+            return None
+
+        # 子查詢中不可有 ORDER BY（除非搭配 TOP / OFFSET），計數時也不需要排序
+        order_by = find_top_level_keyword(sql, "ORDER")
+        if order_by > 0 and find_top_level_keyword(sql, "TOP") < 0 and find_top_level_keyword(sql, "OFFSET") < 0:
+            sql = sql[:order_by]
+
+        try:
+            # 計數仍需掃描整個結果，與一般查詢相同先檢查估計成本（超過時 guard_query 拋出 QueryCostError）
+            count_sql = self.guard_query(f"SELECT COUNT_BIG(*) FROM (\n{sql}\n) AS _count_source")
+            _, rows = self.execute_query(count_sql)
+            return int(rows[0][0])
+        except Exception:
+            return None
 
     def test_connection(self) -> tuple[bool, str]:
         """
@@ -76,5 +1618,10 @@ class DatabaseConnector:
             return False, f"連線失敗：{str(e)}"
 
 
-# 預設連線器實例
-db_connector = DatabaseConnector()
+# 預設連線器實例（db_connector）在第一次存取時才建立
+def __getattr__(name: str):
+    """延後建立模組層級的預設實例"""
+    if name == "db_connector":
+        globals()[name] = DatabaseConnector()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,350 @@
+"""
+範例問答庫模組
+
+記錄執行成功的問題與 SQL，新問題進來時以詞彙索引（BM25，CJK 單字與二元字元 n-gram）
+找出最相似的幾筆，放入提示詞作為 few-shot 範例，讓 Agent 沿用已驗證過的資料表、欄位與寫法，
+不必每次從頭嘗試、再依錯誤訊息修正。
+
+範例依資料庫（連線字串的雜湊值）與 Schema 版本分開索引，只取用同一資料庫目前版本的範例；
+每個資料庫各自保留最近使用的幾個 Schema 版本（最久未使用的版本整批淘汰），
+總筆數超過上限時淘汰最久未使用的範例（不分資料庫）。
+"""
+
+import hashlib
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from config import few_shot_max_entries, few_shot_max_versions, few_shot_path, sql_server_config
+from schema_extractor import tokenize
+
+# 範例數達到此值後，才把超過一半範例都出現的詞彙視為停用詞
+_MIN_STOP_TERM_EXAMPLES = 20
+
+
+@dataclass
+class Example:
+    """一筆執行成功的問題與 SQL"""
+    question: str
+    sql: str
+    schema_version: str
+    created_at: float
+    database: str = ""
+
+
+def database_key(connection_string: Optional[str] = None) -> str:
+    """
+    範例庫的資料庫識別碼
+
+    Args:
+        connection_string: 連線字串，若未提供則使用環境變數設定
+
+    Returns:
+        str: 連線字串的雜湊值（磁碟上不保存連線字串中的帳號密碼）
+    """
+    connection_string = connection_string or sql_server_config.connection_string
+    return hashlib.sha1(connection_string.encode("utf-8")).hexdigest()[:16]
+
+
+def _question_key(terms: list[str]) -> str:
+    """重複判定用的 key：詞彙相同（只差大小寫、標點與空白）的問題視為同一筆"""
+    return " ".join(terms)
+
+
+class _VersionIndex:
+    """單一 Schema 版本的範例與 BM25 倒排索引（可逐筆新增與刪除）"""
+
+    def __init__(self):
+        self.examples: "OrderedDict[str, Example]" = OrderedDict()
+        self.term_freqs: dict[str, Counter] = {}
+        self.lengths: dict[str, int] = {}
+        self.postings: dict[str, set[str]] = {}
+        self.total_length = 0
+
+    def add(self, key: str, example: Example, terms: list[str]):
+        self.remove(key)
+        freqs = Counter(terms)
+        self.examples[key] = example
+        self.term_freqs[key] = freqs
+        self.lengths[key] = len(terms)
+        self.total_length += len(terms)
+        for term in freqs:
+            self.postings.setdefault(term, set()).add(key)
+
+    def remove(self, key: str):
+        if self.examples.pop(key, None) is None:
+            return
+        freqs = self.term_freqs.pop(key)
+        self.total_length -= self.lengths.pop(key)
+        for term in freqs:
+            keys = self.postings[term]
+            keys.discard(key)
+            if not keys:
+                del self.postings[term]
+
+    def search(self, terms: list[str], top_k: int, min_similarity: float, k1: float = 1.2, b: float = 0.75):
+        """
+        依 BM25 分數排序，並只保留涵蓋足夠查詢詞彙的範例
+
+        涵蓋率以 IDF 加權：範例命中的查詢詞彙 IDF 總和 / 所有查詢詞彙 IDF 總和，
+        只命中常見詞彙的範例不會被選入。
+
+        Returns:
+            list: (key, 分數) 列表，依分數由高至低排序
+        """
+        n = len(self.examples)
+        if not n:
+            return []
+        avg_length = self.total_length / n
+        scores: dict[str, float] = {}
+        covered: dict[str, float] = {}
+        total_idf = 0.0
+        for term in set(terms):
+            postings = self.postings.get(term, ())
+            if n >= _MIN_STOP_TERM_EXAMPLES and len(postings) * 2 > n:
+                # 超過一半範例都有的詞彙（「員工」、「列出」）幾乎不影響排序，略過以免逐一計分
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            total_idf += idf
+            for key in postings:
+                tf = self.term_freqs[key][term]
+                norm = k1 * (1 - b + b * self.lengths[key] / avg_length)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+                covered[key] = covered.get(key, 0.0) + idf
+
+        ranked = [
+            (key, score) for key, score in scores.items()
+            if total_idf and covered[key] / total_idf >= min_similarity
+        ]
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
+
+
+class ExampleStore:
+    """
+    執行成功的問題 → SQL 範例庫
+
+    以（資料庫, Schema 版本, 正規化問題）為 key，同一問題再次成功時以新的 SQL 取代。
+    每個資料庫各自保留最近使用的 max_versions 個 Schema 版本，所有資料庫合計最多 max_entries 筆範例：
+    使用第二個資料庫或另一個資料庫的 Schema 變更，不會淘汰其他資料庫的範例。
+    提供 SQLite 路徑時同時寫入磁碟，重新啟動後依寫入順序重建索引。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 500,
+        max_versions: int = 2,
+        min_similarity: float = 0.3,
+        path: str = ""
+    ):
+        """
+        初始化範例庫
+
+        Args:
+            max_entries: 所有資料庫與 Schema 版本合計最多保留的範例數
+            max_versions: 每個資料庫最多保留的 Schema 版本數（Schema 變更後舊版本的範例不再取用）
+            min_similarity: 範例涵蓋查詢詞彙的最低比例（IDF 加權，0 ~ 1）
+            path: SQLite 檔案路徑，空字串表示只存於記憶體
+        """
+        self.max_entries = max_entries
+        self.max_versions = max_versions
+        self.min_similarity = min_similarity
+        # (資料庫, Schema 版本) → 索引，依最近使用排序
+        self._indexes: "OrderedDict[tuple[str, str], _VersionIndex]" = OrderedDict()
+        # 所有資料庫與版本的範例依最近使用排序，用於依筆數淘汰
+        self._order: "OrderedDict[tuple[str, str, str], None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(few_shot_examples)")]
+            if columns and "database_key" not in columns:
+                # 舊格式沒有資料庫識別碼，無法判斷範例屬於哪個資料庫
+                self._db.execute("DROP TABLE few_shot_examples")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS few_shot_examples ("
+                "database_key TEXT NOT NULL, schema_version TEXT NOT NULL, question_key TEXT NOT NULL, "
+                "question TEXT NOT NULL, sql TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (database_key, schema_version, question_key))"
+            )
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT question, sql, schema_version, created_at, database_key "
+                "FROM few_shot_examples ORDER BY created_at"
+            ).fetchall()
+            with self._lock:
+                for row in rows:
+                    self._add_locked(Example(*row))
+
+    def add(self, question: str, sql: str, schema_version: str, database: str = ""):
+        """
+        記錄執行成功的問題與 SQL（只應在 SQL 執行成功後呼叫）
+
+        Args:
+            question: 使用者的自然語言問題
+            sql: 執行成功的 SQL
+            schema_version: 產生此 SQL 時的 Schema 版本
+            database: 資料庫識別碼（database_key()），Schema 版本的淘汰依資料庫分開計算
+        """
+        if not question.strip() or not sql.strip():
+            return
+        example = Example(question.strip(), sql.strip(), schema_version, time.time(), database)
+        with self._lock:
+            index = self._indexes.get((database, schema_version))
+            key = _question_key(tokenize(example.question))
+            current = index.examples.get(key) if index is not None else None
+            if current is not None and current.sql == example.sql:
+                self._touch_locked(database, schema_version, key)
+                return
+            self._add_locked(example)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO few_shot_examples VALUES (?, ?, ?, ?, ?, ?)",
+                    (database, schema_version, key, example.question, example.sql, example.created_at)
+                )
+                self._db.commit()
+
+    def search(self, question: str, schema_version: str, top_k: int = 3, database: str = "") -> list[Example]:
+        """
+        找出與問題最相似的範例
+
+        Args:
+            question: 使用者的自然語言問題
+            schema_version: 目前的 Schema 版本（只取用此版本的範例）
+            top_k: 回傳的範例數量上限
+            database: 資料庫識別碼（database_key()），只取用此資料庫的範例
+
+        Returns:
+            list: Example 列表，依相似度由高至低排序；沒有夠相似的範例時為空列表
+        """
+        terms = tokenize(question)
+        with self._lock:
+            index = self._indexes.get((database, schema_version))
+            ranked = index.search(terms, top_k, self.min_similarity) if index is not None and terms else []
+            if not ranked:
+                self._stats["misses"] += 1
+                return []
+            self._stats["hits"] += 1
+            for key, _ in ranked:
+                self._touch_locked(database, schema_version, key)
+            return [index.examples[key] for key, _ in ranked]
+
+    def evict_version(self, schema_version: str, database: str = ""):
+        """移除指定資料庫與 Schema 版本的所有範例（包含磁碟）"""
+        with self._lock:
+            self._evict_version_locked(database, schema_version)
+
+    def clear(self):
+        """清除所有範例（包含磁碟）"""
+        with self._lock:
+            self._indexes.clear()
+            self._order.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM few_shot_examples")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """取得範例數與搜尋命中統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._order)
+            stats["versions"] = len(self._indexes)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    def _add_locked(self, example: Example):
+        """寫入記憶體索引，並依版本數（同一資料庫內）與筆數淘汰（呼叫端需持有鎖）"""
+        terms = tokenize(example.question)
+        key = _question_key(terms)
+        database, version = example.database, example.schema_version
+        index = self._indexes.get((database, version))
+        if index is None:
+            index = self._indexes[(database, version)] = _VersionIndex()
+        index.add(key, example, terms)
+        self._touch_locked(database, version, key)
+
+        # _indexes 依最近使用排序，同一資料庫最前面的版本即最久未使用
+        versions = [index_key for index_key in self._indexes if index_key[0] == database]
+        for index_key in versions[:max(len(versions) - self.max_versions, 0)]:
+            self._evict_version_locked(*index_key)
+        while len(self._order) > self.max_entries:
+            (oldest_database, oldest_version, oldest), _ = self._order.popitem(last=False)
+            self._remove_locked(oldest_database, oldest_version, oldest)
+
+    def _touch_locked(self, database: str, schema_version: str, key: str):
+        """標記為最近使用（呼叫端需持有鎖）"""
+        self._indexes.move_to_end((database, schema_version))
+        self._order[(database, schema_version, key)] = None
+        self._order.move_to_end((database, schema_version, key))
+
+    def _remove_locked(self, database: str, schema_version: str, key: str):
+        """移除單一範例（呼叫端需持有鎖，且已自 _order 移除）"""
+        index = self._indexes[(database, schema_version)]
+        index.remove(key)
+        if not index.examples:
+            del self._indexes[(database, schema_version)]
+        self._stats["evictions"] += 1
+        if self._db is not None:
+            self._db.execute(
+                "DELETE FROM few_shot_examples WHERE database_key = ? AND schema_version = ? AND question_key = ?",
+                (database, schema_version, key)
+            )
+            self._db.commit()
+
+    def _evict_version_locked(self, database: str, schema_version: str):
+        """移除某個資料庫的整個 Schema 版本（呼叫端需持有鎖）"""
+        index = self._indexes.pop((database, schema_version), None)
+        if index is None:
+            return
+        for key in index.examples:
+            self._order.pop((database, schema_version, key), None)
+        self._stats["evictions"] += len(index.examples)
+        if self._db is not None:
+            self._db.execute(
+                "DELETE FROM few_shot_examples WHERE database_key = ? AND schema_version = ?", (database, schema_version)
+            )
+            self._db.commit()
+
+
+def format_examples(examples: list[Example]) -> str:
+    """
+    把範例整理成放入提示詞的文字
+
+    Args:
+        examples: search() 回傳的範例
+
+    Returns:
+        str: 每筆範例的問題與 SQL 程式碼區塊
+    """
+    blocks = [f"問題：{example.question}\n```sql\n{example.sql}\n```" for example in examples]
+    return "\n\n".join(blocks)
+
+
+# 全域共用的範例庫（第一次使用時才開啟 SQLite 檔案）
+_example_store: Optional[ExampleStore] = None
+_example_store_lock = threading.Lock()
+
+
+def get_example_store() -> ExampleStore:
+    """
+    取得全域共用的範例庫
+
+    Returns:
+        ExampleStore: 依 FEW_SHOT_* 設定建立的共用實例
+    """
+    global _example_store
+    with _example_store_lock:
+        if _example_store is None:
+            _example_store = ExampleStore(
+                max_entries=few_shot_max_entries,
+                max_versions=few_shot_max_versions,
+                path=few_shot_path
+            )
+        return _example_store
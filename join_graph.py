@@ -0,0 +1,274 @@
+"""
+資料表關聯（JOIN 路徑）模組
+
+以 Schema 快取中的主鍵 / 外鍵建立記憶體中的關聯圖，找出兩張資料表之間經由外鍵的最短 JOIN 路徑，
+讓 Agent 撰寫多表查詢前就知道要用哪些欄位 JOIN、需要經過哪些中介資料表，不必先猜測再依錯誤訊息修正。
+
+路徑以廣度優先搜尋（BFS）即時計算：第一次從某張資料表出發時搜尋一次，
+結果（到 JOIN_PATH_MAX_HOPS 層以內所有資料表的路徑）保留在 LRU 快取中，
+之後從同一張資料表出發的查詢直接取用。數千張資料表時不預先計算所有資料表兩兩之間的路徑。
+"""
+
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Optional
+
+from config import join_hint_tokens, join_path_cache_size, join_path_max_hops
+from schema_extractor import estimate_tokens, schema_cache
+
+# 資料表 key：(schema, 名稱)
+TableKey = tuple[str, str]
+
+
+def _quote(name: str) -> str:
+    """以方括號包裹識別字"""
+    return "[" + name.replace("]", "]]") + "]"
+
+
+def _label(key: TableKey) -> str:
+    return f"{_quote(key[0])}.{_quote(key[1])}"
+
+
+@dataclass(frozen=True)
+class JoinEdge:
+    """一個外鍵：table.columns 參照 ref_table.ref_columns（複合外鍵有多個欄位）"""
+    name: str
+    table: TableKey
+    columns: tuple[str, ...]
+    ref_table: TableKey
+    ref_columns: tuple[str, ...]
+
+    def condition(self) -> str:
+        """JOIN 條件，例如 [dbo].[Orders].[CustomerID] = [dbo].[Customers].[CustomerID]"""
+        return " AND ".join(
+            f"{_label(self.table)}.{_quote(column)} = {_label(self.ref_table)}.{_quote(ref_column)}"
+            for column, ref_column in zip(self.columns, self.ref_columns)
+        )
+
+
+@dataclass(frozen=True)
+class JoinStep:
+    """路徑中的一步：從 source 經由外鍵 JOIN 到 target（兩者之間有多個外鍵時 edges 依序列出）"""
+    source: TableKey
+    target: TableKey
+    edges: tuple[JoinEdge, ...]
+
+
+def format_path(steps: list[JoinStep]) -> str:
+    """
+    把路徑格式化為 FROM ... JOIN ... ON ... 片段（每一步使用第一個外鍵）
+
+    Args:
+        steps: find_path() 回傳的路徑
+
+    Returns:
+        str: 一行 JOIN 片段；路徑為空時回傳空字串
+    """
+    if not steps:
+        return ""
+    parts = [f"FROM {_label(steps[0].source)}"]
+    for step in steps:
+        parts.append(f"JOIN {_label(step.target)} ON {step.edges[0].condition()}")
+    return " ".join(parts)
+
+
+class JoinGraph:
+    """
+    外鍵關聯圖
+
+    資料表為節點、外鍵為邊（不分方向，JOIN 兩個方向都可以）。
+    自我參照的外鍵（例如 ManagerID → EmployeeID）不列入路徑搜尋。
+    """
+
+    def __init__(self, tables: list[dict], max_hops: int = 4, cache_size: int = 256):
+        """
+        建立關聯圖
+
+        Args:
+            tables: get_schema_metadata() 回傳的資料表資訊
+            max_hops: 路徑最多經過的外鍵數
+            cache_size: 保留 BFS 結果的出發資料表數量
+        """
+        self.max_hops = max_hops
+        self.cache_size = cache_size
+        self._tables: dict[TableKey, dict] = {(table["schema"], table["name"]): table for table in tables}
+        # 資料表 → 相鄰資料表 → 兩者之間的外鍵（依資料表與外鍵順序，BFS 結果固定）
+        self._adjacency: dict[TableKey, "OrderedDict[TableKey, list[JoinEdge]]"] = {
+            key: OrderedDict() for key in self._tables
+        }
+        self.edge_count = 0
+        for key, table in self._tables.items():
+            for fk in table.get("foreign_keys", []):
+                ref_key = (fk["ref_schema"], fk["ref_table"])
+                if ref_key not in self._tables or ref_key == key:
+                    continue
+                edge = JoinEdge(fk["name"], key, tuple(fk["columns"]), ref_key, tuple(fk["ref_columns"]))
+                self._adjacency[key].setdefault(ref_key, []).append(edge)
+                self._adjacency[ref_key].setdefault(key, []).append(edge)
+                self.edge_count += 1
+
+        # 出發資料表 → {可到達的資料表: (前一張資料表, 距離)}
+        self._searches: "OrderedDict[TableKey, dict[TableKey, tuple[Optional[TableKey], int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def find_path(self, source: TableKey, target: TableKey) -> Optional[list[JoinStep]]:
+        """
+        找出兩張資料表之間的最短 JOIN 路徑
+
+        Args:
+            source: 出發的資料表 (schema, 名稱)
+            target: 目的資料表 (schema, 名稱)
+
+        Returns:
+            list: JoinStep 列表（同一張資料表時為空列表）；max_hops 內無法到達或資料表不存在時回傳 None
+        """
+        if source not in self._tables or target not in self._tables:
+            return None
+        return self._build_path(self._search(source), target)
+
+    def connect(self, keys: list[TableKey]) -> list[list[JoinStep]]:
+        """
+        以最少的 JOIN 串起多張資料表
+
+        依序把每張資料表以最短路徑接到已串起的資料表（包含路徑上的中介資料表），
+        回傳每次加入的路徑；無法到達的資料表略過。
+
+        Args:
+            keys: 資料表 (schema, 名稱) 列表，依重要性排序
+
+        Returns:
+            list: 路徑列表，每條路徑從新加入的資料表出發
+        """
+        keys = [key for key in dict.fromkeys(keys) if key in self._tables]
+        if not keys:
+            return []
+        connected = {keys[0]}
+        paths = []
+        for key in keys[1:]:
+            if key in connected:
+                continue
+            reached = self._search(key)
+            nearest = min(
+                (node for node in connected if node in reached),
+                key=lambda node: reached[node][1],
+                default=None,
+            )
+            if nearest is None:
+                connected.add(key)
+                continue
+            path = self._build_path(reached, nearest)
+            connected.update(step.source for step in path)
+            paths.append(path)
+        return paths
+
+    def hints(self, tables: list[dict], token_budget: Optional[int] = None) -> str:
+        """
+        串起相關資料表的 JOIN 提示文字
+
+        Args:
+            tables: 資料表資訊列表（依重要性排序）
+            token_budget: 文字的 token 上限，若未提供則使用 JOIN_HINT_TOKENS
+
+        Returns:
+            str: 每條路徑一行；沒有任何路徑時回傳空字串
+        """
+        token_budget = join_hint_tokens if token_budget is None else token_budget
+        lines, used = [], 0
+        for path in self.connect([(table["schema"], table["name"]) for table in tables]):
+            line = f"- {path[0].source[1]} → {path[-1].target[1]}：{format_path(path)}"
+            if any(len(step.edges) > 1 for step in path):
+                line += "（部分資料表之間有多個外鍵，可呼叫 get_join_path 查看全部）"
+            cost = estimate_tokens(line)
+            if used + cost > token_budget:
+                break
+            lines.append(line)
+            used += cost
+        return "\n".join(lines)
+
+    def stats(self) -> dict:
+        """取得 BFS 快取命中統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_sources"] = len(self._searches)
+        stats["tables"] = len(self._tables)
+        stats["edges"] = self.edge_count
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    def _search(self, source: TableKey) -> dict[TableKey, tuple[Optional[TableKey], int]]:
+        """從 source 出發的 BFS 結果（max_hops 層以內），有快取時直接取用"""
+        with self._lock:
+            reached = self._searches.get(source)
+            if reached is not None:
+                self._searches.move_to_end(source)
+                self._stats["hits"] += 1
+                return reached
+            self._stats["misses"] += 1
+
+        reached = {source: (None, 0)}
+        queue = deque([source])
+        while queue:
+            node = queue.popleft()
+            distance = reached[node][1]
+            if distance >= self.max_hops:
+                continue
+            for neighbor in self._adjacency[node]:
+                if neighbor not in reached:
+                    reached[neighbor] = (node, distance + 1)
+                    queue.append(neighbor)
+
+        with self._lock:
+            self._searches[source] = reached
+            while len(self._searches) > self.cache_size:
+                self._searches.popitem(last=False)
+        return reached
+
+    def _build_path(self, reached: dict, target: TableKey) -> Optional[list[JoinStep]]:
+        """由 BFS 結果還原到 target 的路徑（從出發資料表依序排列）"""
+        if target not in reached:
+            return None
+        steps = []
+        node = target
+        while reached[node][0] is not None:
+            previous = reached[node][0]
+            steps.append(JoinStep(previous, node, tuple(self._adjacency[previous][node])))
+            node = previous
+        steps.reverse()
+        return steps
+
+
+# 每個連線字串目前 Schema 版本的關聯圖
+_graphs: dict[str, tuple[str, JoinGraph]] = {}
+_graphs_lock = threading.Lock()
+
+
+def get_join_graph(connection_string: Optional[str] = None) -> JoinGraph:
+    """
+    取得目前 Schema 版本的關聯圖（Schema 變更後第一次使用時重新建立）
+
+    Args:
+        connection_string: 連線字串，若未提供則使用環境變數設定
+
+    Returns:
+        JoinGraph: 依 JOIN_PATH_* 設定建立的關聯圖
+    """
+    key = connection_string or ""
+    version = schema_cache.get_version(connection_string)
+    with _graphs_lock:
+        cached = _graphs.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    graph = JoinGraph(
+        schema_cache.get_tables(connection_string),
+        max_hops=join_path_max_hops,
+        cache_size=join_path_cache_size,
+    )
+    with _graphs_lock:
+        _graphs[key] = (version, graph)
+    return graph
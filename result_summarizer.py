@@ -0,0 +1,217 @@
+"""
+查詢結果摘要模組
+
+把 execute_sql 的結果整理成精簡的文字再交給 LLM：
+長欄位值截斷、依容量預算決定樣本列數，並附上每個欄位的型別、空值數與最小 / 最大值。
+只需確認查詢可執行時可只回傳結果的形狀（欄位與筆數），不含任何資料。
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Optional
+
+from config import tool_result_max_bytes, tool_result_max_cell_chars
+
+# 摘要中最小 / 最大值的最大字元數
+_SUMMARY_VALUE_CHARS = 24
+
+# 標題列與第一列放不下時，欄位名稱與欄位值最短縮到的字元數
+_MIN_CELL_CHARS = 4
+
+# Python 型別 → 顯示的型別名稱（依序比對，bool 必須在 int 之前）
+_TYPE_NAMES = [
+    (bool, "bit"),
+    (int, "int"),
+    (float, "float"),
+    (Decimal, "decimal"),
+    (str, "str"),
+    (datetime, "datetime"),
+    (date, "date"),
+    (time, "time"),
+    ((bytes, bytearray), "binary"),
+]
+
+
+@dataclass
+class ColumnSummary:
+    """單一欄位在樣本中的統計"""
+    name: str
+    type: str
+    nulls: int = 0
+    empty: int = 0
+    minimum: object = None
+    maximum: object = None
+
+    def format(self, row_count: int) -> str:
+        """格式化為一行摘要"""
+        parts = [f"{self.name} ({self.type})"]
+        if self.nulls == row_count:
+            parts.append("全部 NULL")
+        else:
+            if self.nulls:
+                parts.append(f"NULL {self.nulls}")
+            if self.empty:
+                parts.append(f"空字串 {self.empty}")
+            if self.minimum is not None:
+                low = _truncate(_format_value(self.minimum), _SUMMARY_VALUE_CHARS)
+                high = _truncate(_format_value(self.maximum), _SUMMARY_VALUE_CHARS)
+                parts.append(f"範圍 {low} ~ {high}" if low != high else f"值皆為 {low}")
+        return "- " + "，".join(parts)
+
+
+def _type_name(value) -> str:
+    for python_type, name in _TYPE_NAMES:
+        if isinstance(value, python_type):
+            return name
+    return type(value).__name__
+
+
+def _format_value(value) -> str:
+    """把單一值轉為一行文字（NULL、二進位與日期時間使用精簡表示）"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, (bytes, bytearray)):
+        return f"<binary {len(value)} bytes>"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    text = str(value)
+    if "\n" in text or "\r" in text or "\t" in text:
+        text = " ".join(text.split())
+    return text
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max(max_chars - 1, 1)] + "…"
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def _fit(text: str, max_bytes: int) -> str:
+    """把文字截斷到 max_bytes 個 UTF-8 位元組以內（不切斷多位元組字元）"""
+    if _size(text) <= max_bytes:
+        return text
+    return text.encode("utf-8")[:max(max_bytes - 3, 0)].decode("utf-8", errors="ignore") + "…"
+
+
+def _join_row(values: list[str], max_chars: int) -> str:
+    return " | ".join(_truncate(value, max_chars) for value in values)
+
+
+def summarize_columns(columns: list[str], rows: list[tuple]) -> list[ColumnSummary]:
+    """
+    計算每個欄位的型別、空值數、空字串數與最小 / 最大值
+
+    Args:
+        columns: 欄位名稱
+        rows: 資料列
+
+    Returns:
+        list: 依欄位順序的 ColumnSummary；型別取自第一個非 NULL 值
+    """
+    summaries = []
+    for i, name in enumerate(columns):
+        values = [row[i] for row in rows]
+        present = [value for value in values if value is not None]
+        summary = ColumnSummary(name, _type_name(present[0]) if present else "?", nulls=len(values) - len(present))
+        if summary.type == "str":
+            summary.empty = sum(1 for value in present if isinstance(value, str) and not value.strip())
+            present = [value for value in present if not isinstance(value, str) or value.strip()]
+        if present and summary.type != "binary":
+            try:
+                summary.minimum, summary.maximum = min(present), max(present)
+            except TypeError:
+                # 同一欄位混合不可比較的型別（例如 sql_variant）
+                pass
+        summaries.append(summary)
+    return summaries
+
+
+def summarize_result(
+    columns: list[str],
+    rows: list[tuple],
+    has_more: bool = False,
+    shape_only: bool = False,
+    max_bytes: Optional[int] = None,
+    max_cell_chars: Optional[int] = None
+) -> str:
+    """
+    把查詢結果整理成不超過容量預算的文字
+
+    內容依序為結果形狀、樣本列（長欄位值截斷，列數依剩餘預算決定，至少一列）與欄位摘要。
+    欄位摘要超過預算一半時只列出欄位名稱與型別（仍超過則省略）；
+    讀取的資料列全部完整顯示（沒有省略列或截斷值）時不附摘要。
+    標題列與第一列放不下時依序省略欄位摘要、縮短欄位名稱與欄位值，
+    仍放不下（欄位非常多）時不顯示樣本列，只列出欄位；整段文字不會超過 max_bytes。
+
+    Args:
+        columns: 欄位名稱
+        rows: 讀取到的資料列（摘要只根據這些列）
+        has_more: 是否還有未讀取的資料列
+        shape_only: 只回傳欄位與筆數，不含任何資料值
+        max_bytes: 文字的 UTF-8 位元組上限，若未提供則使用 TOOL_RESULT_MAX_BYTES
+        max_cell_chars: 單一欄位值的最大字元數，若未提供則使用 TOOL_RESULT_MAX_CELL_CHARS
+
+    Returns:
+        str: 摘要文字；沒有資料列時只有形狀
+    """
+    max_bytes = tool_result_max_bytes if max_bytes is None else max_bytes
+    max_cell_chars = tool_result_max_cell_chars if max_cell_chars is None else max_cell_chars
+    count = f"{len(rows)}{'+' if has_more else ''}"
+    summaries = summarize_columns(columns, rows)
+    column_list = "欄位：" + ", ".join(f"{summary.name} ({summary.type})" for summary in summaries)
+    lines = [f"結果：{len(columns)} 欄 × {count} 筆"]
+    if shape_only or not rows:
+        lines.append(column_list)
+        return _fit("\n".join(lines), max_bytes)
+
+    summary_lines = []
+    if len(rows) > 1:
+        summary_lines = [f"欄位摘要（依讀取的 {len(rows)} 筆）："]
+        summary_lines += [summary.format(len(rows)) for summary in summaries]
+        if _size("\n".join(summary_lines)) > max_bytes // 2:
+            summary_lines = [column_list] if _size(column_list) <= max_bytes // 2 else []
+    budget = max_bytes - _size("\n".join(lines + summary_lines)) - 64
+
+    # 標題列與第一列一定要顯示：放不下時先省略欄位摘要，再把欄位名稱與欄位值逐步減半
+    first = [_format_value(value) for value in rows[0]]
+    name_chars = max((len(name) for name in columns), default=0)
+    cell_chars = max_cell_chars
+    while True:
+        header = _join_row(columns, name_chars)
+        table = [header, "-" * min(len(header), 80)]
+        if _size("\n".join(table + [_join_row(first, cell_chars)])) + 1 <= budget:
+            break
+        if summary_lines:
+            summary_lines = []
+            budget = max_bytes - _size("\n".join(lines)) - 64
+        elif max(name_chars, cell_chars) > _MIN_CELL_CHARS:
+            name_chars = max(name_chars // 2, _MIN_CELL_CHARS)
+            cell_chars = max(cell_chars // 2, _MIN_CELL_CHARS)
+        else:
+            lines[0] += "，欄位過多，不顯示樣本列"
+            return _fit("\n".join(lines + [column_list]), max_bytes)
+
+    budget -= _size("\n".join(table))
+    truncated = False
+    for row in rows:
+        values = [_format_value(value) for value in row]
+        truncated = truncated or any(len(value) > cell_chars for value in values)
+        line = _join_row(values, cell_chars)
+        cost = _size(line) + 1
+        if len(table) > 2 and cost > budget:
+            break
+        table.append(line)
+        budget -= cost
+
+    sample = len(table) - 2
+    if sample < len(rows):
+        lines[0] += f"，以下顯示前 {sample} 筆"
+    elif not truncated:
+        # 讀取的資料列已完整顯示，摘要沒有額外資訊
+        summary_lines = []
+    return "\n".join(lines + table + summary_lines)
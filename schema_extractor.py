@@ -4,8 +4,102 @@
 從 SQL Server 提取資料表結構資訊，格式化為 Agent 可用的上下文。
 """
 
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+
 from db_connector import DatabaseConnector
 from typing import Optional
+from config import (
+    schema_cache_revalidate_interval,
+    schema_snapshot_dir,
+    schema_format,
+    schema_prune_token_budget,
+    schema_prune_top_k,
+    sql_server_config,
+)
+
+
+# 一次取回所有資料表的欄位與主鍵資訊（依資料表、欄位順序排列）
+# {table_filter} 用於增量更新時只取回指定 object_id 的資料表
+BULK_COLUMNS_SQL = """
+SELECT 
+    c.TABLE_SCHEMA,
+    c.TABLE_NAME,
+    c.COLUMN_NAME,
+    c.DATA_TYPE,
+    c.CHARACTER_MAXIMUM_LENGTH,
+    c.IS_NULLABLE,
+    c.COLUMN_DEFAULT,
+    CASE WHEN pk.COLUMN_NAME IS NULL THEN 0 ELSE 1 END AS IS_PRIMARY_KEY,
+    OBJECT_ID(QUOTENAME(c.TABLE_SCHEMA) + '.' + QUOTENAME(c.TABLE_NAME)) AS OBJECT_ID
+FROM INFORMATION_SCHEMA.COLUMNS c
+JOIN INFORMATION_SCHEMA.TABLES t
+    ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+LEFT JOIN (
+    SELECT ku.TABLE_SCHEMA, ku.TABLE_NAME, ku.COLUMN_NAME
+    FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc
+    JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE ku
+        ON ku.CONSTRAINT_SCHEMA = tc.CONSTRAINT_SCHEMA
+        AND ku.CONSTRAINT_NAME = tc.CONSTRAINT_NAME
+    WHERE tc.CONSTRAINT_TYPE = 'PRIMARY KEY'
+) pk
+    ON pk.TABLE_SCHEMA = c.TABLE_SCHEMA
+    AND pk.TABLE_NAME = c.TABLE_NAME
+    AND pk.COLUMN_NAME = c.COLUMN_NAME
+WHERE t.TABLE_TYPE = 'BASE TABLE'{table_filter}
+ORDER BY c.TABLE_SCHEMA, c.TABLE_NAME, c.ORDINAL_POSITION
+"""
+
+# 一次取回所有外鍵（複合外鍵依欄位順序排列）
+BULK_FOREIGN_KEYS_SQL = """
+SELECT 
+    fk.name,
+    SCHEMA_NAME(pt.schema_id),
+    pt.name,
+    pc.name,
+    SCHEMA_NAME(rt.schema_id),
+    rt.name,
+    rc.name
+FROM sys.foreign_key_columns fkc
+JOIN sys.foreign_keys fk ON fk.object_id = fkc.constraint_object_id
+JOIN sys.tables pt ON pt.object_id = fkc.parent_object_id
+JOIN sys.columns pc
+    ON pc.object_id = fkc.parent_object_id AND pc.column_id = fkc.parent_column_id
+JOIN sys.tables rt ON rt.object_id = fkc.referenced_object_id
+JOIN sys.columns rc
+    ON rc.object_id = fkc.referenced_object_id AND rc.column_id = fkc.referenced_column_id{table_filter}
+ORDER BY SCHEMA_NAME(pt.schema_id), pt.name, fk.name, fkc.constraint_column_id
+"""
+
+# 資料表與欄位的說明（MS_Description 擴充屬性），minor_id = 0 為資料表本身
+DESCRIPTIONS_SQL = """
+SELECT 
+    ep.major_id,
+    COL_NAME(ep.major_id, ep.minor_id),
+    CAST(ep.value AS NVARCHAR(4000))
+FROM sys.extended_properties ep
+WHERE ep.class = 1 AND ep.name = 'MS_Description'{table_filter}
+"""
+
+# 資料表的修改時間（DDL 變更會更新 modify_date），用於判斷 Schema 是否需要重新提取
+TABLE_MARKERS_SQL = """
+SELECT 
+    o.object_id,
+    SCHEMA_NAME(o.schema_id),
+    o.name,
+    o.modify_date
+FROM sys.objects o
+WHERE o.type = 'U' AND o.is_ms_shipped = 0
+ORDER BY SCHEMA_NAME(o.schema_id), o.name
+"""
 
 
 class SchemaExtractor:
@@ -80,45 +174,155 @@ class SchemaExtractor:
             for row in rows
         ]
 
-    def get_full_schema(self) -> str:
+    def get_table_markers(self) -> list[tuple]:
         """
-        取得完整的資料庫 Schema 文字描述
+        取得所有使用者資料表的修改時間標記
         
         Returns:
-            str: 格式化的 Schema 文字
+            list: (object_id, schema, 資料表名稱, modify_date) 列表，依 schema、名稱排序
         """
-        tables = self.get_tables()
-        schema_text = []
+        columns, rows = self.db.execute_query(TABLE_MARKERS_SQL)
+        return [tuple(row) for row in rows]
+
+    def get_schema_metadata(
+        self,
+        object_ids: Optional[list[int]] = None,
+        include_descriptions: bool = False
+    ) -> list[dict]:
+        """
+        以集合式查詢一次取得所有資料表、欄位、主鍵與外鍵
+
+        只需兩次目錄查詢（欄位 + 外鍵），再於記憶體中依資料表分組，
+        避免 get_tables() + 每表一次 get_columns() 的 N+1 查詢。
+        
+        Args:
+            object_ids: 只提取指定 object_id 的資料表，若未提供則提取全部
+            include_descriptions: 是否額外查詢 MS_Description 說明（多一次查詢）
+            
+        Returns:
+            list: 資料表資訊列表，每個資料表包含 columns、primary_key、foreign_keys
+        """
+        column_filter = fk_filter = description_filter = ""
+        if object_ids is not None:
+            id_list = ", ".join(str(int(object_id)) for object_id in object_ids) or "NULL"
+            column_filter = (
+                "\n    AND OBJECT_ID(QUOTENAME(c.TABLE_SCHEMA) + '.' + QUOTENAME(c.TABLE_NAME))"
+                f" IN ({id_list})"
+            )
+            fk_filter = f"\nWHERE fkc.parent_object_id IN ({id_list})"
+            description_filter = f" AND ep.major_id IN ({id_list})"
+
+        _, column_rows = self.db.execute_query(BULK_COLUMNS_SQL.format(table_filter=column_filter))
+        _, fk_rows = self.db.execute_query(BULK_FOREIGN_KEYS_SQL.format(table_filter=fk_filter))
+
+        tables: dict[tuple[str, str], dict] = {}
+        for row in column_rows:
+            key = (row[0], row[1])
+            table = tables.get(key)
+            if table is None:
+                table = tables[key] = {
+                    "schema": row[0],
+                    "name": row[1],
+                    "type": "BASE TABLE",
+                    "object_id": row[8],
+                    "columns": [],
+                    "primary_key": [],
+                    "foreign_keys": [],
+                }
+            is_primary_key = bool(row[7])
+            table["columns"].append({
+                "name": row[2],
+                "data_type": row[3],
+                "max_length": row[4],
+                "nullable": row[5],
+                "default": row[6],
+                "primary_key": is_primary_key
+            })
+            if is_primary_key:
+                table["primary_key"].append(row[2])
+
+        for row in fk_rows:
+            table = tables.get((row[1], row[2]))
+            if table is None:
+                continue
+            fks = table["foreign_keys"]
+            if not fks or fks[-1]["name"] != row[0]:
+                fks.append({
+                    "name": row[0],
+                    "columns": [],
+                    "ref_schema": row[4],
+                    "ref_table": row[5],
+                    "ref_columns": []
+                })
+            fks[-1]["columns"].append(row[3])
+            fks[-1]["ref_columns"].append(row[6])
+
+        if include_descriptions:
+            by_id = {table["object_id"]: table for table in tables.values()}
+            _, description_rows = self.db.execute_query(
+                DESCRIPTIONS_SQL.format(table_filter=description_filter)
+            )
+            for object_id, column_name, description in description_rows:
+                table = by_id.get(object_id)
+                if table is None:
+                    continue
+                if column_name is None:
+                    table["description"] = description
+                    continue
+                for col in table["columns"]:
+                    if col["name"] == column_name:
+                        col["description"] = description
+
+        return list(tables.values())
 
-        for table in tables:
-            full_name = f"[{table['schema']}].[{table['name']}]"
-            schema_text.append(f"\n### 資料表: {full_name}")
+    @staticmethod
+    def render_schema(tables: list[dict], format: str = "markdown", token_budget: Optional[int] = None) -> str:
+        """
+        將結構化的資料表資訊轉為 Schema 文字
+        
+        Args:
+            tables: get_schema_metadata() 回傳的資料表資訊
+            format: 輸出格式（markdown / ddl / compact），參見 SCHEMA_FORMATS
+            token_budget: token 上限；超過時先縮寫型別、省略低價值欄位，最後才省略資料表
             
-            columns = self.get_columns(table['schema'], table['name'])
-            schema_text.append("| 欄位名稱 | 資料類型 | 可為空 |")
-            schema_text.append("|---------|---------|--------|")
+        Returns:
+            str: 格式化的 Schema 文字
+        """
+        return render_tables(tables, format, token_budget)
+
+    def get_full_schema(self, bulk: bool = True, format: str = "markdown") -> str:
+        """
+        取得完整的資料庫 Schema 文字描述
+        
+        Args:
+            bulk: 是否使用集合式查詢；False 時改為逐表查詢欄位
+            format: 輸出格式（markdown / ddl / compact）
             
-            for col in columns:
-                data_type = col['data_type']
-                if col['max_length']:
-                    data_type += f"({col['max_length']})"
-                nullable = "是" if col['nullable'] == "YES" else "否"
-                schema_text.append(f"| {col['name']} | {data_type} | {nullable} |")
+        Returns:
+            str: 格式化的 Schema 文字
+        """
+        if bulk:
+            return self.render_schema(self.get_schema_metadata(), format)
 
-        return "\n".join(schema_text)
+        tables = [
+            {**table, "columns": self.get_columns(table['schema'], table['name'])}
+            for table in self.get_tables()
+        ]
+        return self.render_schema(tables, format)
 
-    def format_schema_for_agent(self, schema_text: str = None) -> str:
+    def format_schema_for_agent(self, schema_text: str = None, format: Optional[str] = None) -> str:
         """
         將 Schema 格式化為 Agent 提示詞使用的格式
         
         Args:
             schema_text: 自訂的 Schema 文字，若未提供則自動提取
+            format: 自動提取時的輸出格式，若未提供則使用 SCHEMA_FORMAT
             
         Returns:
             str: 格式化的 Schema 上下文
         """
         if schema_text is None:
-            schema_text = self.get_full_schema()
+            schema_text = self.get_full_schema(format=format or schema_format)
         
         return f"""
 以下是資料庫的 Schema 資訊，請根據這些結構來生成 T-SQL：
@@ -127,5 +331,751 @@ class SchemaExtractor:
 """
 
 
-# 預設提取器實例
-schema_extractor = SchemaExtractor()
+# Schema 文字格式：markdown（每表一個表格）、ddl（資料表(欄位 型別, ...)）、compact（每表一行，只列欄位名稱）
+SCHEMA_FORMATS = ("markdown", "ddl", "compact")
+
+# 精簡格式開頭的符號說明
+_LEGENDS = {
+    "ddl": "-- 資料表(欄位 型別)；?=可為空 PK=主鍵 →=外鍵參照 …+N=省略的欄位數",
+    "compact": "-- 資料表: 欄位；*=主鍵 →=外鍵參照 …+N=省略的欄位數",
+}
+
+# token 預算不足時的型別縮寫：只保留撰寫 SQL 需要的型別類別
+_TYPE_ABBREVIATIONS = {
+    "bigint": "int", "int": "int", "smallint": "int", "tinyint": "int", "bit": "bool",
+    "decimal": "num", "numeric": "num", "money": "num", "smallmoney": "num", "float": "num", "real": "num",
+    "char": "str", "varchar": "str", "nchar": "str", "nvarchar": "str", "text": "str", "ntext": "str",
+    "date": "date", "datetime": "datetime", "datetime2": "datetime", "smalldatetime": "datetime",
+    "datetimeoffset": "datetime", "time": "time", "uniqueidentifier": "guid",
+    "binary": "bin", "varbinary": "bin", "image": "bin",
+}
+
+# 低價值欄位：二進位／系統型別與「建立者、修改者」等稽核欄位最先省略，其次是修改時間
+# （必須有日期時間字尾；IsDeleted、DeletedAt 等軟刪除欄位是 WHERE 條件需要的欄位，不視為稽核欄位）
+_LOW_VALUE_TYPES = {
+    "binary", "varbinary", "image", "timestamp", "rowversion", "xml",
+    "geography", "geometry", "hierarchyid", "sql_variant",
+}
+_AUDIT_USER = re.compile(r"(created|modified|updated|changed|deleted)_?(by|user)(id)?$|^rowguid$", re.IGNORECASE)
+_AUDIT_TIME = re.compile(r"(modified|updated|changed)_?(date|time|datetime|at|on)$|^last_?(modified|updated)", re.IGNORECASE)
+
+# 依序嘗試的精簡程度：(是否縮寫型別, 保留的最大欄位優先度)；都超過預算時改為只保留主鍵與外鍵，
+# 再依相關性順序逐表補回一般欄位
+_COMPACTION_LEVELS = [(False, 3), (True, 3), (True, 2)]
+
+
+def _table_label(table: dict) -> str:
+    """精簡格式的資料表名稱（dbo 省略結構描述）"""
+    return table["name"] if table["schema"] == "dbo" else f"{table['schema']}.{table['name']}"
+
+
+def _column_type(col: dict, abbreviate: bool = False) -> str:
+    """欄位型別文字，例如 nvarchar(50)；abbreviate 時只保留型別類別"""
+    data_type = col["data_type"]
+    if abbreviate:
+        return _TYPE_ABBREVIATIONS.get(data_type.lower(), data_type)
+    if col["max_length"]:
+        data_type += f"({'max' if col['max_length'] == -1 else col['max_length']})"
+    return data_type
+
+
+def _foreign_key_refs(table: dict) -> dict[str, str]:
+    """外鍵欄位 → 參照的「資料表.欄位」（欄位同名時只寫資料表）"""
+    refs = {}
+    for fk in table.get("foreign_keys", []):
+        target = _table_label({"schema": fk["ref_schema"], "name": fk["ref_table"]})
+        for column, ref_column in zip(fk["columns"], fk["ref_columns"]):
+            refs[column] = target if column == ref_column else f"{target}.{ref_column}"
+    return refs
+
+
+def _column_priority(col: dict, key_columns: set[str]) -> int:
+    """token 預算不足時的欄位保留優先度：0 一律保留（主鍵、外鍵），數字越大越先省略"""
+    name = col["name"]
+    if col.get("primary_key") or name in key_columns:
+        return 0
+    if (col["data_type"] or "").lower() in _LOW_VALUE_TYPES or _AUDIT_USER.search(name):
+        return 3
+    if _AUDIT_TIME.search(name):
+        return 2
+    return 1
+
+
+def _render_markdown(table: dict, columns: list[dict], omitted: int, abbreviate: bool) -> str:
+    """markdown 表格：欄位名稱 | 資料類型 | 可為空"""
+    lines = [
+        f"\n### 資料表: [{table['schema']}].[{table['name']}]",
+        "| 欄位名稱 | 資料類型 | 可為空 |",
+        "|---------|---------|--------|",
+    ]
+    for col in columns:
+        nullable = "是" if col['nullable'] == "YES" else "否"
+        lines.append(f"| {col['name']} | {_column_type(col, abbreviate)} | {nullable} |")
+    if omitted:
+        lines.append(f"| …（另有 {omitted} 個欄位） | | |")
+    return "\n".join(lines)
+
+
+def _render_ddl(table: dict, columns: list[dict], omitted: int, abbreviate: bool) -> str:
+    """DDL 形式：Orders(OrderID int PK, CustomerID int? →Customers, ...)"""
+    refs = _foreign_key_refs(table)
+    parts = []
+    for col in columns:
+        part = f"{col['name']} {_column_type(col, abbreviate)}"
+        if col['nullable'] == "YES":
+            part += "?"
+        if col.get("primary_key"):
+            part += " PK"
+        if col['name'] in refs:
+            part += f" →{refs[col['name']]}"
+        parts.append(part)
+    if omitted:
+        parts.append(f"…+{omitted}")
+    return f"{_table_label(table)}({', '.join(parts)})"
+
+
+def _render_compact(table: dict, columns: list[dict], omitted: int, abbreviate: bool) -> str:
+    """每表一行，只列欄位名稱：Orders: OrderID*, CustomerID→Customers, ..."""
+    refs = _foreign_key_refs(table)
+    parts = []
+    for col in columns:
+        part = col['name'] + ("*" if col.get("primary_key") else "")
+        if col['name'] in refs:
+            part += f"→{refs[col['name']]}"
+        parts.append(part)
+    if omitted:
+        parts.append(f"…+{omitted}")
+    return f"{_table_label(table)}: {', '.join(parts)}"
+
+
+_RENDERERS = {"markdown": _render_markdown, "ddl": _render_ddl, "compact": _render_compact}
+
+
+def render_tables(tables: list[dict], format: str = "markdown", token_budget: Optional[int] = None) -> str:
+    """
+    將資料表資訊轉為指定格式的 Schema 文字
+    
+    提供 token_budget 時依序嘗試更精簡的形式，直到符合預算：縮寫型別 → 省略二進位與稽核欄位
+    → 省略修改時間欄位 → 只保留主鍵與外鍵，再依資料表順序在預算內逐表補回一般欄位；
+    只保留主鍵與外鍵仍超過時，才從尾端（相關性最低者）省略整張資料表。
+    
+    Args:
+        tables: get_schema_metadata() 回傳的資料表資訊（依重要性排序）
+        format: 輸出格式（markdown / ddl / compact）
+        token_budget: token 上限，若未提供則不限制
+        
+    Returns:
+        str: 格式化的 Schema 文字
+        
+    Raises:
+        ValueError: 不支援的格式
+    """
+    renderer = _RENDERERS.get(format)
+    if renderer is None:
+        raise ValueError(f"不支援的 Schema 格式: {format}（可用：{', '.join(SCHEMA_FORMATS)}）")
+    legend = _LEGENDS.get(format)
+    header = [legend] if legend and tables else []
+    if not token_budget:
+        return "\n".join(header + [renderer(table, table["columns"], 0, False) for table in tables])
+
+    ranked = []
+    for table in tables:
+        key_columns = set(_foreign_key_refs(table))
+        ranked.append([(col, _column_priority(col, key_columns)) for col in table["columns"]])
+
+    def render_level(table: dict, columns: list[tuple], abbreviate: bool, max_priority: int) -> str:
+        kept = [col for col, priority in columns if priority <= max_priority]
+        return renderer(table, kept, len(columns) - len(kept), abbreviate)
+
+    budget = token_budget - sum(estimate_tokens(line) for line in header)
+    for abbreviate, max_priority in _COMPACTION_LEVELS:
+        blocks = [render_level(table, columns, abbreviate, max_priority) for table, columns in zip(tables, ranked)]
+        costs = [estimate_tokens(block) for block in blocks]
+        if sum(costs) <= budget:
+            return "\n".join(header + blocks)
+
+    blocks = [render_level(table, columns, True, 0) for table, columns in zip(tables, ranked)]
+    costs = [estimate_tokens(block) for block in blocks]
+    used = sum(costs)
+    if used <= budget:
+        # 剩餘的預算依資料表順序補回一般欄位（稽核欄位仍省略）
+        for i, (table, columns) in enumerate(zip(tables, ranked)):
+            fuller = render_level(table, columns, True, 1)
+            extra = estimate_tokens(fuller) - costs[i]
+            if used + extra <= budget:
+                blocks[i] = fuller
+                used += extra
+        return "\n".join(header + blocks)
+
+    # 只保留主鍵與外鍵仍超過預算：省略放不下的資料表（至少保留一張）
+    selected, used = [], 0
+    for block, cost in zip(blocks, costs):
+        if selected and used + cost > budget:
+            continue
+        selected.append(block)
+        used += cost
+    if len(selected) < len(blocks):
+        selected.append(f"（另有 {len(blocks) - len(selected)} 張資料表因長度省略）")
+    return "\n".join(header + selected)
+
+
+_CJK_RUN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]+")
+_WORD = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗估文字的 LLM token 數（CJK 字元約 1 token，其餘約 4 字元 1 token）
+    
+    Args:
+        text: 要估算的文字
+        
+    Returns:
+        int: 估算的 token 數
+    """
+    cjk = sum(len(run) for run in _CJK_RUN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    將文字切成檢索用詞彙
+
+    英數名稱依 CamelCase / 底線切詞並轉小寫（簡單去除複數 s），
+    CJK 文字（如「客戶」、「訂單」）切成單字與二元字元 n-gram。
+    
+    Args:
+        text: 資料表名稱、欄位名稱、說明或使用者問題
+        
+    Returns:
+        list: 詞彙列表
+    """
+    tokens = []
+    for word in _WORD.findall(text):
+        word = word.lower()
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    for run in _CJK_RUN.findall(text):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class SchemaIndex:
+    """
+    資料表的本機 BM25 詞彙索引
+
+    以資料表名稱、欄位名稱與說明建立索引，依使用者問題挑出相關資料表，
+    再補上外鍵相鄰的資料表，避免把整個資料庫 Schema 送進提示詞。
+    """
+
+    def __init__(self, tables: list[dict], k1: float = 1.5, b: float = 0.75):
+        """
+        建立索引
+        
+        Args:
+            tables: get_schema_metadata() 回傳的資料表資訊
+            k1: BM25 詞頻飽和參數
+            b: BM25 文件長度正規化參數
+        """
+        self.tables = tables
+        self.k1 = k1
+        self.b = b
+        self._term_freqs: list[Counter] = []
+        self._lengths: list[int] = []
+        self._postings: dict[str, list[int]] = {}
+        self._positions = {(table["schema"], table["name"]): i for i, table in enumerate(tables)}
+
+        for i, table in enumerate(tables):
+            # 資料表名稱權重較高，重複計入兩次
+            terms = tokenize(table["name"]) * 2
+            terms += tokenize(table.get("description") or "")
+            for col in table["columns"]:
+                terms += tokenize(col["name"])
+                terms += tokenize(col.get("description") or "")
+            freqs = Counter(terms)
+            self._term_freqs.append(freqs)
+            self._lengths.append(len(terms))
+            for term in freqs:
+                self._postings.setdefault(term, []).append(i)
+
+        self._avg_length = sum(self._lengths) / len(self._lengths) if tables else 0.0
+
+    def search(self, question: str, top_k: int = 5) -> list[tuple[dict, float]]:
+        """
+        依 BM25 分數搜尋相關資料表
+        
+        Args:
+            question: 使用者的自然語言問題
+            top_k: 回傳的資料表數量上限
+            
+        Returns:
+            list: (資料表資訊, 分數) 列表，依分數由高至低排序，不含零分資料表
+        """
+        scores: dict[int, float] = {}
+        n = len(self.tables)
+        for term in set(tokenize(question)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i in postings:
+                tf = self._term_freqs[i][term]
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / self._avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(self.tables[i], score) for i, score in ranked]
+
+    def select(
+        self,
+        question: str,
+        top_k: int = 5,
+        token_budget: Optional[int] = None,
+        include_neighbors: bool = True,
+        format: str = "markdown"
+    ) -> list[dict]:
+        """
+        挑選與問題相關的資料表（含外鍵相鄰資料表），並控制在 token 預算內
+        
+        Args:
+            question: 使用者的自然語言問題
+            top_k: 直接命中的資料表數量上限
+            token_budget: Schema 文字的 token 上限，若未提供則不限制
+            include_neighbors: 是否加入外鍵參照 / 被參照的資料表
+            format: 計算 token 預算時使用的 Schema 格式
+            
+        Returns:
+            list: 選出的資料表資訊；問題完全沒有命中時回傳全部資料表（仍受 token 預算限制）
+        """
+        hits = [table for table, _ in self.search(question, top_k)]
+        if not hits:
+            candidates = list(self.tables)
+        else:
+            candidates = list(hits)
+            if include_neighbors:
+                candidates += self._neighbors(hits)
+
+        if token_budget is None:
+            return candidates
+
+        selected, used = [], 0
+        for table in candidates:
+            cost = estimate_tokens(_render_table(table, format))
+            if selected and used + cost > token_budget:
+                continue
+            selected.append(table)
+            used += cost
+        return selected
+
+    def _neighbors(self, hits: list[dict]) -> list[dict]:
+        """取得外鍵相鄰的資料表（參照與被參照），依命中順序排列且不重複"""
+        hit_keys = {(table["schema"], table["name"]) for table in hits}
+        seen = set(hit_keys)
+        neighbors = []
+        for table in hits:
+            for fk in table.get("foreign_keys", []):
+                key = (fk["ref_schema"], fk["ref_table"])
+                if key not in seen and key in self._positions:
+                    seen.add(key)
+                    neighbors.append(self.tables[self._positions[key]])
+        for table in self.tables:
+            key = (table["schema"], table["name"])
+            if key in seen:
+                continue
+            if any((fk["ref_schema"], fk["ref_table"]) in hit_keys for fk in table.get("foreign_keys", [])):
+                seen.add(key)
+                neighbors.append(table)
+        return neighbors
+
+
+def _render_table(table: dict, format: str = "markdown") -> str:
+    """將單一資料表轉為 Schema 文字（不含精簡格式的符號說明）"""
+    return _RENDERERS[format](table, table["columns"], 0, False)
+
+
+@dataclass
+class _SchemaEntry:
+    """單一連線字串的 Schema 快取內容"""
+    tables: dict[int, dict]
+    markers: dict[int, tuple]
+    version: str
+    checked_at: float = field(default_factory=time.monotonic)
+    index: Optional[SchemaIndex] = None
+    texts: dict[str, str] = field(default_factory=dict)
+
+    def render(self, format: str) -> str:
+        """完整 Schema 文字（每種格式第一次使用時才產生）"""
+        text = self.texts.get(format)
+        if text is None:
+            text = self.texts[format] = render_tables(list(self.tables.values()), format)
+        return text
+
+
+# 快照檔案格式版本，結構變更時遞增（舊版快照會被忽略）
+SNAPSHOT_FORMAT = 1
+
+
+def _encode_marker_value(value):
+    """將變更標記中的值轉為 JSON 可儲存的形式（datetime 轉為 ISO 字串）"""
+    if isinstance(value, datetime):
+        return {"datetime": value.isoformat()}
+    return value
+
+
+def _decode_marker_value(value):
+    """還原 _encode_marker_value() 的結果"""
+    if isinstance(value, dict) and "datetime" in value:
+        return datetime.fromisoformat(value["datetime"])
+    return value
+
+
+class SchemaCache:
+    """
+    以連線字串為 key 的全域 Schema 快取
+
+    透過 sys.objects.modify_date 判斷資料表是否變更，只重新提取有變動的資料表。
+    提供快照目錄時，每次內容變更都寫入磁碟；重新啟動後直接載入快照回應，
+    並在背景比對目錄，第一個問題不必等待完整的目錄提取。
+    """
+
+    # 變動的資料表超過此數量時改為完整提取
+    MAX_INCREMENTAL_TABLES = 500
+
+    def __init__(self, revalidate_interval: float = 5.0, snapshot_dir: str = ""):
+        """
+        初始化 Schema 快取
+        
+        Args:
+            revalidate_interval: 距上次檢查未超過此秒數時，直接使用快取不查詢目錄
+            snapshot_dir: 快照目錄，空字串表示不寫入磁碟
+        """
+        self.revalidate_interval = revalidate_interval
+        self.snapshot_dir = snapshot_dir
+        self._entries: dict[str, _SchemaEntry] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "full_refreshes": 0,
+            "incremental_refreshes": 0,
+            "tables_reextracted": 0,
+            "snapshot_loads": 0,
+            "background_refreshes": 0,
+        }
+
+    def get_tables(self, connection_string: Optional[str] = None) -> list[dict]:
+        """
+        取得結構化的資料表資訊（必要時自動更新）
+        
+        Args:
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            
+        Returns:
+            list: 資料表資訊列表，格式同 SchemaExtractor.get_schema_metadata()
+        """
+        return list(self._get_entry(connection_string).tables.values())
+
+    def get_schema_text(self, connection_string: Optional[str] = None, format: Optional[str] = None) -> str:
+        """
+        取得格式化的 Schema 文字（必要時自動更新）
+        
+        Args:
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            format: 輸出格式（markdown / ddl / compact），若未提供則使用 SCHEMA_FORMAT
+            
+        Returns:
+            str: 格式化的 Schema 文字
+        """
+        return self._get_entry(connection_string).render(format or schema_format)
+
+    def get_version(self, connection_string: Optional[str] = None) -> str:
+        """
+        取得目前 Schema 的版本識別碼（任何資料表變更都會改變版本）
+        
+        Args:
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            
+        Returns:
+            str: Schema 版本雜湊值
+        """
+        return self._get_entry(connection_string).version
+
+    def get_relevant_schema(
+        self,
+        question: str,
+        connection_string: Optional[str] = None,
+        top_k: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        format: Optional[str] = None
+    ) -> str:
+        """
+        取得只包含與問題相關資料表的 Schema 文字
+        
+        超過 token 預算時先精簡欄位（縮寫型別、省略低價值欄位），再省略相關性最低的資料表。
+        
+        Args:
+            question: 使用者的自然語言問題
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            top_k: 直接命中的資料表數量，若未提供則使用 SCHEMA_PRUNE_TOP_K（0 表示不裁剪）
+            token_budget: Schema 文字的 token 上限，若未提供則使用 SCHEMA_PRUNE_TOKEN_BUDGET
+            format: 輸出格式（markdown / ddl / compact），若未提供則使用 SCHEMA_FORMAT
+            
+        Returns:
+            str: 裁剪後的 Schema 文字
+        """
+        entry = self._get_entry(connection_string)
+        top_k = schema_prune_top_k if top_k is None else top_k
+        token_budget = schema_prune_token_budget if token_budget is None else token_budget
+        format = format or schema_format
+        if top_k <= 0:
+            return entry.render(format)
+        return render_tables(self._select(entry, question, top_k), format, token_budget or None)
+
+    def get_relevant_tables(
+        self,
+        question: str,
+        connection_string: Optional[str] = None,
+        top_k: Optional[int] = None
+    ) -> list[dict]:
+        """
+        取得與問題相關的資料表資訊（與 get_relevant_schema 選出的資料表相同，依相關性排序）
+        
+        Args:
+            question: 使用者的自然語言問題
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            top_k: 直接命中的資料表數量，若未提供則使用 SCHEMA_PRUNE_TOP_K（0 表示全部資料表）
+            
+        Returns:
+            list: 資料表資訊列表
+        """
+        entry = self._get_entry(connection_string)
+        top_k = schema_prune_top_k if top_k is None else top_k
+        if top_k <= 0:
+            return list(entry.tables.values())
+        return self._select(entry, question, top_k)
+
+    def peek_tables(self, connection_string: Optional[str] = None) -> Optional[list[dict]]:
+        """
+        取得已快取的資料表資訊，不等待資料庫查詢
+
+        記憶體中沒有時載入磁碟快照（並在背景重新驗證）；兩者都沒有時回傳 None。
+        """
+        connection_string = connection_string or sql_server_config.connection_string
+        entry = self._entries.get(connection_string)
+        if entry is None:
+            with self._entry_lock(connection_string):
+                entry = self._entries.get(connection_string) or self._load_snapshot(connection_string)
+        return list(entry.tables.values()) if entry else None
+
+    def invalidate(self, connection_string: Optional[str] = None):
+        """
+        清除快取（含磁碟快照），下次使用時重新完整提取
+        
+        Args:
+            connection_string: 要清除的連線字串，若未提供則清除全部
+        """
+        with self._lock:
+            if connection_string is None:
+                connection_strings = list(self._entries)
+                self._entries.clear()
+            else:
+                connection_strings = [connection_string]
+                self._entries.pop(connection_string, None)
+        if not self.snapshot_dir:
+            return
+        if connection_string is None:
+            paths = [
+                os.path.join(self.snapshot_dir, name)
+                for name in (os.listdir(self.snapshot_dir) if os.path.isdir(self.snapshot_dir) else [])
+                if name.startswith("schema_") and name.endswith(".json")
+            ]
+        else:
+            paths = [self._snapshot_path(cs) for cs in connection_strings]
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        """取得快取命中統計"""
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    @staticmethod
+    def _select(entry: _SchemaEntry, question: str, top_k: int) -> list[dict]:
+        """以快取項目的詞彙索引挑選相關資料表（索引在第一次使用時建立）"""
+        if entry.index is None:
+            entry.index = SchemaIndex(list(entry.tables.values()))
+        return entry.index.select(question, top_k=top_k)
+
+    def _entry_lock(self, connection_string: str) -> threading.Lock:
+        """取得連線字串專屬的更新鎖"""
+        with self._lock:
+            return self._locks.setdefault(connection_string, threading.Lock())
+
+    def _get_entry(self, connection_string: Optional[str]) -> _SchemaEntry:
+        """取得快取項目，超過檢查間隔時比對修改時間並增量更新"""
+        connection_string = connection_string or sql_server_config.connection_string
+
+        # 同一連線字串同時只允許一個執行緒更新
+        with self._entry_lock(connection_string):
+            entry = self._entries.get(connection_string)
+            if entry is None:
+                # 磁碟快照立即可用，背景再比對目錄
+                entry = self._load_snapshot(connection_string)
+                if entry is not None:
+                    return entry
+            if entry and time.monotonic() - entry.checked_at < self.revalidate_interval:
+                self._count("hits")
+                return entry
+            return self._update(connection_string, entry)
+
+    def _update(self, connection_string: str, entry: Optional[_SchemaEntry]) -> _SchemaEntry:
+        """比對目錄並更新快取項目，內容有變更時寫入快照（呼叫端需持有更新鎖）"""
+        extractor = SchemaExtractor(DatabaseConnector(connection_string))
+        updated = self._refresh(extractor, entry)
+        with self._lock:
+            self._entries[connection_string] = updated
+        if updated is not entry:
+            self._save_snapshot(connection_string, updated)
+        return updated
+
+    def _revalidate_in_background(self, connection_string: str):
+        """在背景執行緒比對目錄，更新從快照載入的項目"""
+
+        def revalidate():
+            with self._entry_lock(connection_string):
+                entry = self._entries.get(connection_string)
+                try:
+                    self._update(connection_string, entry)
+                    self._count("background_refreshes")
+                except Exception:
+                    # 連線失敗時繼續使用快照，下次超過檢查間隔時由前景重試
+                    pass
+
+        threading.Thread(target=revalidate, name="schema-revalidate", daemon=True).start()
+
+    def _snapshot_path(self, connection_string: str) -> str:
+        """快照檔案路徑（以雜湊值命名，檔名不含連線字串中的帳號密碼）"""
+        digest = hashlib.sha1(connection_string.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.snapshot_dir, f"schema_{digest}.json")
+
+    def _load_snapshot(self, connection_string: str) -> Optional[_SchemaEntry]:
+        """
+        載入磁碟快照並放入快取，同時啟動背景重新驗證（呼叫端需持有更新鎖）
+        
+        Returns:
+            _SchemaEntry: 快照內容；沒有快照、格式不符或檔案損毀時回傳 None
+        """
+        if not self.snapshot_dir:
+            return None
+        try:
+            with open(self._snapshot_path(connection_string), encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") != SNAPSHOT_FORMAT:
+                return None
+            entry = _SchemaEntry(
+                tables={table["object_id"]: table for table in data["tables"]},
+                markers={
+                    row[0]: tuple(_decode_marker_value(value) for value in row[1:])
+                    for row in data["markers"]
+                },
+                version=data["version"],
+                texts=data.get("texts", {}),
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        with self._lock:
+            self._entries[connection_string] = entry
+        self._count("snapshot_loads")
+        self._revalidate_in_background(connection_string)
+        return entry
+
+    def _save_snapshot(self, connection_string: str, entry: _SchemaEntry):
+        """將快取項目（含預設格式的 Schema 文字）寫入磁碟快照，寫入失敗時忽略"""
+        if not self.snapshot_dir:
+            return
+        entry.render(schema_format)
+        data = {
+            "format": SNAPSHOT_FORMAT,
+            "version": entry.version,
+            "saved_at": time.time(),
+            "markers": [
+                [object_id, *(_encode_marker_value(value) for value in marker)]
+                for object_id, marker in entry.markers.items()
+            ],
+            "tables": list(entry.tables.values()),
+            "texts": dict(entry.texts),
+        }
+        path = self._snapshot_path(connection_string)
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            # 先寫入暫存檔再取代，其他程序不會讀到寫到一半的快照
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, default=str)
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+
+    def _refresh(self, extractor: SchemaExtractor, entry: Optional[_SchemaEntry]) -> _SchemaEntry:
+        """比對修改時間標記，只重新提取新增或變更的資料表"""
+        markers = {row[0]: tuple(row[1:]) for row in extractor.get_table_markers()}
+
+        if entry is not None:
+            changed = [object_id for object_id, marker in markers.items() if entry.markers.get(object_id) != marker]
+            if not changed and markers.keys() == entry.markers.keys():
+                self._count("hits")
+                entry.checked_at = time.monotonic()
+                return entry
+
+        self._count("misses")
+        if entry is None or len(changed) > self.MAX_INCREMENTAL_TABLES:
+            fetched = extractor.get_schema_metadata(include_descriptions=True)
+            tables = {}
+            self._count("full_refreshes")
+        else:
+            fetched = (
+                extractor.get_schema_metadata(object_ids=changed, include_descriptions=True)
+                if changed else []
+            )
+            tables = {
+                object_id: table for object_id, table in entry.tables.items()
+                if object_id in markers and object_id not in changed
+            }
+            self._count("incremental_refreshes")
+        self._count("tables_reextracted", len(fetched))
+        tables.update((table["object_id"], table) for table in fetched)
+
+        # 依目錄排序重新排列，維持與完整提取相同的輸出順序
+        ordered = {object_id: tables[object_id] for object_id in markers if object_id in tables}
+        version = hashlib.sha1(repr(sorted(markers.items())).encode("utf-8")).hexdigest()[:16]
+        return _SchemaEntry(tables=ordered, markers=markers, version=version)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] += amount
+
+
+# 全域 Schema 快取（Agent 工具與 Web UI 共用；建立時不連線，也不讀取快照）
+schema_cache = SchemaCache(
+    revalidate_interval=schema_cache_revalidate_interval,
+    snapshot_dir=schema_snapshot_dir,
+)
+
+
+# 預設提取器實例（schema_extractor）在第一次存取時才建立
+def __getattr__(name: str):
+    """延後建立模組層級的預設實例"""
+    if name == "schema_extractor":
+        globals()[name] = SchemaExtractor()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
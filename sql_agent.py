@@ -9,43 +9,78 @@ Agent 會自動：
 """
 
 import asyncio
+import functools
+import json
+import math
 import os
-from typing import Optional
+import queue
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Coroutine, Iterator, Optional
 
-from config import azure_openai_config, openai_provider
+from config import (
+    AzureOpenAIConfig,
+    agent_max_concurrency,
+    agent_max_tool_calls,
+    agent_schema_injection,
+    azure_openai_config,
+    column_profile_hint_tokens,
+    join_hint_tokens,
+    few_shot_top_k,
+    openai_provider,
+    question_cache_max_entries,
+    question_cache_path,
+    question_cache_ttl,
+    request_timeout,
+    sql_server_config,
+)
+from column_profiler import column_profiler
+from db_connector import DatabaseConnector, Deadline, current_deadline, deadline, sql_fingerprint
+from example_store import Example, ExampleStore, database_key, format_examples, get_example_store
+from join_graph import get_join_graph
+from schema_extractor import schema_cache
 
-# 嘗試導入 Agent Framework (預覽版)
-try:
-    from agent_framework import ChatAgent
-    from agent_framework.azure import AzureOpenAIChatClient
-    from agent_framework.openai import OpenAIChatClient
-    from openai import AzureOpenAI as OpenAIClient
-    AGENT_FRAMEWORK_AVAILABLE = True
-except ImportError:
-    AGENT_FRAMEWORK_AVAILABLE = False
+# Agent Framework、OpenAI SDK 與自定義工具（agent_tools 依賴 Agent Framework）匯入需要
+# 數百毫秒，延後到第一次建立 Agent 或執行時才匯入；只需要快取或正規化函數的程式不必付出這個成本
+if TYPE_CHECKING:
+    from agent_tools import SqlExecution
 
-# 導入自定義工具
-from agent_tools import get_database_schema, execute_sql, test_connection
-
-# 導入舊版 OpenAI 客戶端作為備案
-from openai import AzureOpenAI
 
+@functools.cache
+def agent_framework_available() -> bool:
+    """Agent Framework (預覽版) 是否已安裝（第一次呼叫時嘗試匯入）"""
+    try:
+        import agent_framework  # noqa: F401
+        import agent_framework.azure  # noqa: F401
+        import agent_framework.openai  # noqa: F401
+    except ImportError:
+        return False
+    return True
 
 
 # T-SQL 專家的系統提示詞
 SYSTEM_PROMPT = """你是一位 T-SQL 專家助手。你有以下工具可以使用：
 
-1. **get_database_schema()** - 取得資料庫的完整 Schema（資料表和欄位）
+1. **get_database_schema(question)** - 取得與問題相關的資料表和欄位（不帶參數則取得完整 Schema）
 2. **execute_sql(sql)** - 執行 SQL 查詢並查看結果或錯誤
-3. **test_connection()** - 測試資料庫連線
+3. **get_column_profile(table, columns)** - 取得欄位的值分布（NULL／空字串比例、常見值、範圍）
+4. **get_join_path(source, target)** - 依外鍵取得兩張資料表之間的 JOIN 路徑與條件
+5. **test_connection()** - 測試資料庫連線
 
 ## 工作流程
 
 當使用者提出查詢需求時，請遵循以下步驟：
 
-1. **先呼叫 get_database_schema()** 了解資料庫結構
-2. 根據 Schema 和使用者需求，**生成 T-SQL 語句**
-3. **呼叫 execute_sql()** 測試你的查詢
+1. 若對話中已提供預先載入的 Schema，直接使用；**尚未提供或缺少需要的資料表／欄位時，才呼叫 get_database_schema(question)**，question 填入使用者的問題
+2. 根據 Schema 和使用者需求，**生成 T-SQL 語句**；需要知道欄位有哪些值（例如狀態代碼）時，先看 Schema 附上的值提示，
+   沒有時呼叫 get_column_profile，不要自行執行 SELECT DISTINCT 之類的探索查詢；
+   JOIN 多張資料表時依 Schema 附上的 JOIN 提示撰寫條件，沒有時呼叫 get_join_path，不要自行猜測 JOIN 欄位
+3. **呼叫 execute_sql()** 測試你的查詢（只需確認可執行、不需要看資料時傳入 shape_only=true）
 4. 如果有錯誤，**分析錯誤並修正 SQL**，然後重試
 5. 成功後，回傳最終的 SQL 語句給使用者
 
@@ -54,6 +89,7 @@ SYSTEM_PROMPT = """你是一位 T-SQL 專家助手。你有以下工具可以使
 - 使用方括號 [] 包裹資料表和欄位名稱
 - 只生成 T-SQL 語法
 - 對於可能回傳大量資料的查詢，加上 TOP 限制
+- 估計成本或回傳筆數過高的查詢會被拒絕執行，請依錯誤訊息加上篩選條件或改用彙總後重試
 - 對於複雜查詢，加上適當的註解
 - **空值檢查**：當使用者要查詢「非空」或「有值」的資料時，除了檢查 IS NOT NULL 之外，也要同時檢查不是空白字串，例如：WHERE [欄位] IS NOT NULL AND [欄位] <> ''
 
@@ -65,18 +101,391 @@ SYSTEM_PROMPT = """你是一位 T-SQL 專家助手。你有以下工具可以使
 """
 
 
+class _AgentLoop:
+    """
+    在背景執行緒上長駐的事件迴圈
+
+    所有 Agent 的非同步工作都在同一個迴圈上執行，非同步 HTTP 客戶端的連線
+    因此可跨問題重複使用；同步呼叫端只需把協程提交過來並等待結果。
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """取得（必要時啟動）背景事件迴圈"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="sql-agent-loop", daemon=True).start()
+            return self._loop
+
+    def is_current(self) -> bool:
+        """目前是否正在背景事件迴圈中執行"""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def run(self, coro):
+        """從同步程式碼提交協程並等待結果（可在其他事件迴圈中呼叫）"""
+        if self.is_current():
+            coro.close()
+            raise RuntimeError("不可在 Agent 事件迴圈內同步等待，請改用 await")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def run_async(self, coro):
+        """從任意事件迴圈等待在背景事件迴圈上執行的協程"""
+        if self.is_current():
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+    def stream(self, start: Callable[[Callable], Coroutine]) -> Iterator:
+        """
+        從同步程式碼逐一取得背景事件迴圈上產生的事件
+
+        Args:
+            start: 接收 emit(event) 函數並回傳協程；協程在背景事件迴圈上執行，
+                   期間可從任何執行緒呼叫 emit，協程結束即停止
+
+        Yields:
+            emit 送出的事件（依送出順序）；呼叫端提前停止迭代時會取消協程
+        """
+        if self.is_current():
+            raise RuntimeError("不可在 Agent 事件迴圈內同步等待，請改用 stream_async")
+        events = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(start(events.put), self.loop)
+        future.add_done_callback(lambda _: events.put(_STREAM_DONE))
+        try:
+            while (event := events.get()) is not _STREAM_DONE:
+                yield event
+            future.result()
+        finally:
+            future.cancel()
+
+    async def stream_async(self, start: Callable[[Callable], Coroutine]) -> AsyncIterator:
+        """stream 的非同步版本（可在任意事件迴圈中使用）"""
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+
+        def emit(event):
+            # emit 可能在工具或舊版模式的工作執行緒中呼叫
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        if self.is_current():
+            future = asyncio.ensure_future(start(emit))
+        else:
+            future = asyncio.wrap_future(asyncio.run_coroutine_threadsafe(start(emit), self.loop))
+        # 完成通知排在先前所有 emit 之後
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, _STREAM_DONE))
+        try:
+            while (event := await events.get()) is not _STREAM_DONE:
+                yield event
+            await future
+        finally:
+            future.cancel()
+
+
+# 串流結束的標記
+_STREAM_DONE = object()
+
+# 全域共用的 Agent 事件迴圈
+_agent_loop = _AgentLoop()
+
+# hybrid 模式下接在 SYSTEM_PROMPT 之後的 Schema 訊息（SYSTEM_PROMPT 本身保持不變，可共用提示快取）
+SCHEMA_INJECTION_PROMPT = """{schema}
+
+以上是依使用者問題預先載入的相關資料表與欄位，請直接據此撰寫 SQL。
+只有需要的資料表或欄位不在其中時，才呼叫 get_database_schema 取得更多 Schema。"""
+
+# 接在裁剪後 Schema 之後的欄位值提示（來自背景抽樣的欄位統計）
+VALUE_HINTS_PROMPT = """欄位值提示（抽樣統計，百分比為樣本中的比例）：
+{hints}"""
+
+# 接在裁剪後 Schema 之後的 JOIN 提示（依外鍵計算的最短路徑）
+JOIN_HINTS_PROMPT = """JOIN 提示（依外鍵，多表查詢請使用這些條件）：
+{hints}"""
+
+# 有相似的已驗證範例時接在 Schema 之後的訊息
+FEW_SHOT_PROMPT = """以下是先前在此資料庫執行成功的相似問題與 SQL，可沿用其中的資料表、欄位與寫法
+（例如空值與空字串的處理），但仍須依本次問題調整條件：
+
+{examples}"""
+
+# 超過請求時間預算時回傳的回應（含「錯誤」，呼叫端會當作錯誤顯示）
+TIMEOUT_RESPONSE = "錯誤：產生 SQL 超過本次請求的時間上限，已取消執行中的查詢。請簡化問題或縮小查詢範圍後重試。"
+
+
+# 與中文字相鄰的空白（中文不以空白分詞，「本月 訂單」與「本月訂單」視為相同）
+_CJK_SPACE = re.compile(r"(?<=[\u3400-\u9fff])\s+|\s+(?=[\u3400-\u9fff])")
+
+# 問題結尾的句末標點（「列出訂單？」與「列出訂單」視為相同）
+_TRAILING_PUNCTUATION = "。？！?!."
+
+
+def normalize_question(question: str) -> str:
+    """
+    正規化自然語言問題，作為問題快取的 key
+
+    全形字元轉半形（NFKC）、不分大小寫、合併連續空白並移除中文字旁的空白，
+    以及移除結尾的句末標點。其他符號（% - . # ' " 等）可能改變查詢的意思，一律保留。
+    
+    Args:
+        question: 使用者的自然語言問題
+        
+    Returns:
+        str: 正規化後的問題
+    """
+    text = unicodedata.normalize("NFKC", question).casefold()
+    text = _CJK_SPACE.sub("", " ".join(text.split()))
+    return text.rstrip(_TRAILING_PUNCTUATION).rstrip()
+
+
+class QuestionCache:
+    """
+    自然語言問題 → 已驗證 SQL 的快取
+
+    以（正規化問題, Schema 版本）為 key，Schema 變更後舊的 SQL 自然失效。
+    記憶體中以 LRU + TTL 淘汰；提供 SQLite 路徑時同時寫入磁碟，重新啟動後仍可命中。
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 86400, path: str = ""):
+        """
+        初始化問題快取
+        
+        Args:
+            max_entries: 記憶體與磁碟中最多保留的筆數
+            ttl: 每筆快取的存活秒數
+            path: SQLite 檔案路徑，空字串表示只存於記憶體
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple[str, str], tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0}
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS question_cache ("
+                "question TEXT NOT NULL, schema_version TEXT NOT NULL, "
+                "response TEXT NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (question, schema_version))"
+            )
+            self._db.commit()
+
+    def get(self, question: str, schema_version: str) -> Optional[str]:
+        """
+        查詢快取
+        
+        Args:
+            question: 使用者的自然語言問題
+            schema_version: 目前的 Schema 版本
+            
+        Returns:
+            str: 快取的 Agent 回應，未命中或已過期時回傳 None
+        """
+        key = (normalize_question(question), schema_version)
+        now = time.time()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT response, created_at FROM question_cache WHERE question = ? AND schema_version = ?",
+                    key
+                ).fetchone()
+                if row:
+                    item = (row[0], row[1])
+                    self._store_locked(key, item)
+
+            if item is None or now - item[1] > self.ttl:
+                if item is not None:
+                    self._delete_locked(key)
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return item[0]
+
+    def put(self, question: str, schema_version: str, response: str):
+        """
+        寫入已驗證（執行成功）的 Agent 回應
+        
+        Args:
+            question: 使用者的自然語言問題
+            schema_version: 產生此 SQL 時的 Schema 版本
+            response: Agent 的回應（包含 SQL）
+        """
+        key = (normalize_question(question), schema_version)
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[0] == response:
+                # 命中後再次執行成功不延長存活時間
+                self._entries.move_to_end(key)
+                return
+            item = (response, time.time())
+            self._store_locked(key, item)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO question_cache VALUES (?, ?, ?, ?)", (*key, *item)
+                )
+                self._db.execute(
+                    "DELETE FROM question_cache WHERE created_at < ? OR rowid NOT IN "
+                    "(SELECT rowid FROM question_cache ORDER BY created_at DESC LIMIT ?)",
+                    (item[1] - self.ttl, self.max_entries)
+                )
+                self._db.commit()
+
+    def clear(self):
+        """清除所有快取（包含磁碟）"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM question_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """取得快取命中統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+    def _store_locked(self, key: tuple[str, str], item: tuple[str, float]):
+        """寫入記憶體並淘汰最久未使用的項目（呼叫端需持有鎖）"""
+        self._entries[key] = item
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _delete_locked(self, key: tuple[str, str]):
+        """刪除過期的項目（呼叫端需持有鎖）"""
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute(
+                "DELETE FROM question_cache WHERE question = ? AND schema_version = ?", key
+            )
+            self._db.commit()
+
+
+# 全域共用的問題快取（第一次使用時才開啟 SQLite 檔案）
+_question_cache: Optional[QuestionCache] = None
+_question_cache_lock = threading.Lock()
+
+
+def get_question_cache() -> QuestionCache:
+    """
+    取得全域共用的問題快取
+
+    Returns:
+        QuestionCache: 依 QUESTION_CACHE_* 設定建立的共用實例
+    """
+    global _question_cache
+    with _question_cache_lock:
+        if _question_cache is None:
+            _question_cache = QuestionCache(
+                max_entries=question_cache_max_entries,
+                ttl=question_cache_ttl,
+                path=question_cache_path
+            )
+        return _question_cache
+
+
+@dataclass
+class AgentRunResult:
+    """
+    一次 Agent 執行的結構化結果
+
+    executed 為 True 時，columns / rows 來自 Agent 測試最終 SQL 時 execute_sql 的執行結果
+    （最多一頁），呼叫端可直接顯示而不必重新執行。
+    timed_out 為 True 時表示超過時間預算，response 為 TIMEOUT_RESPONSE。
+    first_output_time 為串流執行時第一個可見事件（文字或工具呼叫）出現的秒數。
+    llm_turns 為本次執行的 LLM 請求次數（每一輪工具呼叫多一次，快取命中時為 0）。
+    """
+    response: str
+    sql: str = ""
+    columns: list[str] = field(default_factory=list)
+    rows: list[tuple] = field(default_factory=list)
+    has_more: bool = False
+    executed: bool = False
+    cached: bool = False
+    timed_out: bool = False
+    generation_time: float = 0.0
+    execution_time: float = 0.0
+    first_output_time: float = 0.0
+    llm_turns: int = 0
+
+
+@dataclass
+class AgentEvent:
+    """
+    Agent 串流執行時的事件
+
+    kind 為：
+    - "text"：助理回應的部分文字（text）
+    - "tool_start"：開始呼叫工具（tool、call_id）
+    - "tool_end"：工具完成（tool、call_id、arguments 為完整參數、output 為工具回傳內容）
+    - "final"：執行結束，result 為最終的 AgentRunResult（一定是最後一個事件）
+    elapsed 為事件距離開始執行的秒數。
+    """
+    kind: str
+    text: str = ""
+    tool: str = ""
+    call_id: str = ""
+    arguments: str = ""
+    output: str = ""
+    result: Optional[AgentRunResult] = None
+    elapsed: float = 0.0
+
+
 class SQLAgent:
     """NL2SQL Agent - 將自然語言轉換為 T-SQL"""
 
-    def __init__(self):
-        """初始化 SQL Agent"""
-        self.config = azure_openai_config
+    def __init__(
+        self,
+        config: Optional[AzureOpenAIConfig] = None,
+        provider: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        cache: Optional[QuestionCache] = None,
+        schema_injection: Optional[str] = None,
+        examples: Optional[ExampleStore] = None,
+        few_shot: Optional[int] = None
+    ):
+        """
+        初始化 SQL Agent
+        
+        Args:
+            config: Azure OpenAI 設定，若未提供則使用環境變數設定
+            provider: OpenAI Provider (azure / openai / litellm)，若未提供則使用環境變數設定
+            max_concurrency: 同時進行的 LLM 請求上限，若未提供則使用 AGENT_MAX_CONCURRENCY
+            cache: 問題 → SQL 快取，若未提供則使用全域共用的快取（get_question_cache）
+            schema_injection: Agentic 模式的 Schema 提供方式（hybrid / tool），若未提供則使用 AGENT_SCHEMA_INJECTION
+            examples: 執行成功的問題與 SQL 範例庫，若未提供則使用全域共用的範例庫（get_example_store）
+            few_shot: 每次放入提示詞的範例數，若未提供則使用 FEW_SHOT_TOP_K（0 表示停用）
+        """
+        self.config = config or azure_openai_config
+        self.provider = (provider or openai_provider).lower()
+        self.max_concurrency = max_concurrency or agent_max_concurrency
+        self.question_cache = cache or get_question_cache()
+        self.schema_injection = (schema_injection or agent_schema_injection).lower()
+        self.example_store = examples or get_example_store()
+        self.few_shot = few_shot_top_k if few_shot is None else few_shot
         self.legacy_client = None
         self.chat_client = None
         self.tools = None
+        self._chat_agent = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
         
         # 先初始化 legacy_client 作為備案
         if self.config.is_valid():
+            from openai import AzureOpenAI
+
             self.legacy_client = AzureOpenAI(
                 azure_endpoint=self.config.endpoint,
                 api_key=self.config.api_key,
@@ -84,19 +493,24 @@ class SQLAgent:
             )
         
         # 嘗試使用 Agent Framework
-        self._use_agent_framework = AGENT_FRAMEWORK_AVAILABLE and self.config.is_valid()
+        self._use_agent_framework = self.config.is_valid() and agent_framework_available()
         if self._use_agent_framework:
             self._init_agent_framework()
 
     def _init_agent_framework(self):
         """初始化 Agent Framework 客戶端"""
+        from agent_framework.azure import AzureOpenAIChatClient
+        from agent_framework.openai import OpenAIChatClient
+
+        from agent_tools import ASYNC_TOOLS
+
         try:
             # 設定環境變數供 Agent Framework 使用
             os.environ.setdefault("AZURE_OPENAI_ENDPOINT", self.config.endpoint)
             os.environ.setdefault("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", self.config.deployment_name)
             
             # 根據 Provider 選擇客戶端類型
-            provider = openai_provider.lower()
+            provider = self.provider
             if provider == "openai" or provider == "litellm":
                 # 使用 OpenAI 兼容客戶端 (適用於 LiteLLM 或原生 OpenAI)
                 self.chat_client = OpenAIChatClient(
@@ -111,7 +525,7 @@ class SQLAgent:
                     azure_endpoint=self.config.endpoint,
                     model=self.config.deployment_name
                 )
-            self.tools = [get_database_schema, execute_sql, test_connection]
+            self.tools = list(ASYNC_TOOLS)
         except Exception as e:
             print(f"Agent Framework 初始化失敗: {e}")
             self._use_agent_framework = False
@@ -122,6 +536,8 @@ class SQLAgent:
         self.chat_client = None
         self.tools = None
         if self.config.is_valid():
+            from openai import AzureOpenAI
+
             self.legacy_client = AzureOpenAI(
                 azure_endpoint=self.config.endpoint,
                 api_key=self.config.api_key,
@@ -142,50 +558,651 @@ class SQLAgent:
             return "Agent Framework (Agentic Mode)"
         return "Legacy OpenAI (Basic Mode)"
 
-    async def generate_sql_async(self, user_query: str) -> str:
+    async def generate_sql_async(
+        self,
+        user_query: str,
+        schema_context: str = "",
+        connection_string: Optional[str] = None
+    ) -> str:
         """
-        使用 Agent Framework 非同步生成 SQL
+        非同步生成 SQL（在共用的長駐事件迴圈上執行，可從任何事件迴圈 await）
+        
+        問題快取命中時直接回傳先前驗證過的回應，不呼叫 LLM。
         
         Args:
             user_query: 使用者的自然語言查詢
+            schema_context: 資料庫 Schema 上下文（舊版模式與 hybrid 模式使用，未提供時依問題裁剪）
+            connection_string: 連線字串（決定 Schema 版本），若未提供則使用環境變數設定
             
         Returns:
             str: Agent 的回應（包含 SQL 和說明）
         """
-        if not self._use_agent_framework:
-            raise RuntimeError("Agent Framework 未啟用")
+        return (await self.run_async(user_query, schema_context, connection_string)).response
+
+    async def run_async(
+        self,
+        user_query: str,
+        schema_context: str = "",
+        connection_string: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> AgentRunResult:
+        """
+        非同步執行 Agent，並回傳包含最終 SQL 與其測試結果的結構化結果
+        
+        Args:
+            user_query: 使用者的自然語言查詢
+            schema_context: 資料庫 Schema 上下文（舊版模式與 hybrid 模式使用，未提供時依問題裁剪）
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            timeout: 時間預算（秒），若未提供則使用 REQUEST_TIMEOUT；不會超過呼叫端的截止時間
+            
+        Returns:
+            AgentRunResult: 回應、最終 SQL，以及 Agent 最後一次成功執行該 SQL 的結果與耗時
+        """
+        if not self.is_ready():
+            return AgentRunResult(response="錯誤：Azure OpenAI 設定不完整，請檢查環境變數。")
+        start = time.perf_counter()
+        cached = await asyncio.to_thread(self.get_cached_sql, user_query, connection_string)
+        if cached is not None:
+            return self._build_run_result(cached, [], start, connection_string, cached=True)
+        scope = self._request_deadline(timeout)
+        response, executions, timed_out, llm_turns = await _agent_loop.run_async(
+            self._run_on_loop(user_query, schema_context, connection_string, scope)
+        )
+        return self._build_run_result(
+            response, executions, start, connection_string, timed_out=timed_out, llm_turns=llm_turns
+        )
+
+    def get_cached_sql(self, natural_language: str, connection_string: Optional[str] = None) -> Optional[str]:
+        """
+        查詢問題快取
+        
+        Args:
+            natural_language: 使用者的自然語言查詢
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            
+        Returns:
+            str: 快取的 Agent 回應，未命中或無法取得 Schema 版本時回傳 None
+        """
+        try:
+            version = schema_cache.get_version(connection_string)
+        except Exception:
+            return None
+        return self.question_cache.get(natural_language, version)
 
-        async with ChatAgent(
-            chat_client=self.chat_client,
-            instructions=SYSTEM_PROMPT,
-            tools=self.tools
-        ) as agent:
-            result = await agent.run(user_query)
-            return result.text
+    def remember_sql(self, natural_language: str, response: str, connection_string: Optional[str] = None):
+        """
+        將執行成功的 SQL 回應寫入問題快取與範例庫（只應在 SQL 驗證通過後呼叫）
+        
+        Args:
+            natural_language: 使用者的自然語言查詢
+            response: 產生此 SQL 的 Agent 回應
+            connection_string: 連線字串，若未提供則使用環境變數設定
+        """
+        try:
+            version = schema_cache.get_version(connection_string)
+        except Exception:
+            return
+        self.question_cache.put(natural_language, version, response)
+        self.example_store.add(
+            natural_language, self._clean_sql(response), version, database_key(connection_string)
+        )
 
-    def generate_sql(self, natural_language: str, schema_context: str = "") -> str:
+    def get_examples(self, natural_language: str, connection_string: Optional[str] = None) -> list[Example]:
         """
-        根據自然語言生成 T-SQL
+        從範例庫找出與問題相似、且屬於目前 Schema 版本的已驗證範例
         
         Args:
             natural_language: 使用者的自然語言查詢
-            schema_context: 資料庫 Schema 上下文（舊版模式使用）
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            
+        Returns:
+            list: 最多 few_shot 筆 Example；停用或無法取得 Schema 版本時為空列表
+        """
+        if self.few_shot <= 0:
+            return []
+        try:
+            version = schema_cache.get_version(connection_string)
+        except Exception:
+            return []
+        return self.example_store.search(natural_language, version, self.few_shot, database_key(connection_string))
+
+    def get_relevant_schema(self, question: str, connection_string: Optional[str] = None) -> str:
+        """
+        依問題裁剪的 Schema 文字，附上相關資料表的 JOIN 提示與已快取的欄位值提示
+
+        值提示只讀取欄位統計快取，不等待資料庫；尚未抽樣的資料表排入背景抽樣，之後的問題即可使用。
+        JOIN 提示以外鍵關聯圖串起相關資料表，包含不在裁剪結果中的中介資料表。
+        
+        Args:
+            question: 使用者的自然語言問題
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            
+        Returns:
+            str: Schema 文字（有 JOIN 提示與值提示時依序接在最後）
+        """
+        schema_text = schema_cache.get_relevant_schema(question, connection_string)
+        if not schema_text.strip() or (join_hint_tokens <= 0 and column_profile_hint_tokens <= 0):
+            return schema_text
+        try:
+            tables = schema_cache.get_relevant_tables(question, connection_string)
+        except Exception:
+            return schema_text
+        sections = [schema_text]
+        if join_hint_tokens > 0:
+            try:
+                hints = get_join_graph(connection_string).hints(tables)
+            except Exception:
+                hints = ""
+            if hints:
+                sections.append(JOIN_HINTS_PROMPT.format(hints=hints))
+        if column_profile_hint_tokens > 0:
+            try:
+                hints = column_profiler.describe(tables, connection_string)
+            except Exception:
+                hints = ""
+            if hints:
+                sections.append(VALUE_HINTS_PROMPT.format(hints=hints))
+        return "\n\n".join(sections)
+
+    async def execute(
+        self,
+        natural_language: str,
+        schema_context: str = "",
+        connection_string: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> dict:
+        """
+        非同步執行完整流程：生成 SQL → 執行 → 回傳結果
+        
+        Args:
+            natural_language: 使用者的自然語言查詢
+            schema_context: 資料庫 Schema 上下文（舊版模式與 hybrid 模式使用，未提供時依問題裁剪）
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            timeout: 整個流程（生成與執行）的時間預算（秒），若未提供則使用 REQUEST_TIMEOUT
+            
+        Returns:
+            dict: 包含 success、sql、explanation、columns、rows、error 的結果
+        """
+        result = {
+            "success": False,
+            "sql": "",
+            "explanation": "",
+            "columns": [],
+            "rows": [],
+            "error": ""
+        }
+
+        # 生成與執行共用同一個時間預算（asyncio.to_thread 會複製 contextvars）
+        with deadline(request_timeout if timeout is None else timeout):
+            run = await self.run_async(natural_language, schema_context, connection_string)
+            response = run.response
+            result["explanation"] = response
+            result["sql"] = run.sql
+            if not result["sql"] or "錯誤" in result["sql"]:
+                result["error"] = response
+                return result
+
+            try:
+                db = DatabaseConnector(connection_string)
+                result["sql"] = await asyncio.to_thread(db.guard_query, result["sql"])
+                if run.executed and not run.has_more:
+                    # Agent 測試時已取得完整結果，不再重新執行
+                    columns, rows = run.columns, run.rows
+                else:
+                    columns, rows = await asyncio.to_thread(db.execute_query, result["sql"], True)
+                result["columns"] = columns
+                result["rows"] = rows
+                result["success"] = True
+                await asyncio.to_thread(self.remember_sql, natural_language, response, connection_string)
+            except Exception as e:
+                result["error"] = str(e)
+            return result
+
+    async def execute_many(
+        self,
+        questions: list[str],
+        schema_context: str = "",
+        connection_string: Optional[str] = None
+    ) -> list[dict]:
+        """
+        並行執行多個問題，同時進行的 LLM 請求數受 max_concurrency 限制
+        
+        Args:
+            questions: 自然語言查詢列表
+            schema_context: 資料庫 Schema 上下文（舊版模式與 hybrid 模式使用，未提供時依問題裁剪）
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            
+        Returns:
+            list: 依問題順序排列的結果（格式同 execute()）
+        """
+        return list(await asyncio.gather(*(
+            self.execute(question, schema_context, connection_string) for question in questions
+        )))
+
+    async def _run_on_loop(
+        self,
+        user_query: str,
+        schema_context: str,
+        connection_string: Optional[str],
+        scope: Deadline
+    ) -> "tuple[str, list[SqlExecution], bool, int]":
+        """
+        在背景事件迴圈上生成 SQL，並記錄期間 execute_sql 工具的執行結果
+
+        整個 Agent 執行受截止時間限制，工具呼叫次數受 AGENT_MAX_TOOL_CALLS 限制；
+        到期時取消 Agent，並在伺服器端取消工具中仍在執行的查詢。
+        
+        Returns:
+            tuple: (回應, SqlExecution 列表, 是否逾時, LLM 請求次數)
+        """
+        from agent_tools import capture_executions, limit_tool_calls
+
+        with capture_executions() as executions, scope.activate(), limit_tool_calls(agent_max_tool_calls):
+            remaining = scope.remaining()
+            try:
+                response, llm_turns = await asyncio.wait_for(
+                    self._generate_on_loop(user_query, schema_context, connection_string),
+                    None if remaining == math.inf else remaining
+                )
+            except asyncio.TimeoutError:
+                scope.cancel()
+                return TIMEOUT_RESPONSE, executions, True, 0
+        return response, executions, False, llm_turns
+
+    def stream(
+        self,
+        natural_language: str,
+        schema_context: str = "",
+        connection_string: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> Iterator[AgentEvent]:
+        """
+        同步串流執行 Agent（供 Streamlit 等同步程式逐步顯示進度）
+        
+        Args:
+            natural_language: 使用者的自然語言查詢
+            schema_context: 資料庫 Schema 上下文（舊版模式與 hybrid 模式使用，未提供時依問題裁剪）
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            timeout: 時間預算（秒），若未提供則使用 REQUEST_TIMEOUT；不會超過呼叫端的截止時間
+            
+        Yields:
+            AgentEvent: 文字片段與工具呼叫事件，最後一個為帶有 AgentRunResult 的 "final"
+        """
+        if not self.is_ready():
+            yield AgentEvent("final", result=AgentRunResult(response="錯誤：Azure OpenAI 設定不完整，請檢查環境變數。"))
+            return
+        start = time.perf_counter()
+        scope = self._request_deadline(timeout)
+        yield from _agent_loop.stream(
+            lambda emit: self._stream_on_loop(natural_language, schema_context, connection_string, scope, start, emit)
+        )
+
+    async def run_stream(
+        self,
+        user_query: str,
+        schema_context: str = "",
+        connection_string: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[AgentEvent]:
+        """
+        非同步串流執行 Agent（可從任何事件迴圈 async for）
+        
+        Args:
+            user_query: 使用者的自然語言查詢
+            schema_context: 資料庫 Schema 上下文（舊版模式與 hybrid 模式使用，未提供時依問題裁剪）
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            timeout: 時間預算（秒），若未提供則使用 REQUEST_TIMEOUT；不會超過呼叫端的截止時間
+            
+        Yields:
+            AgentEvent: 文字片段與工具呼叫事件，最後一個為帶有 AgentRunResult 的 "final"
+        """
+        if not self.is_ready():
+            yield AgentEvent("final", result=AgentRunResult(response="錯誤：Azure OpenAI 設定不完整，請檢查環境變數。"))
+            return
+        start = time.perf_counter()
+        scope = self._request_deadline(timeout)
+        async for event in _agent_loop.stream_async(
+            lambda emit: self._stream_on_loop(user_query, schema_context, connection_string, scope, start, emit)
+        ):
+            yield event
+
+    async def _stream_on_loop(
+        self,
+        user_query: str,
+        schema_context: str,
+        connection_string: Optional[str],
+        scope: Deadline,
+        start: float,
+        emit: Callable[[AgentEvent], None]
+    ):
+        """
+        在背景事件迴圈上串流執行，所有事件（包含最後的 "final"）都經由 emit 送出
+
+        與 run() 相同：問題快取命中時不呼叫 LLM，受截止時間與工具呼叫次數限制，
+        並採用 Agent 測試最終 SQL 時的執行結果。
+        """
+        from agent_tools import capture_executions, limit_tool_calls
+
+        first_output: Optional[float] = None
+
+        def visible(event: AgentEvent):
+            nonlocal first_output
+            event.elapsed = time.perf_counter() - start
+            if first_output is None:
+                first_output = event.elapsed
+            emit(event)
+
+        cached = await asyncio.to_thread(self.get_cached_sql, user_query, connection_string)
+        if cached is not None:
+            result = self._build_run_result(cached, [], start, connection_string, cached=True)
+            visible(AgentEvent("text", text=cached))
+        else:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def generate() -> tuple[str, int]:
+                async with self._semaphore:
+                    if self._use_agent_framework:
+                        return await self._stream_agent_framework(user_query, schema_context, connection_string, visible)
+                    response = await asyncio.to_thread(
+                        self._stream_sql_legacy, user_query, schema_context, connection_string, visible
+                    )
+                    return response, 1
+
+            timed_out, llm_turns = False, 0
+            with capture_executions() as executions, scope.activate(), limit_tool_calls(agent_max_tool_calls):
+                remaining = scope.remaining()
+                try:
+                    response, llm_turns = await asyncio.wait_for(
+                        generate(), None if remaining == math.inf else remaining
+                    )
+                except asyncio.TimeoutError:
+                    scope.cancel()
+                    response, timed_out = TIMEOUT_RESPONSE, True
+                except asyncio.CancelledError:
+                    # 呼叫端停止迭代：一併取消工具中仍在執行的查詢
+                    scope.cancel()
+                    raise
+            result = self._build_run_result(
+                response, executions, start, connection_string, timed_out=timed_out, llm_turns=llm_turns
+            )
+        result.first_output_time = first_output if first_output is not None else result.generation_time
+        emit(AgentEvent("final", result=result, elapsed=time.perf_counter() - start))
+
+    async def _stream_agent_framework(
+        self,
+        user_query: str,
+        schema_context: str,
+        connection_string: Optional[str],
+        emit: Callable[[AgentEvent], None]
+    ) -> tuple[str, int]:
+        """
+        以 ChatAgent.run_stream 執行，將文字片段與工具呼叫轉為事件
+
+        Returns:
+            tuple: (完整回應文字, LLM 請求次數)
+        """
+        from agent_framework import AgentRunResponse, FunctionCallContent, FunctionResultContent, TextContent
+
+        messages = await self._agent_messages(user_query, schema_context, connection_string)
+        updates = []
+        calls: dict[str, dict] = {}
+        current = ""
+        async for update in self._get_chat_agent().run_stream(messages):
+            updates.append(update)
+            for content in update.contents:
+                if isinstance(content, TextContent) and content.text:
+                    emit(AgentEvent("text", text=content.text))
+                elif isinstance(content, FunctionCallContent):
+                    # 串流時第一個片段帶有 call_id 與名稱，之後的片段只有參數
+                    if content.name:
+                        current = content.call_id or current
+                        calls[current] = {"tool": content.name, "arguments": []}
+                        emit(AgentEvent("tool_start", tool=content.name, call_id=current))
+                    if content.arguments and current in calls:
+                        arguments = content.arguments
+                        if not isinstance(arguments, str):
+                            arguments = json.dumps(arguments, ensure_ascii=False)
+                        calls[current]["arguments"].append(arguments)
+                elif isinstance(content, FunctionResultContent):
+                    call = calls.get(content.call_id, {"tool": "", "arguments": []})
+                    emit(AgentEvent(
+                        "tool_end",
+                        tool=call["tool"],
+                        call_id=content.call_id,
+                        arguments="".join(call["arguments"]),
+                        output="" if content.result is None else str(content.result),
+                    ))
+        # 與 run() 相同，以合併後的 tool 訊息計算輪數（同一輪的多個平行工具結果只算一次）
+        result = AgentRunResponse.from_agent_run_response_updates(updates)
+        tool_rounds = sum(1 for message in result.messages if message.role.value == "tool")
+        return result.text, tool_rounds + 1
+
+    def _request_deadline(self, timeout: Optional[float]) -> Deadline:
+        """本次執行的截止時間：REQUEST_TIMEOUT（或 timeout）與呼叫端截止時間較早者"""
+        return Deadline(request_timeout if timeout is None else timeout, parent=current_deadline())
+
+    def _build_run_result(
+        self,
+        response: str,
+        executions: "list[SqlExecution]",
+        start: float,
+        connection_string: Optional[str],
+        cached: bool = False,
+        timed_out: bool = False,
+        llm_turns: int = 0
+    ) -> AgentRunResult:
+        """由回應與工具執行紀錄組成 AgentRunResult"""
+        result = AgentRunResult(
+            response=response,
+            sql=self._clean_sql(response),
+            cached=cached,
+            timed_out=timed_out,
+            llm_turns=llm_turns,
+            generation_time=time.perf_counter() - start
+        )
+        if timed_out or not result.sql:
+            return result
+
+        # 只採用與最終 SQL 相同（正規化後）且在同一資料庫執行的最後一次結果
+        fingerprint = sql_fingerprint(result.sql)
+        connection_string = connection_string or sql_server_config.connection_string
+        for execution in reversed(executions):
+            if execution.connection_string == connection_string and sql_fingerprint(execution.sql) == fingerprint:
+                result.columns = execution.columns
+                result.rows = execution.rows
+                result.has_more = execution.has_more
+                result.executed = True
+                result.execution_time = execution.elapsed
+                break
+        return result
+
+    async def _generate_on_loop(
+        self,
+        user_query: str,
+        schema_context: str,
+        connection_string: Optional[str] = None
+    ) -> tuple[str, int]:
+        """
+        在背景事件迴圈上生成 SQL，並以信號量限制並行數
+
+        Returns:
+            tuple: (回應, LLM 請求次數)
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            if self._use_agent_framework:
+                messages = await self._agent_messages(user_query, schema_context, connection_string)
+                result = await self._get_chat_agent().run(messages)
+                # 每一輪工具結果之後都會再請求一次 LLM
+                tool_rounds = sum(1 for message in result.messages if message.role.value == "tool")
+                return result.text, tool_rounds + 1
+            response = await asyncio.to_thread(self._generate_sql_legacy, user_query, schema_context, connection_string)
+            return response, 1
+
+    async def _agent_messages(self, user_query: str, schema_context: str, connection_string: Optional[str] = None):
+        """
+        Agentic 模式的輸入訊息
+
+        hybrid 模式時把 Schema（呼叫端提供的，或依問題從共用快取裁剪）以 system 訊息接在
+        SYSTEM_PROMPT 之後，Agent 可直接撰寫 SQL，不必先花一輪 LLM 往返呼叫 get_database_schema；
+        無法取得 Schema 時退回只傳問題，由 Agent 自行呼叫工具。
+        範例庫中有相似的已驗證問題時，再以 system 訊息附上這些範例（兩種模式皆同）。
+        
+        Returns:
+            str | list[ChatMessage]: 傳給 ChatAgent.run() 的訊息
+        """
+        instructions = []
+        if self.schema_injection == "hybrid":
+            if not schema_context:
+                try:
+                    schema_text = await asyncio.to_thread(self.get_relevant_schema, user_query, connection_string)
+                except Exception:
+                    schema_text = ""
+                schema_context = f"資料庫 Schema：\n{schema_text}" if schema_text.strip() else ""
+            if schema_context:
+                instructions.append(SCHEMA_INJECTION_PROMPT.format(schema=schema_context))
+        examples = await asyncio.to_thread(self.get_examples, user_query, connection_string)
+        if examples:
+            instructions.append(FEW_SHOT_PROMPT.format(examples=format_examples(examples)))
+        if not instructions:
+            return user_query
+
+        from agent_framework import ChatMessage
+
+        return [ChatMessage(role="system", text=text) for text in instructions] + [
+            ChatMessage(role="user", text=user_query)
+        ]
+
+    def _get_chat_agent(self):
+        """取得重複使用的 ChatAgent；每次 run() 都使用新的對話執行緒"""
+        if self._chat_agent is None:
+            from agent_framework import ChatAgent
+
+            # 不使用 async with：離開時會關閉 chat_client 與其 HTTP 連線
+            self._chat_agent = ChatAgent(
+                chat_client=self.chat_client,
+                instructions=SYSTEM_PROMPT,
+                tools=self.tools
+            )
+        return self._chat_agent
+
+    def generate_sql(
+        self,
+        natural_language: str,
+        schema_context: str = "",
+        connection_string: Optional[str] = None
+    ) -> str:
+        """
+        根據自然語言生成 T-SQL（問題快取命中時不呼叫 LLM）
+        
+        Args:
+            natural_language: 使用者的自然語言查詢
+            schema_context: 資料庫 Schema 上下文（舊版模式與 hybrid 模式使用，未提供時依問題裁剪）
+            connection_string: 連線字串（決定 Schema 版本），若未提供則使用環境變數設定
             
         Returns:
             str: 生成的 T-SQL 語句或 Agent 回應
         """
+        return self.run(natural_language, schema_context, connection_string).response
+
+    def run(
+        self,
+        natural_language: str,
+        schema_context: str = "",
+        connection_string: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> AgentRunResult:
+        """
+        同步執行 Agent 並回傳結構化結果（供 Streamlit 等同步程式使用）
+        
+        Args:
+            natural_language: 使用者的自然語言查詢
+            schema_context: 資料庫 Schema 上下文（舊版模式與 hybrid 模式使用，未提供時依問題裁剪）
+            connection_string: 連線字串，若未提供則使用環境變數設定
+            timeout: 時間預算（秒），若未提供則使用 REQUEST_TIMEOUT；不會超過呼叫端的截止時間
+            
+        Returns:
+            AgentRunResult: 回應、最終 SQL，以及 Agent 最後一次成功執行該 SQL 的結果與耗時
+        """
         if not self.is_ready():
-            return "錯誤：Azure OpenAI 設定不完整，請檢查環境變數。"
+            return AgentRunResult(response="錯誤：Azure OpenAI 設定不完整，請檢查環境變數。")
 
-        # 使用 Agent Framework
+        start = time.perf_counter()
+        cached = self.get_cached_sql(natural_language, connection_string)
+        if cached is not None:
+            return self._build_run_result(cached, [], start, connection_string, cached=True)
+
+        # 使用 Agent Framework（提交到共用的長駐事件迴圈，截止時間隨協程傳過去）
+        scope = self._request_deadline(timeout)
         if self._use_agent_framework:
-            return asyncio.run(self.generate_sql_async(natural_language))
+            response, executions, timed_out, llm_turns = _agent_loop.run(
+                self._run_on_loop(natural_language, schema_context, connection_string, scope)
+            )
+            return self._build_run_result(
+                response, executions, start, connection_string, timed_out=timed_out, llm_turns=llm_turns
+            )
         
         # 僅在未啟用 Agent Framework 時使用舊版模式
-        return self._generate_sql_legacy(natural_language, schema_context)
+        with scope.activate():
+            response = self._generate_sql_legacy(natural_language, schema_context, connection_string)
+        return self._build_run_result(response, [], start, connection_string, llm_turns=1)
+
+    def _generate_sql_legacy(
+        self,
+        natural_language: str,
+        schema_context: str,
+        connection_string: Optional[str] = None
+    ) -> str:
+        """舊版 SQL 生成方法（無 Agentic 功能），未提供 Schema 時使用依問題裁剪的 Schema"""
+        request = self._legacy_request(natural_language, schema_context, connection_string)
+        if request is None:
+            return TIMEOUT_RESPONSE
 
-    def _generate_sql_legacy(self, natural_language: str, schema_context: str) -> str:
-        """舊版 SQL 生成方法（無 Agentic 功能）"""
+        try:
+            response = self.legacy_client.chat.completions.create(**request)
+            content = response.choices[0].message.content
+            return self._clean_sql(content)
+        except Exception as e:
+            return f"生成 SQL 時發生錯誤：{str(e)}"
+
+    def _stream_sql_legacy(
+        self,
+        natural_language: str,
+        schema_context: str,
+        connection_string: Optional[str],
+        emit: Callable[[AgentEvent], None]
+    ) -> str:
+        """舊版模式的串流生成（stream=True），每個文字片段都以 "text" 事件送出"""
+        request = self._legacy_request(natural_language, schema_context, connection_string)
+        if request is None:
+            return TIMEOUT_RESPONSE
+
+        try:
+            parts = []
+            for chunk in self.legacy_client.chat.completions.create(**request, stream=True):
+                # 啟用非同步內容篩選時可能收到沒有 choices 的片段
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    emit(AgentEvent("text", text=parts[-1]))
+            return self._clean_sql("".join(parts))
+        except Exception as e:
+            return f"生成 SQL 時發生錯誤：{str(e)}"
+
+    def _legacy_request(
+        self,
+        natural_language: str,
+        schema_context: str,
+        connection_string: Optional[str] = None
+    ) -> Optional[dict]:
+        """
+        組成舊版模式的 chat.completions 請求參數
+
+        Returns:
+            dict: create() 的參數；目前截止時間已到時回傳 None
+        """
         legacy_prompt = """你是一位 T-SQL 專家。根據使用者提供的資料庫 Schema 和自然語言描述，生成正確的 T-SQL 查詢語句。
 
 請遵循以下規則：
@@ -196,22 +1213,35 @@ class SQLAgent:
 5. 只輸出 SQL 語句，不要額外的解釋文字
 """
         
+        if not schema_context:
+            try:
+                schema_context = f"資料庫 Schema：\n{self.get_relevant_schema(natural_language, connection_string)}"
+            except Exception:
+                schema_context = ""
+
+        examples = self.get_examples(natural_language, connection_string)
+        if examples:
+            schema_context += "\n\n" + FEW_SHOT_PROMPT.format(examples=format_examples(examples))
+
         messages = [
             {"role": "system", "content": legacy_prompt},
             {"role": "user", "content": f"{schema_context}\n\n使用者需求：{natural_language}"}
         ]
 
-        try:
-            response = self.legacy_client.chat.completions.create(
-                model=self.config.deployment_name,
-                messages=messages,
-                temperature=0,
-                max_tokens=2000,
-            )
-            content = response.choices[0].message.content
-            return self._clean_sql(content)
-        except Exception as e:
-            return f"生成 SQL 時發生錯誤：{str(e)}"
+        # 受目前截止時間限制，逾時由 OpenAI 客戶端中止請求
+        scope = current_deadline()
+        remaining = scope.remaining() if scope is not None else math.inf
+        if remaining <= 0:
+            return None
+        request_options = {} if remaining == math.inf else {"timeout": remaining}
+
+        return {
+            "model": self.config.deployment_name,
+            "messages": messages,
+            "temperature": 0,
+            "max_tokens": 2000,
+            **request_options,
+        }
 
     def _clean_sql(self, text: str) -> str:
         """清理 SQL 語句，移除 Markdown 標記"""
@@ -225,5 +1255,50 @@ class SQLAgent:
         return text.strip()
 
 
-# 預設 Agent 實例
-sql_agent = SQLAgent()
+# 共用 Agent 註冊表：以設定為 key，設定未變更時重複使用同一組客戶端
+_agents: "OrderedDict[tuple, SQLAgent]" = OrderedDict()
+_agents_lock = threading.Lock()
+_MAX_AGENTS = 4
+
+
+def get_sql_agent(config: Optional[AzureOpenAIConfig] = None, provider: Optional[str] = None) -> SQLAgent:
+    """
+    取得共用的 SQL Agent
+
+    Streamlit 每次 rerun 與不同 Session 都會取得同一個實例，
+    重複使用其 OpenAI 客戶端與 keep-alive HTTP 連線；只有設定實際變更時才重建。
+    
+    Args:
+        config: Azure OpenAI 設定，若未提供則重新讀取環境變數
+        provider: OpenAI Provider，若未提供則重新讀取環境變數
+        
+    Returns:
+        SQLAgent: 共用的 Agent 實例
+    """
+    config = config or AzureOpenAIConfig.from_env()
+    provider = (provider or os.getenv("OPENAI_PROVIDER", openai_provider)).lower()
+    key = (config.endpoint, config.api_key, config.deployment_name, config.api_version, provider)
+
+    with _agents_lock:
+        agent = _agents.get(key)
+        if agent is None:
+            agent = SQLAgent(config, provider)
+            _agents[key] = agent
+            while len(_agents) > _MAX_AGENTS:
+                _agents.popitem(last=False)
+        else:
+            _agents.move_to_end(key)
+        return agent
+
+
+# 預設 Agent 實例（sql_agent）、問題快取（question_cache）與 AGENT_FRAMEWORK_AVAILABLE
+# 在第一次存取時才建立或檢查；匯入本模組不會匯入 Agent Framework 或建立任何客戶端
+def __getattr__(name: str):
+    """延後建立模組層級的預設實例"""
+    if name == "sql_agent":
+        return get_sql_agent(azure_openai_config)
+    if name == "question_cache":
+        return get_question_cache()
+    if name == "AGENT_FRAMEWORK_AVAILABLE":
+        return agent_framework_available()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,546 @@
+"""
+SQL 靜態驗證模組
+
+在執行前以快取的 Schema 檢查 T-SQL 參考的資料表與欄位是否存在，
+名稱錯誤時不必連線資料庫即可回報，並附上編輯距離最接近的正確名稱。
+驗證器偏向保守：無法確定的參考（衍生資料表、CTE、檢視表等）一律放行，交給資料庫判斷。
+"""
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+from db_connector import DatabaseConnector
+from schema_extractor import schema_cache
+
+
+# T-SQL 詞彙切分：註解、字串、方括號 / 雙引號識別字、變數與暫存資料表、數字、單字、運算子
+_TOKEN = re.compile(
+    r"--[^\n]*|/\*.*?\*/"
+    r"|(?P<string>N?'(?:[^']|'')*')"
+    r"|(?P<bracket>\[(?:[^\]]|\]\])*\])"
+    r"|(?P<quoted>\"(?:[^\"]|\"\")*\")"
+    r"|(?P<var>[@#]{1,2}\w*)"
+    r"|(?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)"
+    r"|(?P<word>[^\W\d]\w*)"
+    r"|(?P<op><>|!=|>=|<=|\S)",
+    re.DOTALL | re.IGNORECASE
+)
+
+# 不是欄位名稱的保留字、資料型別與語法關鍵字（大寫）
+_KEYWORDS = set("""
+ADD ALL ALTER AND ANY AS ASC AT AUTHORIZATION BACKUP BEGIN BETWEEN BREAK BROWSE BULK BY CASCADE CASE
+CHECK CHECKPOINT CLOSE CLUSTERED COALESCE COLLATE COLUMN COMMIT COMPUTE CONSTRAINT CONTAINS
+CONTAINSTABLE CONTINUE CONVERT CREATE CROSS CURRENT CURRENT_DATE CURRENT_TIME CURRENT_TIMESTAMP
+CURRENT_USER CURSOR DATABASE DBCC DEALLOCATE DECLARE DEFAULT DELETE DENY DESC DISK DISTINCT
+DISTRIBUTED DOUBLE DROP DUMP ELSE END ERRLVL ESCAPE EXCEPT EXEC EXECUTE EXISTS EXIT EXTERNAL FETCH
+FILE FILLFACTOR FOR FOREIGN FREETEXT FREETEXTTABLE FROM FULL FUNCTION GOTO GRANT GROUP HAVING HOLDLOCK
+IDENTITY IDENTITY_INSERT IDENTITYCOL IF IN INDEX INNER INSERT INTERSECT INTO IS JOIN KEY KILL LEFT
+LIKE LINENO LOAD MERGE NATIONAL NOCHECK NONCLUSTERED NOT NULL NULLIF OF OFF OFFSETS ON OPEN
+OPENDATASOURCE OPENQUERY OPENROWSET OPENXML OPTION OR ORDER OUTER OVER PERCENT PIVOT PLAN PRECISION
+PRIMARY PRINT PROC PROCEDURE PUBLIC RAISERROR READ READTEXT RECONFIGURE REFERENCES REPLICATION RESTORE
+RESTRICT RETURN REVERT REVOKE RIGHT ROLLBACK ROWCOUNT ROWGUIDCOL RULE SAVE SCHEMA SECURITYAUDIT SELECT
+SEMANTICKEYPHRASETABLE SEMANTICSIMILARITYDETAILSTABLE SEMANTICSIMILARITYTABLE SESSION_USER SET SETUSER
+SHUTDOWN SOME STATISTICS SYSTEM_USER TABLE TABLESAMPLE TEXTSIZE THEN TO TOP TRAN TRANSACTION TRIGGER
+TRUNCATE TRY_CONVERT TSEQUAL UNION UNIQUE UNPIVOT UPDATE UPDATETEXT USE USER VALUES VARYING VIEW
+WAITFOR WHEN WHERE WHILE WITH WITHIN WRITETEXT
+OFFSET ROWS ROW ONLY NEXT FIRST TIES RANGE UNBOUNDED PRECEDING FOLLOWING PARTITION APPLY ZONE TIME
+NOLOCK READUNCOMMITTED READPAST UPDLOCK ROWLOCK PAGLOCK TABLOCK TABLOCKX XLOCK NOWAIT
+JSON XML PATH AUTO RAW ROOT INCLUDE_NULL_VALUES WITHOUT_ARRAY_WRAPPER SYSTEM_TIME
+BIGINT INT SMALLINT TINYINT BIT DECIMAL NUMERIC MONEY SMALLMONEY FLOAT REAL DATE DATETIME DATETIME2
+DATETIMEOFFSET SMALLDATETIME CHAR VARCHAR NCHAR NVARCHAR TEXT NTEXT BINARY VARBINARY IMAGE
+UNIQUEIDENTIFIER SQL_VARIANT MAX
+""".split())
+
+# 第一個參數為日期部分（day、mm 等）的函數
+_DATEPART_FUNCTIONS = {
+    "DATEADD", "DATEDIFF", "DATEDIFF_BIG", "DATEPART", "DATENAME", "DATETRUNC", "DATE_BUCKET",
+}
+
+# 遇到時結束欄位檢查的最外層子句（其後為查詢提示或輸出格式）
+_STOP_KEYWORDS = {"OPTION", "FOR"}
+
+# 其後接資料表來源的關鍵字
+_TABLE_KEYWORDS = {"FROM", "JOIN"}
+
+# 產生無法事先得知之欄位的語法
+_OPEN_SCOPE_KEYWORDS = {"APPLY", "PIVOT", "UNPIVOT"}
+
+
+@dataclass
+class ValidationIssue:
+    """單一無效的識別字"""
+    kind: str                      # "table" 或 "column"
+    name: str                      # SQL 中的名稱
+    table: Optional[str] = None    # 欄位所屬（或搜尋過）的資料表
+    suggestions: list[str] = field(default_factory=list)
+
+    def describe(self) -> str:
+        """以 Agent 可直接採取行動的文字描述問題"""
+        if self.kind == "table":
+            text = f"資料表名稱無效：[{self.name}]"
+        elif self.table:
+            text = f"欄位名稱無效：[{self.name}]（資料表 {self.table}）"
+        else:
+            text = f"欄位名稱無效：[{self.name}]"
+        if self.suggestions:
+            text += "，您是否要找：" + "、".join(f"[{name}]" for name in self.suggestions)
+        return text
+
+
+@dataclass
+class ValidationResult:
+    """SQL 靜態驗證結果"""
+    issues: list[ValidationIssue] = field(default_factory=list)
+    checked: bool = True           # False 表示語句類型不支援，未做任何檢查
+
+    @property
+    def ok(self) -> bool:
+        """是否沒有發現無效的識別字"""
+        return not self.issues
+
+    def format_message(self) -> str:
+        """格式化為回傳給 Agent 的錯誤訊息"""
+        lines = ["SQL 驗證失敗（尚未執行）："]
+        lines.extend(f"- {issue.describe()}" for issue in self.issues)
+        lines.append("請依建議修正名稱後重試；若不確定，請呼叫 get_database_schema 確認 Schema。")
+        return "\n".join(lines)
+
+
+def edit_distance(a: str, b: str) -> int:
+    """
+    計算兩個字串的 Levenshtein 編輯距離（不分大小寫）
+
+    Args:
+        a: 字串 A
+        b: 字串 B
+
+    Returns:
+        int: 編輯距離
+    """
+    a, b = a.lower(), b.lower()
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def suggest(name: str, candidates, limit: int = 3) -> list[str]:
+    """
+    從候選名稱中找出最接近的幾個
+
+    編輯距離不超過名稱長度的三分之一（至少 2），或其中一方包含另一方時才列入。
+
+    Args:
+        name: 無效的名稱
+        candidates: 正確名稱的集合
+        limit: 最多回傳的建議數
+
+    Returns:
+        list: 依距離排序的建議名稱
+    """
+    threshold = max(2, len(name) // 3)
+    lowered = name.lower()
+    scored = []
+    for candidate in candidates:
+        distance = edit_distance(name, candidate)
+        other = candidate.lower()
+        if distance <= threshold or (min(len(lowered), len(other)) >= 3 and (lowered in other or other in lowered)):
+            scored.append((distance, candidate))
+    scored.sort()
+    return [candidate for _, candidate in scored[:limit]]
+
+
+def _tokenize(sql: str) -> list[tuple[str, str]]:
+    """切分 SQL，回傳 (種類, 值) 列表；註解會被略過"""
+    tokens = []
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind is None:
+            continue
+        value = match.group(0)
+        if kind in ("bracket", "quoted"):
+            value = value[1:-1].replace("]]", "]").replace('""', '"')
+            kind = "ident"
+        elif kind == "word":
+            kind = "keyword" if value.upper() in _KEYWORDS else "ident"
+        tokens.append((kind, value))
+    return tokens
+
+
+class SqlValidator:
+    """以 Schema 資訊驗證 SQL 中的資料表與欄位名稱"""
+
+    def __init__(self, tables: list[dict]):
+        """
+        初始化驗證器
+
+        Args:
+            tables: 資料表資訊列表，格式同 SchemaExtractor.get_schema_metadata()
+        """
+        self._tables: dict[str, dict] = {}
+        self._columns: dict[int, dict[str, str]] = {}
+        self._table_names: list[str] = []
+        for table in tables:
+            self._table_names.append(table["name"])
+            columns = {column["name"].lower(): column["name"] for column in table["columns"]}
+            self._columns[id(table)] = columns
+            self._tables[f"{table['schema']}.{table['name']}".lower()] = table
+            # 只寫資料表名稱時優先對應 dbo 結構描述
+            key = table["name"].lower()
+            if key not in self._tables or table["schema"].lower() == "dbo":
+                self._tables[key] = table
+
+    def validate(self, sql: str, known_objects: Optional[set[str]] = None) -> ValidationResult:
+        """
+        驗證 SQL 參考的資料表與欄位
+
+        Args:
+            sql: 要驗證的 T-SQL（只檢查 SELECT / WITH 開頭的語句）
+            known_objects: 不在 Schema 中但確定存在的物件名稱（小寫，例如檢視表）
+
+        Returns:
+            ValidationResult: 驗證結果
+        """
+        tokens = _tokenize(sql)
+        if not tokens or tokens[0][1].upper() not in ("SELECT", "WITH"):
+            return ValidationResult(checked=False)
+        return _StatementCheck(self, tokens, known_objects or set()).run()
+
+    def resolve_table(self, parts: list[str]) -> Optional[dict]:
+        """依名稱（可含結構描述）找出資料表"""
+        if len(parts) > 2:
+            return None
+        return self._tables.get(".".join(parts).lower())
+
+    def columns_of(self, table: dict) -> dict[str, str]:
+        """資料表的欄位名稱（小寫 → 原始名稱）"""
+        return self._columns[id(table)]
+
+    @property
+    def table_names(self) -> list[str]:
+        """所有資料表名稱"""
+        return self._table_names
+
+
+class _StatementCheck:
+    """單一語句的驗證過程"""
+
+    def __init__(self, validator: SqlValidator, tokens: list[tuple[str, str]], known_objects: set[str]):
+        self.validator = validator
+        self.tokens = tokens
+        self.known_objects = known_objects
+        self.issues: list[ValidationIssue] = []
+        self.aliases: dict[str, Optional[dict]] = {}   # 別名 / 資料表名稱 / CTE → 資料表（未知為 None）
+        self.tables: list[dict] = []                   # 查詢參考的已知資料表
+        self.output_aliases: set[str] = set()          # SELECT 清單中定義的欄位別名
+        self.consumed: set[int] = set()                # 屬於資料表參考的詞彙位置
+        self.open_scope = False                        # 有無法得知欄位的來源時不檢查未限定欄位
+
+    def run(self) -> ValidationResult:
+        """執行驗證"""
+        self._collect_ctes()
+        self._collect_tables()
+        self._collect_output_aliases()
+        self._check_columns()
+        return ValidationResult(self.issues)
+
+    def _value(self, index: int) -> str:
+        """第 index 個詞彙的大寫值（超出範圍時為空字串）"""
+        return self.tokens[index][1].upper() if 0 <= index < len(self.tokens) else ""
+
+    def _kind(self, index: int) -> str:
+        """第 index 個詞彙的種類（超出範圍時為空字串）"""
+        return self.tokens[index][0] if 0 <= index < len(self.tokens) else ""
+
+    def _read_name(self, index: int) -> tuple[list[str], int]:
+        """讀取多段式名稱，回傳 (各段名稱, 下一個詞彙位置)"""
+        parts = [self.tokens[index][1]]
+        index += 1
+        while self._value(index) == "." and self._kind(index + 1) in ("ident", "keyword"):
+            parts.append(self.tokens[index + 1][1])
+            index += 2
+        return parts, index
+
+    def _skip_parens(self, index: int) -> int:
+        """從 "(" 開始略過到對應的 ")" 之後"""
+        depth = 0
+        while index < len(self.tokens):
+            value = self.tokens[index][1]
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth -= 1
+                if depth == 0:
+                    return index + 1
+            index += 1
+        return index
+
+    def _collect_ctes(self):
+        """CTE 名稱：WITH name [(欄位)] AS ( 以及 , name AS ("""
+        for i, (kind, value) in enumerate(self.tokens):
+            if kind != "ident" or self._value(i - 1) not in ("WITH", ","):
+                continue
+            after = self._skip_parens(i + 1) if self._value(i + 1) == "(" else i + 1
+            if self._value(after) == "AS" and self._value(after + 1) == "(":
+                self.aliases[value.lower()] = None
+                self.open_scope = True
+
+    def _collect_tables(self):
+        """找出 FROM / JOIN 之後的資料表來源與別名"""
+        i = 0
+        while i < len(self.tokens):
+            value = self._value(i)
+            if value in _OPEN_SCOPE_KEYWORDS:
+                self.open_scope = True
+            if value == "INTO" and self._kind(i + 1) == "ident":
+                # SELECT INTO 的目標資料表
+                _, end = self._read_name(i + 1)
+                self.consumed.update(range(i + 1, end))
+                i = end
+                continue
+            if value in _TABLE_KEYWORDS:
+                i = self._read_table_source(i + 1)
+                while self._value(i) == ",":
+                    i = self._read_table_source(i + 1)
+                continue
+            i += 1
+
+    def _read_table_source(self, i: int) -> int:
+        """讀取單一資料表來源（名稱或子查詢）及其別名，回傳下一個位置"""
+        table = None
+        if self._value(i) == "(":
+            # 衍生資料表：欄位未知
+            i = self._skip_parens(i)
+            self.open_scope = True
+        elif self._kind(i) == "ident":
+            start = i
+            parts, i = self._read_name(i)
+            self.consumed.update(range(start, i))
+            if self._value(i) == "(":
+                # 資料表值函數
+                i = self._skip_parens(i)
+                self.open_scope = True
+            else:
+                table = self._resolve_source(parts)
+                self.aliases[parts[-1].lower()] = table
+                self.aliases[".".join(parts).lower()] = table
+        elif self._kind(i) == "var":
+            # 資料表變數或暫存資料表
+            self.open_scope = True
+            self.consumed.add(i)
+            i += 1
+        else:
+            # 無法解析的來源（例如未加方括號的保留字名稱）
+            self.open_scope = True
+            return i
+
+        # 資料表提示 WITH (NOLOCK)
+        if self._value(i) == "WITH" and self._value(i + 1) == "(":
+            i = self._skip_parens(i + 1)
+        if self._value(i) == "AS":
+            i += 1
+        if self._kind(i) == "ident":
+            self.aliases[self.tokens[i][1].lower()] = table
+            self.consumed.add(i)
+            i += 1
+            if self._value(i) == "(":
+                # 衍生資料表的欄位別名 AS t (a, b)
+                end = self._skip_parens(i)
+                self.consumed.update(range(i, end))
+                i = end
+        if self._value(i) == "WITH" and self._value(i + 1) == "(":
+            i = self._skip_parens(i + 1)
+        return i
+
+    def _resolve_source(self, parts: list[str]) -> Optional[dict]:
+        """解析資料表名稱；不在 Schema 中的名稱記錄為問題（CTE、已知物件除外）"""
+        name = ".".join(parts).lower()
+        if len(parts) == 1 and name in self.aliases:
+            return None     # CTE
+        table = self.validator.resolve_table(parts)
+        if table is not None:
+            self.tables.append(table)
+            return table
+
+        self.open_scope = True
+        if len(parts) > 2 or name in self.known_objects or parts[-1].lower() in self.known_objects:
+            return None
+        if parts[0].lower() in ("sys", "information_schema"):
+            return None
+        self.issues.append(ValidationIssue(
+            "table", ".".join(parts), suggestions=suggest(parts[-1], self.validator.table_names)
+        ))
+        return None
+
+    def _collect_output_aliases(self):
+        """SELECT 清單中的欄位別名：AS alias、alias = expr、以及緊接在運算元之後的名稱"""
+        for i, (kind, value) in enumerate(self.tokens):
+            if kind != "ident" or i in self.consumed:
+                continue
+            previous = self._value(i - 1)
+            if previous == "AS" or self._is_alias_position(i):
+                self.output_aliases.add(value.lower())
+            elif self._value(i + 1) == "=" and previous in ("SELECT", ",", "DISTINCT") and self._in_select_list(i):
+                self.output_aliases.add(value.lower())
+
+    def _in_select_list(self, index: int) -> bool:
+        """是否位於 SELECT 清單中（往前找到同層的 SELECT 之前沒有 FROM / WHERE 等子句）"""
+        depth = 0
+        for i in range(index - 1, -1, -1):
+            value = self._value(i)
+            if value == ")":
+                depth += 1
+            elif value == "(":
+                if depth == 0:
+                    return False
+                depth -= 1
+            elif depth == 0 and value == "SELECT":
+                return True
+            elif depth == 0 and value in ("FROM", "WHERE", "GROUP", "HAVING", "ORDER", "ON", "SET"):
+                return False
+        return False
+
+    def _is_alias_position(self, index: int) -> bool:
+        """緊接在完整運算元之後（例如 SUM(x) total、[Name] n）的名稱是別名"""
+        previous_kind, previous = self._kind(index - 1), self._value(index - 1)
+        if previous_kind == "string" or previous == "END":
+            return True
+        if previous_kind == "number":
+            # TOP 10 [Name] 的 10 不是運算元
+            return self._value(index - 2) != "TOP"
+        if previous == ")":
+            # TOP (10) [Name]
+            depth, i = 0, index - 1
+            while i >= 0:
+                if self._value(i) == ")":
+                    depth += 1
+                elif self._value(i) == "(":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                i -= 1
+            return self._value(i - 1) != "TOP"
+        return previous_kind == "ident"
+
+    def _check_columns(self):
+        """檢查欄位參考"""
+        depth = 0
+        i = 0
+        while i < len(self.tokens):
+            kind, value = self.tokens[i]
+            upper = value.upper()
+            if value == "(":
+                depth += 1
+            elif value == ")":
+                depth -= 1
+            elif depth == 0 and upper in _STOP_KEYWORDS:
+                return
+            if kind != "ident" or i in self.consumed:
+                i += 1
+                continue
+
+            parts, end = self._read_name(i)
+            if self._value(end) == "(" or self._value(i - 1) in ("COLLATE", "AS"):
+                # 函數呼叫、定序名稱或別名
+                i = end
+                continue
+            if self._value(i - 1) == "(" and self._value(i - 2) in _DATEPART_FUNCTIONS:
+                i = end
+                continue
+
+            if len(parts) == 1:
+                self._check_unqualified(i, parts[0])
+            else:
+                self._check_qualified(parts)
+            i = end
+
+    def _check_qualified(self, parts: list[str]):
+        """檢查 alias.column 或 schema.table.column"""
+        column = parts[-1]
+        qualifier = ".".join(parts[:-1]).lower()
+        if qualifier not in self.aliases:
+            return
+        table = self.aliases[qualifier]
+        if table is None or column == "*":
+            return
+        columns = self.validator.columns_of(table)
+        if column.lower() not in columns:
+            self.issues.append(ValidationIssue(
+                "column", column, f"[{table['schema']}].[{table['name']}]",
+                suggest(column, columns.values())
+            ))
+
+    def _check_unqualified(self, index: int, name: str):
+        """檢查未限定資料表的欄位名稱（所有來源都已知時才檢查）"""
+        lowered = name.lower()
+        if self.open_scope or not self.tables:
+            return
+        if lowered in self.aliases or lowered in self.output_aliases or self._is_alias_position(index):
+            return
+        if any(lowered in self.validator.columns_of(table) for table in self.tables):
+            return
+        if any(issue.kind == "column" and issue.name.lower() == lowered for issue in self.issues):
+            return
+
+        candidates = {name for table in self.tables for name in self.validator.columns_of(table).values()}
+        table_text = None
+        if len(self.tables) == 1:
+            table_text = f"[{self.tables[0]['schema']}].[{self.tables[0]['name']}]"
+        self.issues.append(ValidationIssue("column", name, table_text, suggest(name, candidates)))
+
+
+# 依（連線字串, Schema 版本）快取的驗證器
+_validators: dict[str, tuple[str, SqlValidator]] = {}
+_validators_lock = threading.Lock()
+
+
+def get_validator(connection_string: Optional[str] = None) -> SqlValidator:
+    """
+    取得對應目前 Schema 版本的驗證器（Schema 變更時自動重建）
+
+    Args:
+        connection_string: 連線字串，若未提供則使用環境變數設定
+
+    Returns:
+        SqlValidator: 驗證器
+    """
+    version = schema_cache.get_version(connection_string)
+    key = connection_string or ""
+    with _validators_lock:
+        cached = _validators.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+    validator = SqlValidator(schema_cache.get_tables(connection_string))
+    with _validators_lock:
+        _validators[key] = (version, validator)
+    return validator
+
+
+def validate_sql(sql: str, connection_string: Optional[str] = None) -> ValidationResult:
+    """
+    以快取的 Schema 驗證 SQL
+
+    不在 Schema 中的資料表名稱會再以 OBJECT_ID 確認一次（檢視表、同義字等不會被誤判）。
+
+    Args:
+        sql: 要驗證的 T-SQL
+        connection_string: 連線字串，若未提供則使用環境變數設定
+
+    Returns:
+        ValidationResult: 驗證結果
+    """
+    validator = get_validator(connection_string)
+    result = validator.validate(sql)
+    unknown = [issue.name for issue in result.issues if issue.kind == "table"]
+    if unknown:
+        existing = DatabaseConnector(connection_string).existing_objects(unknown)
+        if existing:
+            result = validator.validate(sql, {name.lower() for name in existing})
+    return result